@@ -1,2 +1,3 @@
 from .game import Game
-from .game_analytics import GameAnalytics
\ No newline at end of file
+from .game_analytics import GameAnalytics
+from .game_hooks import GameHooks, PhaseProfiler
@@ -0,0 +1,450 @@
+"""
+Module: Batch Game
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Lockstep engine running many Burraco matches at once.
+
+This module keeps the state of N independent matches in NumPy arrays and advances all of them together,
+one player turn per step. Decks are permutations of card ids, hands, discard piles and secondary decks are
+count matrices indexed by card id, and melds are packed integer rows (see the MELD_* columns). Finished
+rounds are redealt and finished matches are recorded and restarted automatically.
+
+Decisions are taken by batch players (see pyburraco.players.player_batch), one per seat, which act on all
+the games where their seat is to move. They use the vectorized primitives of BatchGame (meld_accepts,
+add_to_melds, lay_melds, can_play_card) to change the state.
+
+Rules follow Game.play_round, except that every round deals NUMBER_OF_INITIAL_CARDS cards per player.
+"""
+
+import numpy as np
+
+from .card import CARDS, N_CARD_IDS, DECK_CARD_IDS
+from .meld_table import RUN_LAYOUTS, WILDCARD_SLOT, RANK_BITS, MAX_WILDCARDS, MIN_MELD_LENGTH, run_table_index
+from .game import Game
+
+# Packed meld rows
+MELD_TYPE = 0
+MELD_SUIT = 1
+MELD_MASK = 2
+MELD_REGULAR = 3
+MELD_WILD = 4
+MELD_FIRST = 5
+MELD_LENGTH = 6
+MELD_POINTS = 7
+MELD_FIELDS = 8
+
+MELD_NONE = 0
+MELD_SET = 1
+MELD_RUN = 2
+
+MAX_MELDS = 24
+BURRACO_LENGTH = 7
+WIN_SCORE = 1000
+CLOSE_BONUS = 100
+SECONDARY_DECK_PENALTY = 100
+
+DECK_SIZE = len(DECK_CARD_IDS)
+
+# Per card id attributes
+CARD_RANK = np.array([card.rank_index for card in CARDS], dtype=np.int64)
+CARD_SUIT = np.array([card.suit_index for card in CARDS], dtype=np.int64)
+CARD_POINTS = np.array([card.points for card in CARDS], dtype=np.int64)
+CARD_WILD = np.array([card.wildcard for card in CARDS], dtype=bool)
+CARD_BIT = np.where(CARD_WILD, 0, 1 << CARD_RANK)
+WILDCARD_IDS = np.flatnonzero(CARD_WILD)
+
+# Run pattern table, indexed by run_table_index(rank mask, wildcards)
+RUN_VALID = np.array([layout is not None for layout in RUN_LAYOUTS], dtype=bool)
+RUN_FIRST_RANK = np.array([layout[0] if layout else 0 for layout in RUN_LAYOUTS], dtype=np.int64)
+RUN_WILD_POSITION = np.array([layout.index(WILDCARD_SLOT) if layout and WILDCARD_SLOT in layout else -1
+                              for layout in RUN_LAYOUTS], dtype=np.int64)
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(1 << RANK_BITS)], dtype=np.int64)
+
+
+class BatchGame:
+    NUMBER_OF_INITIAL_CARDS = Game.NUMBER_OF_INITIAL_CARDS
+    TURN_LIMIT = Game.TURN_LIMIT
+    GAME_LIMIT = Game.GAME_LIMIT
+
+    def __init__(self, n_games, players, seed=None):
+        """
+        Initialize N matches between the given batch players.
+
+        Args:
+            n_games (int): Number of matches simulated in lockstep.
+            players (list): One batch player per seat.
+            seed (int or numpy.random.SeedSequence): Seed of the random generator of the batch.
+        """
+        self.n_games = int(n_games)
+        self.players = list(players)
+        self.n_players = len(self.players)
+        self.rng = np.random.default_rng(seed)
+
+        n, p = self.n_games, self.n_players
+        self.deck = np.zeros((n, DECK_SIZE), dtype=np.int64)
+        self.deck_position = np.zeros(n, dtype=np.int64)
+        self.discard_pile = np.zeros((n, N_CARD_IDS), dtype=np.int64)
+        self.hands = np.zeros((n, p, N_CARD_IDS), dtype=np.int64)
+        self.deck_secondary = np.zeros((n, p, N_CARD_IDS), dtype=np.int64)
+        self.secondary_deck = np.zeros((n, p), dtype=bool)
+        self.melds = np.zeros((n, p, MAX_MELDS, MELD_FIELDS), dtype=np.int64)
+        self.n_melds = np.zeros((n, p), dtype=np.int64)
+
+        self.scores = np.zeros((n, p), dtype=np.int64)
+        self.match_turns = np.zeros(n, dtype=np.int64)
+        self.turn = np.zeros(n, dtype=np.int64)
+        self.round = np.zeros(n, dtype=np.int64)
+        self.initial_player_index = np.zeros(n, dtype=np.int64)
+        self.current_player_index = np.zeros(n, dtype=np.int64)
+
+        self._results = {'winner': [], 'scores': [], 'turns': []}
+        self.setup_games(np.arange(n))
+
+    def play(self, n_matches):
+        """
+        Step all the games until at least n_matches matches have been completed.
+
+        Returns:
+            dict: The results of the completed matches (see results).
+        """
+        while self.finished_matches < n_matches:
+            self.step()
+        return self.results
+
+    def step(self):
+        """
+        Play one turn in every game: draw, add to melds, lay melds and discard.
+        """
+        rows = np.arange(self.n_games)
+        seats = self.current_player_index.copy()
+
+        # 1. Drawing Phase
+        from_deck = np.zeros(self.n_games, dtype=bool)
+        for seat, player in enumerate(self.players):
+            seat_rows = rows[seats == seat]
+            if seat_rows.size:
+                from_deck[seat_rows] = player.draw_card(self, seat_rows, seat)
+        self._draw_from_deck(rows[from_deck])
+        self._draw_discard_pile(rows[~from_deck])
+
+        # 2. Additional Cards Phase and 3. Melding Phase
+        for seat, player in enumerate(self.players):
+            seat_rows = rows[seats == seat]
+            if seat_rows.size:
+                player.add_melds(self, seat_rows, seat)
+                player.play_melds(self, seat_rows, seat)
+
+        # 4. Discarding Phase
+        hand_size = self.hand_size(rows, seats)
+        burraco = self.burraco(rows, seats)
+        secondary = self.secondary_deck[rows, seats]
+        discarding = (hand_size > 1) | ((hand_size == 1) & (burraco | ~secondary))
+        pick_and_continue = ~discarding & (hand_size == 0) & ~secondary
+        if np.any(~discarding & ~pick_and_continue):
+            raise ValueError("No cards to discard. Program will terminate.")
+
+        for seat, player in enumerate(self.players):
+            seat_rows = rows[discarding & (seats == seat)]
+            if seat_rows.size:
+                card_ids = np.asarray(player.discard_card(self, seat_rows, seat), dtype=np.int64)
+                self.hands[seat_rows, seat, card_ids] -= 1
+                self.discard_pile[seat_rows, card_ids] += 1
+
+        # 5. Check for win condition
+        hand_size = self.hand_size(rows, seats)
+        closed = discarding & (hand_size == 0) & burraco & secondary
+        turn_limit = discarding & ~closed & (self.turn >= self.TURN_LIMIT)
+        passing = discarding & ~closed & ~turn_limit
+
+        # 4.1 Pick secondary deck and pass, 4.3 pick secondary deck and continue playing
+        picking = pick_and_continue | (passing & (hand_size == 0) & ~secondary)
+        self._pick_secondary_deck(rows[picking], seats[picking])
+
+        # 4.2 Move to next player
+        passing_rows = rows[passing]
+        self.current_player_index[passing_rows] = (self.current_player_index[passing_rows] + 1) % self.n_players
+        self.turn[passing_rows] += self.current_player_index[passing_rows] == 0
+
+        round_over = closed | turn_limit
+        if np.any(round_over):
+            self._count_score(rows[round_over], closed[round_over])
+            self._end_round(rows[round_over])
+
+    def setup_games(self, rows):
+        """
+        Shuffle a new deck and deal hands and secondary decks in the given games.
+        """
+        n_rows = rows.size
+        if not n_rows:
+            return
+        self.deck[rows] = self.rng.permuted(np.broadcast_to(np.array(DECK_CARD_IDS), (n_rows, DECK_SIZE)), axis=1)
+
+        # Cards are dealt one at a time to every player and then to every secondary deck
+        stride = 2 * self.n_players
+        dealt = self.deck[rows, :stride * self.NUMBER_OF_INITIAL_CARDS].reshape(n_rows, -1, stride)
+        row_index = np.repeat(np.arange(n_rows), self.NUMBER_OF_INITIAL_CARDS)
+        for seat in range(self.n_players):
+            self.hands[rows, seat] = _count_ids(n_rows, row_index, dealt[:, :, seat].ravel())
+            self.deck_secondary[rows, seat] = _count_ids(n_rows, row_index,
+                                                         dealt[:, :, self.n_players + seat].ravel())
+
+        self.deck_position[rows] = stride * self.NUMBER_OF_INITIAL_CARDS
+        self.discard_pile[rows] = 0
+        self.melds[rows] = 0
+        self.n_melds[rows] = 0
+        self.turn[rows] = 0
+
+    def _end_round(self, rows):
+        """
+        Close the round in the given games, then record finished matches and deal the next round.
+        """
+        self.match_turns[rows] += self.turn[rows]
+        current = self.current_player_index[rows]
+        won = self.scores[rows, current] >= WIN_SCORE
+        limit = ~won & (self.round[rows] >= self.GAME_LIMIT)
+        finished = won | limit
+
+        winners = np.where(won, current, np.argmax(self.scores[rows], axis=1))
+        finished_rows = rows[finished]
+        if finished_rows.size:
+            self._results['winner'].append(winners[finished])
+            self._results['scores'].append(self.scores[finished_rows].copy())
+            self._results['turns'].append(self.match_turns[finished_rows].copy())
+            self.scores[finished_rows] = 0
+            self.match_turns[finished_rows] = 0
+            self.round[finished_rows] = 0
+            # As in Game.reset_game, a picked secondary deck stays picked until the match is over
+            self.secondary_deck[finished_rows] = False
+        self.round[rows[~finished]] += 1
+
+        self.initial_player_index[rows] = (self.initial_player_index[rows] + 1) % self.n_players
+        self.current_player_index[rows] = self.initial_player_index[rows]
+        self.setup_games(rows)
+
+    def _count_score(self, rows, closed):
+        """
+        Add the points of the round to the scores of every player in the given games.
+        """
+        current = self.current_player_index[rows]
+        for seat in range(self.n_players):
+            bonus = np.where(closed & (current == seat), CLOSE_BONUS,
+                             np.where(self.deck_secondary[rows, seat].any(axis=1), -SECONDARY_DECK_PENALTY, 0))
+            self.scores[rows, seat] += bonus + self.points(rows, seat)
+
+    def _draw_from_deck(self, rows):
+        empty = rows[self.deck_position[rows] >= DECK_SIZE]
+        for row in empty:
+            # Reshuffle the discard pile back into the draw pile
+            card_ids = np.repeat(np.arange(N_CARD_IDS), self.discard_pile[row])
+            self.rng.shuffle(card_ids)
+            self.deck[row, DECK_SIZE - card_ids.size:] = card_ids
+            self.deck_position[row] = DECK_SIZE - card_ids.size
+            self.discard_pile[row] = 0
+
+        rows = rows[self.deck_position[rows] < DECK_SIZE]
+        card_ids = self.deck[rows, self.deck_position[rows]]
+        self.hands[rows, self.current_player_index[rows], card_ids] += 1
+        self.deck_position[rows] += 1
+
+    def _draw_discard_pile(self, rows):
+        self.hands[rows, self.current_player_index[rows]] += self.discard_pile[rows]
+        self.discard_pile[rows] = 0
+
+    def _pick_secondary_deck(self, rows, seats):
+        self.hands[rows, seats] += self.deck_secondary[rows, seats]
+        self.deck_secondary[rows, seats] = 0
+        self.secondary_deck[rows, seats] = True
+
+    def hand_size(self, rows, seat):
+        return self.hands[rows, seat].sum(axis=-1)
+
+    def burraco(self, rows, seat):
+        return (self.melds[rows, seat, :, MELD_LENGTH] >= BURRACO_LENGTH).any(axis=-1)
+
+    def points(self, rows, seat):
+        """
+        Points of the melds minus points of the hand, as in Player.points.
+        """
+        return self.melds[rows, seat, :, MELD_POINTS].sum(axis=-1) - self.hands[rows, seat] @ CARD_POINTS
+
+    def can_play_card(self, rows, seat, played_cards, hand_size=None):
+        """
+        Vectorized Player.can_play_card.
+
+        Args:
+            hand_size (numpy.ndarray): Hand sizes to count from, by default the current ones. Players that
+                                       remove the played cards only at the end of a phase pass the sizes
+                                       from the start of the phase.
+        """
+        hand_length = (self.hand_size(rows, seat) if hand_size is None else hand_size) - played_cards
+        burraco = self.burraco(rows, seat)
+        secondary = self.secondary_deck[rows, seat]
+        return ((hand_length > 2)
+                | ((hand_length == 2) & (burraco | ~secondary))
+                | ((hand_length == 1) & ~secondary))
+
+    def meld_accepts(self, rows, seat, card_ids):
+        """
+        Check which melds of the seat can take one card in every game.
+
+        Args:
+            rows (numpy.ndarray): Game indexes.
+            seat (int): Seat whose melds are checked.
+            card_ids (numpy.ndarray): One card id per game.
+
+        Returns:
+            numpy.ndarray: (len(rows), MAX_MELDS) boolean matrix.
+        """
+        n_melds = self.n_melds[rows, seat].max(initial=0)
+        accepts = np.zeros((rows.size, MAX_MELDS), dtype=bool)
+        if not n_melds:
+            return accepts
+
+        melds = self.melds[rows, seat, :n_melds]
+        meld_type, mask = melds[:, :, MELD_TYPE], melds[:, :, MELD_MASK]
+        has_wild = melds[:, :, MELD_WILD] >= 0
+        wild = CARD_WILD[card_ids][:, None]
+        bit = CARD_BIT[card_ids][:, None]
+
+        set_ok = (meld_type == MELD_SET) & np.where(wild, ~has_wild, mask == bit)
+        run_index = np.where(wild, run_table_index(mask, 1), (has_wild.astype(np.int64) << RANK_BITS) | mask | bit)
+        run_ok = (meld_type == MELD_RUN) & RUN_VALID[run_index] & np.where(
+            wild, ~has_wild, (melds[:, :, MELD_SUIT] == CARD_SUIT[card_ids][:, None]) & ((mask & bit) == 0))
+        accepts[:, :n_melds] = set_ok | run_ok
+        return accepts
+
+    def add_to_melds(self, rows, seat, slots, card_ids):
+        """
+        Move one card per game from the hand of the seat to one of its melds. The moves must be accepted
+        by meld_accepts.
+        """
+        if not rows.size:
+            return
+        melds = self.melds[rows, seat, slots]
+        wild = CARD_WILD[card_ids]
+        melds[:, MELD_MASK] |= CARD_BIT[card_ids]
+        melds[:, MELD_REGULAR] += ~wild
+        melds[:, MELD_WILD] = np.where(wild, card_ids, melds[:, MELD_WILD])
+        melds[:, MELD_LENGTH] += 1
+        melds[:, MELD_POINTS] += CARD_POINTS[card_ids]
+
+        run = melds[:, MELD_TYPE] == MELD_RUN
+        first_rank = RUN_FIRST_RANK[run_table_index(melds[:, MELD_MASK], (melds[:, MELD_WILD] >= 0).astype(np.int64))]
+        melds[:, MELD_FIRST] = np.where(run, melds[:, MELD_SUIT] * RANK_BITS + first_rank,
+                                        melds[:, MELD_FIRST])
+
+        self.melds[rows, seat, slots] = melds
+        self.hands[rows, seat, card_ids] -= 1
+
+    def lay_melds(self, rows, seat, card_ids):
+        """
+        Validate one group of cards per game and lay the valid ones as new melds of the seat.
+
+        Args:
+            rows (numpy.ndarray): Game indexes.
+            seat (int): Seat laying the melds.
+            card_ids (numpy.ndarray): (len(rows), L) card ids, padded with -1.
+
+        Returns:
+            numpy.ndarray: Boolean mask of the games where the meld was laid.
+        """
+        groups = classify_groups(card_ids)
+        laid = groups['valid'] & (self.n_melds[rows, seat] < MAX_MELDS)
+        is_run = groups['run'][laid]
+        present = card_ids[laid] >= 0
+        ids = np.where(present, card_ids[laid], 0)
+        wild = present & CARD_WILD[ids]
+        regular = present & ~wild
+        suit, mask, run_index = groups['suit'][laid], groups['mask'][laid], groups['run_index'][laid]
+
+        rows = rows[laid]
+        slots = self.n_melds[rows, seat]
+        meld = np.zeros((rows.size, MELD_FIELDS), dtype=np.int64)
+        meld[:, MELD_TYPE] = np.where(is_run, MELD_RUN, MELD_SET)
+        meld[:, MELD_SUIT] = np.where(is_run, suit, -1)
+        meld[:, MELD_MASK] = mask
+        meld[:, MELD_REGULAR] = regular.sum(axis=1)
+        meld[:, MELD_WILD] = np.where(wild, ids, -1).max(axis=1)
+        meld[:, MELD_FIRST] = np.where(is_run, suit * RANK_BITS + RUN_FIRST_RANK[run_index],
+                                       ids[np.arange(rows.size), np.argmax(regular, axis=1)])
+        meld[:, MELD_LENGTH] = present.sum(axis=1)
+        meld[:, MELD_POINTS] = np.where(present, CARD_POINTS[ids], 0).sum(axis=1)
+
+        self.melds[rows, seat, slots] = meld
+        self.n_melds[rows, seat] += 1
+        row_index, column = np.nonzero(present)
+        np.subtract.at(self.hands, (rows[row_index], seat, ids[row_index, column]), 1)
+        return laid
+
+    def meld_wildcard_position(self, rows, seat):
+        """
+        Position of the wildcard inside every meld of the seat, -1 when there is none.
+        """
+        melds = self.melds[rows, seat]
+        has_wild = melds[:, :, MELD_WILD] >= 0
+        run_position = RUN_WILD_POSITION[run_table_index(melds[:, :, MELD_MASK], has_wild.astype(np.int64))]
+        position = np.where(melds[:, :, MELD_TYPE] == MELD_RUN, run_position, melds[:, :, MELD_REGULAR])
+        return np.where(has_wild, position, -1)
+
+    @property
+    def finished_matches(self):
+        return sum(winners.size for winners in self._results['winner'])
+
+    @property
+    def results(self):
+        """
+        Completed matches: winner seat, final scores and total turns (so scores / turns is the
+        Player.score_evaluation of every seat).
+        """
+        if not self._results['winner']:
+            return {'winner': np.zeros(0, dtype=np.int64),
+                    'scores': np.zeros((0, self.n_players), dtype=np.int64),
+                    'turns': np.zeros(0, dtype=np.int64)}
+        return {key: np.concatenate(values) for key, values in self._results.items()}
+
+
+def classify_groups(card_ids):
+    """
+    Vectorized Meld validation of groups of cards.
+
+    Args:
+        card_ids (numpy.ndarray): (k, L) card ids, padded with -1.
+
+    Returns:
+        dict: Arrays of length k: 'valid' and 'run' flags, 'suit' of the regular cards (meaningful for runs),
+              rank 'mask' of the regular cards and 'run_index' in the run pattern table.
+    """
+    present = card_ids >= 0
+    ids = np.where(present, card_ids, 0)
+    wild = present & CARD_WILD[ids]
+    regular = present & ~wild
+
+    n_wild = wild.sum(axis=1)
+    n_regular = regular.sum(axis=1)
+    mask = np.bitwise_or.reduce(np.where(regular, CARD_BIT[ids], 0), axis=1)
+    suit_low = np.where(regular, CARD_SUIT[ids], N_CARD_IDS).min(axis=1)
+    suit_high = np.where(regular, CARD_SUIT[ids], -1).max(axis=1)
+
+    playable = (n_regular + n_wild >= MIN_MELD_LENGTH) & (n_wild <= MAX_WILDCARDS) & (mask > 0)
+    is_set = playable & ((mask & (mask - 1)) == 0)
+    run_index = run_table_index(mask, np.minimum(n_wild, MAX_WILDCARDS))
+    is_run = (playable & ~is_set & (suit_low == suit_high) & (n_regular == POPCOUNT[mask])
+              & RUN_VALID[run_index])
+    return {'valid': is_set | is_run, 'run': is_run, 'suit': suit_low, 'mask': mask, 'run_index': run_index}
+
+
+def _count_ids(n_rows, row_index, card_ids):
+    counts = np.zeros((n_rows, N_CARD_IDS), dtype=np.int64)
+    np.add.at(counts, (row_index, card_ids), 1)
+    return counts
+
+
+def hand_card_ids(hands, positions):
+    """
+    Card id at the given position of every hand, positions follow card id order as in CardCounts.
+
+    Args:
+        hands (numpy.ndarray): (k, N_CARD_IDS) count matrix.
+        positions (numpy.ndarray): (k,) positions, they must be smaller than the hand sizes.
+    """
+    return (np.cumsum(hands, axis=1) <= positions[:, None]).sum(axis=1)
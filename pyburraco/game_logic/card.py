@@ -1,36 +1,94 @@
 """
 Module: Card
 Author: Alessandro Tinucci
-Version: 1.0
+Version: 1.1
 Description: Card representation for Burraco.
 
 This module defines the Card class, used to represent a playing card in Burraco.
+
+Cards are interned: there is exactly one Card object for each of the 53 distinct cards
+(13 ranks in 4 suits plus the Joker), so calling Card(suit, rank) returns the shared instance
+and equality is identity. Every card carries a precomputed integer id, rank index, suit index,
+point value and wildcard flag, so game code never needs to compare or look up strings.
 """
 
+RANK_ORDER = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+SUIT_ORDER = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+
+CARD_POINT_VALUES = {
+    '2': 20, '3': 5, '4': 5, '5': 5, '6': 5, '7': 5,
+    '8': 10, '9': 10, '10': 10, 'J': 10, 'Q': 10, 'K': 10, 'A': 15,
+    'Joker': 30
+}
+
+# Card ids: suit_index * 13 + rank_index for the regular cards, JOKER_ID for the Joker
+JOKER_ID = len(SUIT_ORDER) * len(RANK_ORDER)
+N_CARD_IDS = JOKER_ID + 1
+
+# Rank and suit index used for the Joker
+JOKER_RANK_INDEX = len(RANK_ORDER)
+JOKER_SUIT_INDEX = len(SUIT_ORDER)
+
+# Copies of every card in a full deck: two standard sets plus four Jokers
+COPIES_PER_CARD = 2
+COPIES_PER_JOKER = 4
+
 
 class Card:
-    def __init__(self, suit, rank):
+    __slots__ = ('suit', 'rank', 'id', 'rank_index', 'suit_index', 'points', 'wildcard')
+
+    _table = {}
+
+    def __new__(cls, suit, rank):
         """
-        Initialize a card with the given suit and rank.
+        Return the card with the given suit and rank.
         Jokers have suit and rank both set to 'Joker'.
         """
-        self.suit = suit
-        self.rank = rank
+        try:
+            return cls._table[(suit, rank)]
+        except KeyError:
+            raise ValueError(f"Invalid card: suit {suit!r}, rank {rank!r}") from None
+
+    @classmethod
+    def _intern(cls, suit, rank, card_id, rank_index, suit_index):
+        card = object.__new__(cls)
+        for name, value in (('suit', suit), ('rank', rank), ('id', card_id), ('rank_index', rank_index),
+                            ('suit_index', suit_index), ('points', CARD_POINT_VALUES[rank]),
+                            ('wildcard', rank in ('2', 'Joker'))):
+            object.__setattr__(card, name, value)
+        cls._table[(suit, rank)] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card objects are shared and cannot be modified")
+
+    def __reduce__(self):
+        # Unpickling goes through Card() and therefore returns the interned instance
+        return Card, (self.suit, self.rank)
 
     def __repr__(self):
         """
         Return the official string representation of the card.
         """
-        if self.is_joker():
+        if self.id == JOKER_ID:
             return "Joker"
         # return f"{self.rank} of {self.suit}"
         return f"{self.rank}-{self.suit[0]}"
 
-    def __eq__(self, other):
-        return self.suit == other.suit and self.rank == other.rank
-
     def is_joker(self):
         """
         Check if the card is a Joker.
         """
-        return self.suit == 'Joker' and self.rank == 'Joker'
+        return self.id == JOKER_ID
+
+
+CARDS = tuple([Card._intern(suit, rank, suit_index * len(RANK_ORDER) + rank_index, rank_index, suit_index)
+               for suit_index, suit in enumerate(SUIT_ORDER)
+               for rank_index, rank in enumerate(RANK_ORDER)]
+              + [Card._intern('Joker', 'Joker', JOKER_ID, JOKER_RANK_INDEX, JOKER_SUIT_INDEX)])
+
+# Card ids of a complete Burraco deck (108 cards)
+DECK_CARD_IDS = tuple([card.id for card in CARDS[:JOKER_ID]] * COPIES_PER_CARD + [JOKER_ID] * COPIES_PER_JOKER)
+
+# Card ids of the wildcards (the four 2s and the Joker)
+WILDCARD_IDS = tuple(card.id for card in CARDS if card.wildcard)
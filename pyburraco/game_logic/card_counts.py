@@ -0,0 +1,234 @@
+"""
+Module: Card Counts
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Compact multiset of cards for Burraco hands and piles.
+
+This module defines the CardCounts class, a count vector indexed by card id. It stores how many
+copies of each of the interned cards are present, and keeps per-suit rank bitmasks, per-rank
+counts and the total points up to date, so adding, removing and looking up a card are O(1) operations.
+
+CardCounts keeps the list interface used by the players (append, remove, pop, indexing, iteration).
+Positions follow card id order, i.e. cards are always sorted by suit and then by rank.
+"""
+
+from .card import CARDS, N_CARD_IDS, SUIT_ORDER, RANK_ORDER, JOKER_ID
+
+N_SUIT_SLOTS = len(SUIT_ORDER) + 1  # Jokers get their own suit slot
+N_RANK_SLOTS = len(RANK_ORDER) + 1  # and their own rank slot
+
+
+class CardCounts:
+    __slots__ = ('_counts', '_suit_masks', '_rank_counts', '_size', '_points')
+
+    def __init__(self, cards=()):
+        """
+        Initialize the multiset with the given cards.
+
+        Args:
+            cards (iterable): Card objects to add.
+        """
+        self._counts = bytearray(N_CARD_IDS)
+        self._suit_masks = [0] * N_SUIT_SLOTS
+        self._rank_counts = [0] * N_RANK_SLOTS
+        self._size = 0
+        self._points = 0
+        for card in cards:
+            self.append(card)
+
+    @classmethod
+    def from_signature(cls, signature):
+        """
+        Rebuild a multiset from the bytes returned by the signature property.
+        """
+        counts = cls()
+        for card_id, count in enumerate(signature):
+            if count:
+                counts._add_id(card_id, count)
+        return counts
+
+    @property
+    def signature(self):
+        """
+        Immutable, hashable snapshot of the counts (one byte per card id).
+        """
+        return bytes(self._counts)
+
+    @property
+    def points(self):
+        """
+        Sum of the point values of the cards.
+        """
+        return self._points
+
+    def _add_id(self, card_id, count=1):
+        card = CARDS[card_id]
+        if not self._counts[card_id]:
+            self._suit_masks[card.suit_index] |= 1 << card.rank_index
+        self._counts[card_id] += count
+        self._rank_counts[card.rank_index] += count
+        self._size += count
+        self._points += card.points * count
+
+    def append(self, card):
+        """
+        Add a card.
+        """
+        self._add_id(card.id)
+
+    add = append
+
+    def extend(self, cards):
+        """
+        Add every card of an iterable.
+        """
+        if isinstance(cards, CardCounts):
+            self.update(cards)
+        else:
+            for card in cards:
+                self._add_id(card.id)
+
+    def update(self, other):
+        """
+        Add all the cards of another CardCounts.
+        """
+        for card_id, count in enumerate(other._counts):
+            if count:
+                self._add_id(card_id, count)
+
+    def remove(self, card):
+        """
+        Remove one copy of a card.
+
+        Raises:
+            ValueError: If the card is not present.
+        """
+        card_id = card.id
+        if not self._counts[card_id]:
+            raise ValueError(f"{card} not in cards")
+        self._counts[card_id] -= 1
+        if not self._counts[card_id]:
+            self._suit_masks[card.suit_index] &= ~(1 << card.rank_index)
+        self._rank_counts[card.rank_index] -= 1
+        self._size -= 1
+        self._points -= card.points
+
+    def pop(self, index=-1):
+        """
+        Remove and return the card at the given position.
+        """
+        card = self[index]
+        self.remove(card)
+        return card
+
+    def clear(self):
+        """
+        Remove every card.
+        """
+        self._counts = bytearray(N_CARD_IDS)
+        self._suit_masks = [0] * N_SUIT_SLOTS
+        self._rank_counts = [0] * N_RANK_SLOTS
+        self._size = 0
+        self._points = 0
+
+    def copy(self):
+        """
+        Return a shallow copy.
+        """
+        counts = CardCounts.__new__(CardCounts)
+        counts._counts = self._counts[:]
+        counts._suit_masks = self._suit_masks[:]
+        counts._rank_counts = self._rank_counts[:]
+        counts._size = self._size
+        counts._points = self._points
+        return counts
+
+    def count(self, card):
+        """
+        Number of copies of a card.
+        """
+        return self._counts[card.id]
+
+    def suit_mask(self, suit_index):
+        """
+        Bitmask of the ranks present in a suit (bit i set for RANK_ORDER[i]).
+        """
+        return self._suit_masks[suit_index]
+
+    def rank_count(self, rank_index):
+        """
+        Number of cards of a rank, across all suits.
+        """
+        return self._rank_counts[rank_index]
+
+    def suit_cards(self, suit_index):
+        """
+        Cards of a suit sorted by rank, with repetitions.
+        """
+        cards = []
+        first_id = suit_index * len(RANK_ORDER)
+        for card_id in range(first_id, min(first_id + len(RANK_ORDER), N_CARD_IDS)):
+            cards.extend([CARDS[card_id]] * self._counts[card_id])
+        return cards
+
+    def rank_cards(self, rank_index):
+        """
+        Cards of a rank sorted by suit, with repetitions.
+        """
+        if rank_index == CARDS[JOKER_ID].rank_index:
+            return [CARDS[JOKER_ID]] * self._counts[JOKER_ID]
+        cards = []
+        for card_id in range(rank_index, JOKER_ID, len(RANK_ORDER)):
+            cards.extend([CARDS[card_id]] * self._counts[card_id])
+        return cards
+
+    def wildcards(self):
+        """
+        Wildcards (2s and Jokers) sorted by card id, with repetitions.
+        """
+        return self.rank_cards(0) + self.rank_cards(CARDS[JOKER_ID].rank_index)
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __contains__(self, card):
+        return self._counts[card.id] > 0
+
+    def __iter__(self):
+        counts = self._counts
+        for card_id in range(N_CARD_IDS):
+            count = counts[card_id]
+            if count:
+                card = CARDS[card_id]
+                for _ in range(count):
+                    yield card
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("card index out of range")
+        for card_id, count in enumerate(self._counts):
+            if index < count:
+                return CARDS[card_id]
+            index -= count
+
+    def __eq__(self, other):
+        if isinstance(other, CardCounts):
+            return self._counts == other._counts
+        if isinstance(other, (list, tuple)):
+            return self._counts == CardCounts(other)._counts
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return CardCounts.from_signature, (self.signature,)
+
+    def __repr__(self):
+        return repr(list(self))
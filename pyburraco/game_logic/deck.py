@@ -5,28 +5,90 @@ Version: 1.0
 Description: Deck management for Burraco.
 
 This module provides functionalities for creating, shuffling, and managing a deck of cards.
+
+The draw pile is a preallocated buffer of card ids read through an index pointer: drawing advances the
+pointer, shuffling permutes the cards left past it and resetting refills the same buffer. Each deck owns
+its NumPy random generator, so decks (and games) can be seeded independently and spawn non-overlapping
+streams for parallel workers without touching any global random state.
 """
 
 
-from .card import Card
-import random
+import numpy as np
+
+from .card import CARDS, DECK_CARD_IDS
+from .card_counts import CardCounts
+
+DECK_SIZE = len(DECK_CARD_IDS)
+_DECK_ORDER = np.array(DECK_CARD_IDS, dtype=np.uint8)
 
 
 class Deck:
-    def __init__(self):
+    def __init__(self, seed=None):
         """
         Initialize the Deck with two sets of standard playing cards and four Jokers.
 
         The deck consists of two complete sets of cards (each set has 52 cards)
         and four Jokers, making a total of 108 cards.
+
+        Args:
+            seed (int, numpy.random.SeedSequence or numpy.random.Generator): Seed of the random stream of
+                the deck. None draws fresh entropy from the OS.
         """
-        self.draw_pile = [Card(suit, rank) for suit in ["Hearts", "Diamonds", "Clubs", "Spades"]
-                      for rank in ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]] * 2
+        self.rng = np.random.default_rng(seed)
+        self._order = np.empty(DECK_SIZE, dtype=np.uint8)
+        self._position = 0
+        self._end = 0
+
+        self.discard_pile = CardCounts()
+        self.reset()
 
-        self.draw_pile.extend([Card('Joker', 'Joker') for _ in range(4)])
+    def reset(self):
+        """
+        Put every card back in the draw pile and shuffle it, reusing the same buffer.
+        """
+        self._order[:] = _DECK_ORDER
+        self._position = 0
+        self._end = DECK_SIZE
+        self.discard_pile.clear()
         self.shuffle()
 
-        self.discard_pile = []
+    def spawn(self, n_decks):
+        """
+        Create decks with independent random streams derived from the one of this deck.
+
+        Args:
+            n_decks (int): Number of decks to create.
+
+        Returns:
+            list: n_decks new Deck objects.
+        """
+        return [Deck(seed=rng) for rng in self.rng.spawn(n_decks)]
+
+    def snapshot(self):
+        """
+        Compact copy of the deck state.
+
+        Returns:
+            tuple: (ids of the cards left in the draw pile in drawing order, discard pile signature)
+        """
+        return bytes(self._order[self._position:self._end]), self.discard_pile.signature
+
+    def restore(self, snapshot):
+        """
+        Restore a state returned by snapshot. The random generator is left as it is.
+        """
+        draw_ids, discard_signature = snapshot
+        self._order[:len(draw_ids)] = np.frombuffer(draw_ids, dtype=np.uint8)
+        self._position = 0
+        self._end = len(draw_ids)
+        self.discard_pile = CardCounts.from_signature(discard_signature)
+
+    @property
+    def draw_pile(self):
+        """
+        Cards left in the draw pile, the last one is drawn first.
+        """
+        return [CARDS[card_id] for card_id in self._order[self._position:self._end][::-1]]
 
     def shuffle(self):
         """
@@ -34,7 +96,7 @@ class Deck:
 
         This method randomizes the order of the cards in the deck.
         """
-        random.shuffle(self.draw_pile)
+        self.rng.shuffle(self._order[self._position:self._end])
 
     def draw_card(self):
         """
@@ -45,14 +107,17 @@ class Deck:
         """
         if self.draw_empty():
             self.reshuffle_discard_pile()
-        return self.draw_pile.pop() if self.draw_pile else None
+        if self._position == self._end:
+            return None
+        card_id = self._order[self._position]
+        self._position += 1
+        return CARDS[card_id]
 
     def draw_discard_pile(self):
         """
         Draw the discard pile.
         """
-        draw_cards = [card for card in self.discard_pile]
-        return draw_cards if self.discard_pile else None
+        return list(self.discard_pile) if self.discard_pile else None
 
     def discard_card(self, card):
         """
@@ -67,8 +132,11 @@ class Deck:
         """
         Reshuffle the discard pile back into the draw pile.
         """
-        self.draw_pile = self.discard_pile
-        self.discard_pile = []
+        n_cards = len(self.discard_pile)
+        self._order[:n_cards] = [card.id for card in self.discard_pile]
+        self._position = 0
+        self._end = n_cards
+        self.discard_pile.clear()
         self.shuffle()
 
     def draw_empty(self):
@@ -78,7 +146,7 @@ class Deck:
         Returns:
             bool: True if the draw pile is empty, False otherwise.
         """
-        return len(self.draw_pile) == 0
+        return self._position == self._end
 
     def discard_empty(self):
         """
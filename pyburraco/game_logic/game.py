@@ -8,8 +8,13 @@ This module handles the game flow, rules, and interactions between different com
 """
 
 
+import numpy as np
+
+from .card import CARDS
 from .deck import Deck
+from .card_counts import CardCounts
 from .game_analytics import GameAnalytics
+from .game_hooks import DRAW, ADD_MELDS, PLAY_MELDS, DISCARD, SCORING
 from utils.logger_config import setup_logger
 
 
@@ -18,8 +23,11 @@ class Game:
     TURN_LIMIT = 1e2
     GAME_LIMIT = 5
 
-    def __init__(self, save_stats=False, log=False):
-        self.deck = Deck()
+    def __init__(self, save_stats=False, log=False, seed=None, hooks=None):
+        self.seed = seed
+        self.deck = Deck(seed=seed)
+        # GameHooks called around every phase of play_round, None disables instrumentation
+        self.hooks = hooks
         self.deck_secondary = []
         self.players = []
 
@@ -35,22 +43,22 @@ class Game:
             self._logger = setup_logger()
 
     def reset(self):
-        self.deck = Deck()
+        self.deck.reset()
         self.deck_secondary = []
         for i, _ in enumerate(self.players):
-            self.deck_secondary.append([])
+            self.deck_secondary.append(CardCounts())
         self.initial_player_index = (self.initial_player_index + 1) % len(self.players)
         self.current_player_index = self.initial_player_index
         self.turn = 0
         self.game_over = False
 
         for i, player in enumerate(self.players):
-            player.hand = []
+            player.hand = CardCounts()
             player.melds = []
             player.turn_history.append(player.turn)
             player.turn = 0
             player.round += 1
-            self.deck_secondary[i] = []
+            self.deck_secondary[i] = CardCounts()
 
     def reset_game(self):
         self.reset()
@@ -60,8 +68,77 @@ class Game:
             player.round = 0
             player.secondary_deck = False
 
+    def snapshot(self):
+        """
+        Compact copy of the game state between two turns, made of flat tuples of card ids and counters.
+        The random generator of the deck is not included.
+        """
+        return (self.deck.snapshot(), tuple(deck.signature for deck in self.deck_secondary),
+                tuple(player.snapshot() for player in self.players),
+                self.initial_player_index, self.current_player_index, self.turn, self.round, self.game_over,
+                None if self.winner is None else self.players.index(self.winner))
+
+    def restore(self, snapshot):
+        """
+        Restore a state returned by snapshot on a game with the same players.
+        """
+        (deck, deck_secondary, players, self.initial_player_index, self.current_player_index, self.turn,
+         self.round, self.game_over, winner) = snapshot
+        self.deck.restore(deck)
+        self.deck_secondary = [CardCounts.from_signature(signature) for signature in deck_secondary]
+        for player, player_snapshot in zip(self.players, players):
+            player.restore(player_snapshot)
+        self.winner = None if winner is None else self.players[winner]
+
+    def clone(self, seed=None):
+        """
+        Independent copy of the game, with cloned players and a deck drawing from a new random stream.
+
+        Args:
+            seed (int, numpy.random.SeedSequence or numpy.random.Generator): Seed of the copy's deck.
+        """
+        game = Game(seed=seed)
+        game.players = [player.clone() for player in self.players]
+        for player in game.players:
+            player.game = game
+        game.restore(self.snapshot())
+        return game
+
+    def determinize(self, player_index, rng=None):
+        """
+        Resample the information hidden from a player: the hands of the other players, the order of the draw
+        pile and the secondary decks still on the table. Card counts of every place are kept.
+
+        Args:
+            player_index (int): Index of the player whose point of view is kept.
+            rng (numpy.random.Generator): Generator used for the resampling, the deck's one by default.
+
+        Returns:
+            Game: The game itself.
+        """
+        rng = self.deck.rng if rng is None else rng
+        hidden = [player.hand for i, player in enumerate(self.players) if i != player_index]
+        hidden.extend(deck for deck in self.deck_secondary if deck)
+        draw_ids, discard = self.deck.snapshot()
+
+        pool = np.frombuffer(draw_ids, dtype=np.uint8).tolist()
+        for cards in hidden:
+            pool.extend(card.id for card in cards)
+        pool = rng.permutation(pool).tolist()
+
+        start = len(draw_ids)
+        self.deck.restore((bytes(pool[:start]), discard))
+        for cards in hidden:
+            size = len(cards)
+            cards.clear()
+            cards.extend(CARDS[card_id] for card_id in pool[start:start + size])
+            start += size
+        return self
+
     def add_player(self, player):
         self.players.append(player)
+        # Players searching ahead (e.g. PlayerMC) read the game they sit at
+        player.game = self
 
     def setup_game(self):
         # Shuffle the deck
@@ -69,7 +146,7 @@ class Game:
         self.deck_secondary = []
 
         for i, _ in enumerate(self.players):
-            self.deck_secondary.append([])
+            self.deck_secondary.append(CardCounts())
 
         # Deal initial cards to each player
         for _ in range(self.NUMBER_OF_INITIAL_CARDS):
@@ -90,6 +167,8 @@ class Game:
         self.setup_match()
         while not self.winner:
             self.setup_game()
+            if self.hooks is not None:
+                self.hooks.round_started(self)
 
             while not self.game_over:
                 self.play_round()
@@ -117,78 +196,116 @@ class Game:
                 self.round += 1
                 self.reset()
 
+        if self.hooks is not None:
+            self.hooks.match_finished(self)
         self.reset_game()
 
     def play_round(self):
         # Basic structure of a player's turn
         player = self.players[self.current_player_index]
+        hooks = self.hooks
 
         # 1. Drawing Phase: Draw from deck or pick discard pile
+        if hooks is not None:
+            hooks.phase_started(self, player, DRAW)
         if player.draw_card(discard_deck=self.deck.discard_pile):
-            player.hand.append(self.deck.draw_card())
+            card = self.deck.draw_card()
+            if card is not None:
+                player.hand.append(card)
+            drawn = 'deck'
         else:
-            for _ in range(len(self.deck.discard_pile)):
-                player.hand.append(self.deck.discard_pile.pop())
+            player.hand.update(self.deck.discard_pile)
+            self.deck.discard_pile.clear()
+            drawn = 'discard_pile'
+        if hooks is not None:
+            hooks.phase_finished(self, player, DRAW, drawn)
 
         if self._debug:
             self._logger.debug(f'Player: {player.name}. Hand: {player.hand}')
             self._logger.debug(f'Melds: {[meld.cards for meld in player.melds]}\n')
 
         # 2. Additional Cards Phase: Add cards to existing melds
+        if hooks is not None:
+            hand_size = len(player.hand)
+            hooks.phase_started(self, player, ADD_MELDS)
         player.add_melds()
+        if hooks is not None:
+            hooks.phase_finished(self, player, ADD_MELDS, hand_size - len(player.hand))
 
         if self._debug:
             self._logger.debug(f'Player: {player.name}. Hand: {player.hand}')
             self._logger.debug(f'Melds: {[meld.cards for meld in player.melds]}\n')
 
         # 3. Melding Phase: Player lays down valid melds if any
+        if hooks is not None:
+            hand_size = len(player.hand)
+            hooks.phase_started(self, player, PLAY_MELDS)
         player.play_melds()
+        if hooks is not None:
+            hooks.phase_finished(self, player, PLAY_MELDS, hand_size - len(player.hand))
 
         if self._debug:
             self._logger.debug(f'Player: {player.name}. Hand: {player.hand}')
             self._logger.debug(f'Melds: {[meld.cards for meld in player.melds]}\n')
 
         # 4. Discarding Phase: Discard a card to end the turn
+        if hooks is not None:
+            hooks.phase_started(self, player, DISCARD)
         if (len(player.hand) > 1 or
                 (len(player.hand) == 1 and (player.burraco or not player.secondary_deck))):
             self.deck.discard_pile.append(player.discard_card())
+            if hooks is not None:
+                picks_secondary = not player.hand and not player.secondary_deck and self.turn < self.TURN_LIMIT
+                hooks.phase_finished(self, player, DISCARD, 'discard_secondary_deck' if picks_secondary else 'discard')
 
-            # 5. Check for win condition
-            if len(player.hand) == 0 and player.burraco and player.secondary_deck:
-                self.game_over = True
-                self.count_score(player, True)
-
-            elif self.turn >= self.TURN_LIMIT:
-                self.game_over = True
-                self.count_score(player, False)
-
-            else:
-                # 4.1 Pick secondary deck and pass
-                if len(player.hand) == 0 and not player.secondary_deck:
-                    while self.deck_secondary[self.current_player_index]:
-                        player.hand.append(self.deck_secondary[self.current_player_index].pop())
-                    player.secondary_deck = True
-
-                # 4.2 Move to next player
-                self.next_player()
-                if self.current_player_index == 0:
-                    for player in self.players:
-                        player.turn += 1
-                    self.turn += 1
+            self.finish_turn(player)
 
         # 4.3 Pick secondary deck and continue playing
         elif len(player.hand) == 0 and not player.secondary_deck:
-            while self.deck_secondary[self.current_player_index]:
-                player.hand.append(self.deck_secondary[self.current_player_index].pop())
-            player.secondary_deck = True
+            self.pick_secondary_deck(player)
+            if hooks is not None:
+                hooks.phase_finished(self, player, DISCARD, 'secondary_deck')
 
         else:
             raise ValueError("No cards to discard. Program will terminate.")
 
+    def finish_turn(self, player):
+        """
+        End the turn of player once its card is discarded: score the round if it is over, or pick the secondary
+        deck if needed and move to the next player.
+        """
+        # 5. Check for win condition
+        if len(player.hand) == 0 and player.burraco and player.secondary_deck:
+            self.game_over = True
+            self.count_score(player, True)
+
+        elif self.turn >= self.TURN_LIMIT:
+            self.game_over = True
+            self.count_score(player, False)
+
+        else:
+            # 4.1 Pick secondary deck and pass
+            if len(player.hand) == 0 and not player.secondary_deck:
+                self.pick_secondary_deck(player)
+
+            # 4.2 Move to next player
+            self.next_player()
+            if self.current_player_index == 0:
+                for player in self.players:
+                    player.turn += 1
+                self.turn += 1
+
+    def pick_secondary_deck(self, player):
+        player.hand.update(self.deck_secondary[self.current_player_index])
+        self.deck_secondary[self.current_player_index].clear()
+        player.secondary_deck = True
+
     def next_player(self):
         self.current_player_index = (self.current_player_index + 1) % len(self.players)
 
     def count_score(self, end_player, closed):
+        if self.hooks is not None:
+            self.hooks.phase_started(self, end_player, SCORING)
         for i, player in enumerate(self.players):
             # TODO: Calculate Burraco Bonuses
             if player is end_player and closed:
@@ -198,3 +315,6 @@ class Game:
                 player.score -= 100
 
             player.score += player.points
+
+        if self.hooks is not None:
+            self.hooks.phase_finished(self, end_player, SCORING, 'closed' if closed else 'turn_limit')
@@ -0,0 +1,88 @@
+"""
+Module: Game Hooks
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Instrumentation hooks for Burraco games.
+
+This module defines the GameHooks interface called by Game around each round, match and phase of a turn, and
+PhaseProfiler, a hook collecting per-phase wall time, call counts and outcomes. A Game without hooks
+only pays a None check per phase.
+
+Outcomes reported to phase_finished:
+    DRAW: 'deck' or 'discard_pile'
+    ADD_MELDS, PLAY_MELDS: number of cards moved from the hand to the melds
+    DISCARD: 'discard', 'discard_secondary_deck' (hand emptied by the discard) or 'secondary_deck'
+             (hand emptied by the melds, the player keeps playing)
+    SCORING: 'closed' or 'turn_limit'
+"""
+
+import time
+from collections import Counter
+
+DRAW = 'draw'
+ADD_MELDS = 'add_melds'
+PLAY_MELDS = 'play_melds'
+DISCARD = 'discard'
+SCORING = 'scoring'
+PHASES = (DRAW, ADD_MELDS, PLAY_MELDS, DISCARD, SCORING)
+
+
+class GameHooks:
+    def round_started(self, game):
+        # Called once the cards of a round are dealt
+        pass
+
+    def match_finished(self, game):
+        # Called when play_game has a winner, before the scores are reset
+        pass
+
+    def phase_started(self, game, player, phase):
+        # Called right before a phase of player's turn
+        pass
+
+    def phase_finished(self, game, player, phase, outcome):
+        # Called right after the phase, with its outcome
+        pass
+
+
+class PhaseProfiler(GameHooks):
+    def __init__(self, clock=time.perf_counter):
+        """
+        Args:
+            clock (callable): Function returning the current time in seconds.
+        """
+        self._clock = clock
+        self._started = 0.0
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.outcomes = {phase: Counter() for phase in PHASES}
+
+    def phase_started(self, game, player, phase):
+        self._started = self._clock()
+
+    def phase_finished(self, game, player, phase, outcome):
+        self.times[phase] += self._clock() - self._started
+        self.calls[phase] += 1
+        self.outcomes[phase][outcome] += 1
+
+    def reset(self):
+        """
+        Clear the collected data.
+        """
+        for phase in PHASES:
+            self.times[phase] = 0.0
+            self.calls[phase] = 0
+            self.outcomes[phase].clear()
+
+    def report(self):
+        """
+        Summarize the collected data.
+
+        Returns:
+            dict: For every phase, total and mean wall time, number of calls and outcome counts.
+        """
+        return {phase: {'time': self.times[phase],
+                        'mean_time': self.times[phase] / self.calls[phase] if self.calls[phase] else 0.0,
+                        'calls': self.calls[phase],
+                        'outcomes': dict(self.outcomes[phase])}
+                for phase in PHASES}
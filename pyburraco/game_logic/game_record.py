@@ -0,0 +1,407 @@
+"""
+Module: Game Record
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Compact binary records of Burraco matches.
+
+This module stores every match played by Game.play_game as a short byte string: the seed, the deal of
+every round and the actions of every turn as small integer card ids. GameRecorder is a GameHooks that
+builds the records while the game runs, GameRecordWriter appends them to chunked files, read_records
+streams them back and GameReplay rebuilds the state at any turn without running the players again.
+
+A record is a header (format version, number of players, seed) followed by a stream of events. Each
+event is an opcode byte followed by its payload: seats, meld indexes and card ids take one byte, counts
+and scores are (zigzag) varints. A chunk file is a magic string followed by length-prefixed records.
+"""
+
+import os
+import struct
+
+from .card import CARDS
+from .card_counts import CardCounts
+from .meld import Meld
+from .game_hooks import GameHooks, DRAW, ADD_MELDS, PLAY_MELDS, DISCARD
+
+RECORD_VERSION = 1
+CHUNK_MAGIC = b'BRCR\x01'
+NO_CARD = 0xFF
+
+# Seed kinds
+SEED_NONE = 0
+SEED_INT = 1
+SEED_SEQUENCE = 2
+
+# Event opcodes
+ROUND = 0               # round, then hand and secondary deck of every seat
+DRAW_DECK = 1           # seat, card id (NO_CARD if the deck was empty)
+DRAW_DECK_RESHUFFLE = 2  # same as DRAW_DECK, the discard pile was reshuffled into the deck first
+DRAW_DISCARD = 3        # seat
+ADD = 4                 # meld index, card ids
+PLAY = 5                # card ids
+DISCARD_CARD = 6        # card id
+SECONDARY = 7           # (no payload) the seat to move picks its secondary deck
+SCORE = 8               # closed, then the score of every seat
+END = 9                 # winner seat
+
+_LENGTH = struct.Struct('<I')
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _write_cards(out, card_ids):
+    _write_varint(out, len(card_ids))
+    out.extend(card_ids)
+
+
+def _read_cards(data, position):
+    n_cards, position = _read_varint(data, position)
+    return list(data[position:position + n_cards]), position + n_cards
+
+
+def _write_seed(out, seed):
+    if isinstance(seed, int) and seed >= 0:
+        out.append(SEED_INT)
+        _write_varint(out, seed)
+    elif isinstance(getattr(seed, 'entropy', None), int):
+        out.append(SEED_SEQUENCE)
+        _write_varint(out, seed.entropy)
+        _write_varint(out, len(seed.spawn_key))
+        for key in seed.spawn_key:
+            _write_varint(out, key)
+    else:
+        # No seed or a Generator: the deal and the drawn cards are still recorded
+        out.append(SEED_NONE)
+
+
+def _card_ids(cards):
+    return [card.id for card in cards]
+
+
+def _added_ids(before, after):
+    # Card ids present in the signature after and not before, with repetitions
+    return [card_id for card_id, (old, new) in enumerate(zip(before, after)) for _ in range(new - old)]
+
+
+class GameRecorder(GameHooks):
+    def __init__(self, writer):
+        """
+        Args:
+            writer: Object receiving every finished record through writer.append(bytes), e.g. a
+                GameRecordWriter or a list.
+        """
+        self.writer = writer
+        self._record = None
+        self._hand = None
+        self._discard = None
+        self._melds = None
+
+    def round_started(self, game):
+        if self._record is None:
+            self._record = bytearray([RECORD_VERSION, len(game.players)])
+            _write_seed(self._record, game.seed)
+
+        record = self._record
+        record.append(ROUND)
+        _write_varint(record, game.round)
+        for player in game.players:
+            _write_cards(record, _card_ids(player.hand))
+        for deck in game.deck_secondary:
+            _write_cards(record, _card_ids(deck))
+
+    def match_finished(self, game):
+        self._record.append(END)
+        self._record.append(game.players.index(game.winner))
+        self.writer.append(bytes(self._record))
+        self._record = None
+
+    def phase_started(self, game, player, phase):
+        if phase == DRAW:
+            self._hand = player.hand.signature
+            self._discard = len(game.deck.discard_pile)
+        elif phase == ADD_MELDS:
+            self._melds = [meld.cards[:] for meld in player.melds]
+        elif phase == PLAY_MELDS:
+            self._melds = len(player.melds)
+        elif phase == DISCARD:
+            self._discard = game.deck.discard_pile.signature
+
+    def phase_finished(self, game, player, phase, outcome):
+        record = self._record
+        if phase == DRAW:
+            seat = game.current_player_index
+            if outcome == 'discard_pile':
+                record.extend((DRAW_DISCARD, seat))
+            else:
+                drawn = _added_ids(self._hand, player.hand.signature)
+                reshuffled = self._discard > 0 and not game.deck.discard_pile
+                record.extend((DRAW_DECK_RESHUFFLE if reshuffled else DRAW_DECK, seat,
+                               drawn[0] if drawn else NO_CARD))
+
+        elif phase == ADD_MELDS:
+            if outcome:
+                for index, cards in enumerate(self._melds):
+                    added = _added_ids(CardCounts(cards).signature, CardCounts(player.melds[index].cards).signature)
+                    if added:
+                        record.extend((ADD, index))
+                        _write_cards(record, added)
+
+        elif phase == PLAY_MELDS:
+            for meld in player.melds[self._melds:]:
+                record.append(PLAY)
+                _write_cards(record, _card_ids(meld.cards))
+
+        elif phase == DISCARD:
+            if outcome != 'secondary_deck':
+                record.append(DISCARD_CARD)
+                record.append(_added_ids(self._discard, game.deck.discard_pile.signature)[0])
+            if outcome != 'discard':
+                record.append(SECONDARY)
+
+        else:
+            record.extend((SCORE, outcome == 'closed'))
+            for scoring_player in game.players:
+                # Zigzag encoding of the signed score
+                _write_varint(record, scoring_player.score * 2 if scoring_player.score >= 0
+                              else -scoring_player.score * 2 - 1)
+
+
+class GameRecordWriter:
+    def __init__(self, directory, prefix='games', records_per_chunk=1000):
+        """
+        Append records to chunk files named <prefix>_<chunk>.bin.
+
+        Args:
+            directory (str): Directory of the chunk files, created if missing.
+            prefix (str): Name prefix of the chunk files.
+            records_per_chunk (int): Records written to a file before moving to the next one.
+        """
+        self._directory = directory
+        self._prefix = prefix
+        self._records_per_chunk = records_per_chunk
+        self._file = None
+        self._chunk = 0
+        self._n_records = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def chunk_paths(self):
+        return [os.path.join(self._directory, f"{self._prefix}_{chunk:05d}.bin") for chunk in range(self._chunk + 1)]
+
+    def append(self, record):
+        """
+        Write a record, opening a new chunk file when the current one is full.
+        """
+        if self._file is None or self._n_records >= self._records_per_chunk:
+            if self._file is not None:
+                self._file.close()
+                self._chunk += 1
+            self._file = open(os.path.join(self._directory, f"{self._prefix}_{self._chunk:05d}.bin"), 'wb')
+            self._file.write(CHUNK_MAGIC)
+            self._n_records = 0
+        self._file.write(_LENGTH.pack(len(record)))
+        self._file.write(record)
+        self._n_records += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_records(path):
+    """
+    Stream the records of a chunk file.
+
+    Raises:
+        ValueError: If the file is not a chunk file.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(CHUNK_MAGIC)) != CHUNK_MAGIC:
+            raise ValueError(f"{path} is not a game record chunk")
+        while True:
+            header = file.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+            yield file.read(_LENGTH.unpack(header)[0])
+
+
+class ReplayState:
+    def __init__(self, n_players):
+        self.round = 0
+        self.seat = None
+        self.hands = [CardCounts() for _ in range(n_players)]
+        self.secondary_decks = [CardCounts() for _ in range(n_players)]
+        self.secondary_taken = [False] * n_players
+        self.melds = [[] for _ in range(n_players)]
+        self.discard_pile = CardCounts()
+        self.scores = [0] * n_players
+
+
+class GameReplay:
+    def __init__(self, record):
+        """
+        Decode a match record.
+
+        Args:
+            record (bytes): A record produced by GameRecorder.
+
+        Raises:
+            ValueError: If the record was written with another format version.
+        """
+        if record[0] != RECORD_VERSION:
+            raise ValueError(f"Unsupported game record version {record[0]}")
+        self.n_players = record[1]
+        self.seed, position = self._read_seed(record, 2)
+        self.events = []
+        self.winner = None
+        self._turns = []  # Event index of every draw
+
+        while position < len(record):
+            opcode = record[position]
+            position += 1
+            if opcode == ROUND:
+                round_index, position = _read_varint(record, position)
+                deal = []
+                for _ in range(2 * self.n_players):
+                    cards, position = _read_cards(record, position)
+                    deal.append(cards)
+                payload = (round_index, deal)
+            elif opcode in (DRAW_DECK, DRAW_DECK_RESHUFFLE):
+                payload = (record[position], record[position + 1])
+                position += 2
+                self._turns.append(len(self.events))
+            elif opcode == DRAW_DISCARD:
+                payload = record[position]
+                position += 1
+                self._turns.append(len(self.events))
+            elif opcode == ADD:
+                index = record[position]
+                cards, position = _read_cards(record, position + 1)
+                payload = (index, cards)
+            elif opcode == PLAY:
+                payload, position = _read_cards(record, position)
+            elif opcode == DISCARD_CARD:
+                payload = record[position]
+                position += 1
+            elif opcode == SECONDARY:
+                payload = None
+            elif opcode == SCORE:
+                closed = bool(record[position])
+                position += 1
+                scores = []
+                for _ in range(self.n_players):
+                    value, position = _read_varint(record, position)
+                    scores.append(value >> 1 if not value & 1 else -(value >> 1) - 1)
+                payload = (closed, scores)
+            elif opcode == END:
+                self.winner = record[position]
+                position += 1
+                payload = self.winner
+            else:
+                raise ValueError(f"Unknown game record opcode {opcode}")
+            self.events.append((opcode, payload))
+
+    @staticmethod
+    def _read_seed(record, position):
+        kind = record[position]
+        position += 1
+        if kind == SEED_INT:
+            return _read_varint(record, position)
+        if kind == SEED_SEQUENCE:
+            entropy, position = _read_varint(record, position)
+            n_keys, position = _read_varint(record, position)
+            spawn_key = []
+            for _ in range(n_keys):
+                key, position = _read_varint(record, position)
+                spawn_key.append(key)
+            return (entropy, tuple(spawn_key)), position
+        return None, position
+
+    @property
+    def n_turns(self):
+        return len(self._turns)
+
+    def state_at(self, turn):
+        """
+        Rebuild the state of the match right before the given turn.
+
+        Args:
+            turn (int): Turn index in the match, counting every draw. n_turns gives the final state.
+
+        Returns:
+            ReplayState: Hands, secondary decks, melds (as Meld objects), discard pile and scores.
+        """
+        stop = self._turns[turn] if turn < len(self._turns) else len(self.events)
+        state = ReplayState(self.n_players)
+        for opcode, payload in self.events[:stop]:
+            self._apply(state, opcode, payload)
+        return state
+
+    def _apply(self, state, opcode, payload):
+        if opcode == ROUND:
+            round_index, deal = payload
+            state.round = round_index
+            state.hands = [CardCounts(CARDS[card_id] for card_id in cards) for cards in deal[:self.n_players]]
+            state.secondary_decks = [CardCounts(CARDS[card_id] for card_id in cards)
+                                     for cards in deal[self.n_players:]]
+            state.secondary_taken = [False] * self.n_players
+            state.melds = [[] for _ in range(self.n_players)]
+            state.discard_pile = CardCounts()
+
+        elif opcode in (DRAW_DECK, DRAW_DECK_RESHUFFLE):
+            state.seat, card_id = payload
+            if opcode == DRAW_DECK_RESHUFFLE:
+                state.discard_pile.clear()
+            if card_id != NO_CARD:
+                state.hands[state.seat].append(CARDS[card_id])
+
+        elif opcode == DRAW_DISCARD:
+            state.seat = payload
+            state.hands[state.seat].update(state.discard_pile)
+            state.discard_pile.clear()
+
+        elif opcode == ADD:
+            index, cards = payload
+            meld = state.melds[state.seat][index]
+            meld.cards = meld.cards + [CARDS[card_id] for card_id in cards]
+            for card_id in cards:
+                state.hands[state.seat].remove(CARDS[card_id])
+
+        elif opcode == PLAY:
+            state.melds[state.seat].append(Meld([CARDS[card_id] for card_id in payload]))
+            for card_id in payload:
+                state.hands[state.seat].remove(CARDS[card_id])
+
+        elif opcode == DISCARD_CARD:
+            state.hands[state.seat].remove(CARDS[payload])
+            state.discard_pile.append(CARDS[payload])
+
+        elif opcode == SECONDARY:
+            state.hands[state.seat].update(state.secondary_decks[state.seat])
+            state.secondary_decks[state.seat].clear()
+            state.secondary_taken[state.seat] = True
+
+        elif opcode == SCORE:
+            state.scores = list(payload[1])
@@ -5,7 +5,11 @@ Version: 1.0
 Description: Helper functions for PyBurraco.
 """
 
-RANK_ORDER = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+from .card import RANK_ORDER
+
+ACE_INDEX = RANK_ORDER.index('A')
+KING_INDEX = RANK_ORDER.index('K')
+QUEEN_INDEX = RANK_ORDER.index('Q')
 
 
 def get_card_point_value(card):
@@ -18,12 +22,7 @@ def get_card_point_value(card):
     Returns:
         int: The point value of the card.
     """
-    card_point_values = {
-        '2': 20, '3': 5, '4': 5, '5': 5, '6': 5, '7': 5,
-        '8': 10, '9': 10, '10': 10, 'J': 10, 'Q': 10, 'K': 10, 'A': 15,
-        'Joker': 30
-    }
-    return card_point_values.get(card.rank, 0)
+    return card.points
 
 
 def calculate_meld_points(cards):
@@ -36,7 +35,7 @@ def calculate_meld_points(cards):
     Returns:
         int: The point value of the meld.
     """
-    return sum(get_card_point_value(card) for card in cards)
+    return sum(card.points for card in cards)
 
 
 def all_same_rank(cards):
@@ -49,8 +48,8 @@ def all_same_rank(cards):
     Returns:
         bool: True if all cards have the same rank, False otherwise.
     """
-    first_rank = cards[0].rank
-    return all(card.rank == first_rank for card in cards)
+    first_rank = cards[0].rank_index
+    return all(card.rank_index == first_rank for card in cards)
 
 
 def all_same_suit(cards):
@@ -63,8 +62,8 @@ def all_same_suit(cards):
     Returns:
         bool: True if all cards have the same suit, False otherwise.
     """
-    first_suit = cards[0].suit
-    return all(card.suit == first_suit for card in cards)
+    first_suit = cards[0].suit_index
+    return all(card.suit_index == first_suit for card in cards)
 
 
 def is_consecutive_run(regular_cards, wildcards):
@@ -78,8 +77,8 @@ def is_consecutive_run(regular_cards, wildcards):
     Returns:
         bool: True if the cards can form a consecutive run with at most one wildcard, False otherwise.
     """
-    if (regular_cards[-1].rank == 'A' and regular_cards[-2].rank != 'K' and
-            (not wildcards or regular_cards[-2].rank != 'Q')):
+    if (regular_cards[-1].rank_index == ACE_INDEX and regular_cards[-2].rank_index != KING_INDEX and
+            (not wildcards or regular_cards[-2].rank_index != QUEEN_INDEX)):
         regular_cards.insert(0, regular_cards.pop())
 
     gap_filled = False if wildcards else True
@@ -103,8 +102,8 @@ def card_rank_difference(card1, card2):
     Returns:
         int: The difference in rank.
     """
-    if card2.rank == 'A':
-        return RANK_ORDER.index(card1.rank) + 1
+    if card2.rank_index == ACE_INDEX:
+        return card1.rank_index + 1
     else:
-        return RANK_ORDER.index(card1.rank) - RANK_ORDER.index(card2.rank)
+        return card1.rank_index - card2.rank_index
 
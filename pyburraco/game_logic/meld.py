@@ -1,28 +1,60 @@
 """
 Module: Meld
 Author: Alessandro Tinucci
-Version: 1.0
+Version: 1.1
 Description: Meld management for Burraco.
 
 This module provides functionalities for creating and managing a deck of cards.
+Melds are validated and ordered through the pattern table of meld_table.
+
+MeldList is the list of melds laid by a player. Its melds report every change to it, so the total points,
+the length of the longest meld and the index of the melds accepting each card are kept as running values
+instead of being recomputed on each access.
 """
 
-from .card import Card
-from .helpers import all_same_rank, all_same_suit, is_consecutive_run, card_rank_difference
+from bisect import insort
+from functools import lru_cache
+from itertools import chain
+from operator import attrgetter
+
+from .card import CARDS, N_CARD_IDS, JOKER_ID, WILDCARD_IDS
+from .meld_table import WILDCARD_SLOT, RANK_BITS, meld_signature, lookup_meld
 
-RANK_ORDER = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+_rank_key = attrgetter('rank_index')
 
 
 class Meld:
     def __init__(self, cards=None):
         self._valid = False
         self._meld_type = None
-        self._regular_cards = None
-        self._wildcards = None
+        self._wildcards = []
+        self._suit = None
+        self._rank_mask = 0
+        self._n_regular = 0
+        self._layout = None
+        self._points = 0
+        self._accepted = None
+        self._owner = None
+        self._position = None
         if cards is None:
             self._cards = []
         self.cards = cards
 
+    @classmethod
+    def from_ids(cls, card_ids):
+        """
+        Build a meld from the card ids of a valid meld, copying a cached prototype instead of validating it.
+
+        Args:
+            card_ids (tuple): Card ids of the meld.
+        """
+        prototype = _meld_prototype(card_ids)
+        meld = cls.__new__(cls)
+        meld.__dict__.update(prototype.__dict__)
+        meld._cards = prototype._cards[:]
+        meld._wildcards = prototype._wildcards[:]
+        return meld
+
     @property
     def cards(self):
         return self._cards
@@ -32,6 +64,9 @@ class Meld:
         if new_cards is not None:
             self._cards = new_cards
             self._update_meld_properties()
+            if self._owner is not None:
+                # Replacing the cards can also shorten the meld, the owner recomputes its totals
+                self._owner._recompute()
 
     @property
     def meld_type(self):
@@ -43,48 +78,162 @@ class Meld:
 
     @property
     def regular_cards(self):
-        return self._regular_cards
+        return sorted([card for card in self._cards if not card.wildcard], key=_rank_key)
 
     @property
     def valid(self):
         return self._valid
 
-    def _update_meld_properties(self):
-        # TODO - speedup possible by not recalculating wildcards and regular cards
-        wildcards = [card for card in self._cards if card.rank in ['2', 'Joker']]
-        self._wildcards = wildcards.copy()
+    @property
+    def points(self):
+        """
+        Sum of the point values of the cards in the meld.
+        """
+        return self._points
+
+    @property
+    def signature(self):
+        """
+        (suit index or None, rank bitmask of the regular cards, number of regular cards, number of wildcards).
+        """
+        return self._suit, self._rank_mask, self._n_regular, len(self._wildcards)
 
-        regular_cards = sorted([card for card in self._cards if card.rank not in ['2', 'Joker']],
-                               key=lambda card: RANK_ORDER.index(card.rank))
-        self._regular_cards = regular_cards.copy()
+    @property
+    def accepted_ids(self):
+        """
+        Ids of the cards the meld can take (see can_add), kept until the meld changes.
+        """
+        if self._accepted is None:
+            if self._meld_type == 'Run':
+                candidates = range(self._suit * RANK_BITS, (self._suit + 1) * RANK_BITS)
+            elif self._meld_type == 'Set':
+                candidates = range(self.set_rank, JOKER_ID, RANK_BITS)
+            else:
+                candidates = range(N_CARD_IDS)
+            self._accepted = frozenset(card_id for card_id in chain(candidates, WILDCARD_IDS)
+                                       if self.can_add(CARDS[card_id]) is not None)
+        return self._accepted
+
+    @property
+    def set_rank(self):
+        """
+        Rank index shared by the cards of a set, None for runs and invalid melds.
+        """
+        return self._rank_mask.bit_length() - 1 if self._meld_type == 'Set' else None
+
+    @property
+    def run_ends(self):
+        """
+        Rank slots at the low and high end of a run (WILDCARD_SLOT where the wildcard sits), None otherwise.
+        """
+        return (self._layout[0], self._layout[-1]) if self._meld_type == 'Run' else None
+
+    @property
+    def wildcard_index(self):
+        """
+        Position of the wildcard in the cards of a valid meld, None if there is no wildcard.
+        """
+        if not self._valid or not self._wildcards:
+            return None
+        return self._layout.index(WILDCARD_SLOT) if self._meld_type == 'Run' else self._n_regular
 
-        if not self._cards or len(self._cards) < 3 or len(wildcards) > 1:
-            self._meld_type = None
-            self._valid = False
+    def can_add(self, card):
+        """
+        Check in constant time whether a card can extend the meld.
+
+        Args:
+            card (Card): The card to add.
+
+        Returns:
+            int: The position the card would take in the meld, or None if the meld would not be valid.
+        """
+        meld_type, layout = lookup_meld(*self._signature_with(card))
+        if meld_type is None:
+            return None
+        if meld_type == 'Set':
+            return len(self._cards) if card.wildcard else self._n_regular
+        return layout.index(WILDCARD_SLOT if card.wildcard else card.rank_index)
+
+    def try_add(self, card):
+        """
+        Add a card to the meld if the result is still a valid meld, without revalidating the other cards.
+
+        Args:
+            card (Card): The card to add.
+
+        Returns:
+            bool: True if the card was added, False if the meld is left untouched.
+        """
+        suit, rank_mask, n_regular, n_wildcards = signature = self._signature_with(card)
+        meld_type, layout = lookup_meld(*signature)
+        if meld_type is None:
+            return False
+
+        if meld_type != self._meld_type:
+            # Only an incomplete meld can become valid here, it is ordered from scratch
+            self.cards = self._cards + [card]
+            return True
+
+        cards = self._cards
+        if card.wildcard:
+            cards.insert(len(cards) if meld_type == 'Set' else layout.index(WILDCARD_SLOT), card)
+            self._wildcards.append(card)
+
+        elif meld_type == 'Set':
+            cards.insert(self._n_regular, card)
 
         else:
-            if all_same_rank(regular_cards):
-                self._meld_type = 'Set'
-                self._cards = regular_cards + wildcards
-                self._valid = True
-
-            elif all_same_suit(regular_cards) and is_consecutive_run(regular_cards, wildcards):
-                ordered_cards = [regular_cards[0]]
-                for i in range(1, len(regular_cards)):
-                    if card_rank_difference(regular_cards[i], regular_cards[i - 1]) == 1:
-                        ordered_cards.append(regular_cards[i])
-                    else:
-                        ordered_cards.append(wildcards.pop())
-                        ordered_cards.append(regular_cards[i])
-                if wildcards:
-                    ordered_cards.append(wildcards.pop())
-                self._cards = ordered_cards
-
-                self._meld_type = 'Run'
-                self._valid = True
+            # A regular card can take the gap filled by the wildcard, which then moves to the end
+            position = layout.index(card.rank_index)
+            if n_wildcards:
+                wildcard = cards.pop(self._layout.index(WILDCARD_SLOT))
+                wildcard_position = layout.index(WILDCARD_SLOT)
+                cards.insert(position - 1 if wildcard_position < position else position, card)
+                cards.insert(wildcard_position, wildcard)
             else:
-                self._meld_type = None
-                self._valid = False
+                cards.insert(position, card)
+
+        self._suit, self._rank_mask, self._n_regular, self._layout = suit, rank_mask, n_regular, layout
+        self._points += card.points
+        self._accepted = None
+        if self._owner is not None:
+            self._owner._meld_changed(self, card.points)
+        return True
+
+    def _signature_with(self, card):
+        n_wildcards = len(self._wildcards)
+        if card.wildcard:
+            return self._suit, self._rank_mask, self._n_regular, n_wildcards + 1
+
+        if not self._n_regular:
+            suit = card.suit_index
+        else:
+            suit = self._suit if card.suit_index == self._suit else None
+        return suit, self._rank_mask | (1 << card.rank_index), self._n_regular + 1, n_wildcards
+
+    def _update_meld_properties(self):
+        # Validation is a lookup of the meld signature in the precomputed pattern table
+        cards = self._cards
+        self._suit, self._rank_mask, self._n_regular, n_wildcards = meld_signature(cards)
+        self._meld_type, self._layout = lookup_meld(self._suit, self._rank_mask, self._n_regular, n_wildcards)
+        self._points = sum(card.points for card in cards)
+        self._accepted = None
+        self._valid = self._meld_type is not None
+        self._wildcards = [card for card in cards if card.wildcard] if n_wildcards else []
+
+        if self._meld_type == 'Run':
+            by_rank = {card.rank_index: card for card in cards if not card.wildcard}
+            self._cards = [by_rank[rank] if rank != WILDCARD_SLOT else self._wildcards[0] for rank in self._layout]
+
+        elif self._meld_type == 'Set':
+            self._cards = [card for card in cards if not card.wildcard] + self._wildcards
+
+    def __getstate__(self):
+        # The owning MeldList is not part of the meld, it attaches itself again when rebuilt
+        state = self.__dict__.copy()
+        state['_owner'] = None
+        state['_position'] = None
+        return state
 
     def __str__(self):
         return f"Meld Type: {self._meld_type}, Cards: {self._cards}"
@@ -93,12 +242,144 @@ class Meld:
         return f"Meld Type: {self._meld_type}, Cards: {self._cards}"
 
     def __eq__(self, other):
-        regular_cards = sorted([card for card in self._cards if card.rank not in ['2', 'Joker']],
-                               key=lambda card: RANK_ORDER.index(card.rank))
-        regular_cards.append([card for card in self._cards if card.rank in ['2', 'Joker']])
+        regular_cards = sorted([card for card in self._cards if not card.wildcard], key=_rank_key)
+        regular_cards.append([card for card in self._cards if card.wildcard])
 
-        regular_cards_other = sorted([card for card in other.cards if card.rank not in ['2', 'Joker']],
-                                     key=lambda card: RANK_ORDER.index(card.rank))
-        regular_cards_other.append([card for card in other.cards if card.rank in ['2', 'Joker']])
+        regular_cards_other = sorted([card for card in other.cards if not card.wildcard], key=_rank_key)
+        regular_cards_other.append([card for card in other.cards if card.wildcard])
 
         return regular_cards == regular_cards_other
+
+
+@lru_cache(maxsize=4096)
+def _meld_prototype(card_ids):
+    meld = Meld([CARDS[card_id] for card_id in card_ids])
+    meld.accepted_ids
+    return meld
+
+
+class MeldList(list):
+    """
+    List of melds keeping the total points, the longest meld length and an acceptance index as running values.
+
+    Melds hold a reference to the list they belong to and report card additions through _meld_changed, which
+    updates the index of the melds accepting each card id. Inserting or removing melds, or replacing the cards
+    of a meld, is rare and rebuilds everything.
+    """
+
+    def __init__(self, melds=()):
+        super().__init__()
+        self._points = 0
+        self._max_length = 0
+        self._accepting = [[] for _ in range(N_CARD_IDS)]
+        self._indexed = []
+        self.extend(melds)
+
+    @property
+    def points(self):
+        return self._points
+
+    @property
+    def max_length(self):
+        return self._max_length
+
+    def accepting(self, card):
+        """
+        Melds that can take the card, in list order.
+        """
+        return [self[position] for position in self._accepting[card.id]]
+
+    def first_accepting(self, card):
+        """
+        First meld that can take the card, None if there is none.
+        """
+        positions = self._accepting[card.id]
+        return self[positions[0]] if positions else None
+
+    def _index(self, meld, position):
+        # Positions are indexed in increasing order, so the lists stay sorted
+        meld._owner = self
+        meld._position = position
+        accepted = meld.accepted_ids
+        for card_id in accepted:
+            self._accepting[card_id].append(position)
+        self._indexed.append(accepted)
+        self._points += meld.points
+        self._max_length = max(self._max_length, len(meld.cards))
+
+    def _recompute(self):
+        self._points = 0
+        self._max_length = 0
+        self._accepting = [[] for _ in range(N_CARD_IDS)]
+        self._indexed = []
+        for position, meld in enumerate(self):
+            self._index(meld, position)
+
+    def _meld_changed(self, meld, points_delta):
+        self._points += points_delta
+        self._max_length = max(self._max_length, len(meld.cards))
+
+        position = meld._position
+        old, new = self._indexed[position], meld.accepted_ids
+        for card_id in old - new:
+            self._accepting[card_id].remove(position)
+        for card_id in new - old:
+            insort(self._accepting[card_id], position)
+        self._indexed[position] = new
+
+    @staticmethod
+    def _detach(melds):
+        for meld in melds:
+            meld._owner = None
+            meld._position = None
+
+    def append(self, meld):
+        super().append(meld)
+        self._index(meld, len(self) - 1)
+
+    def insert(self, index, meld):
+        super().insert(index, meld)
+        self._recompute()
+
+    def extend(self, melds):
+        for meld in melds:
+            self.append(meld)
+
+    def __iadd__(self, melds):
+        self.extend(melds)
+        return self
+
+    def __setitem__(self, index, value):
+        self._detach(self[index] if isinstance(index, slice) else [self[index]])
+        super().__setitem__(index, value)
+        self._recompute()
+
+    def __delitem__(self, index):
+        self._detach(self[index] if isinstance(index, slice) else [self[index]])
+        super().__delitem__(index)
+        self._recompute()
+
+    def pop(self, index=-1):
+        meld = super().pop(index)
+        self._detach([meld])
+        self._recompute()
+        return meld
+
+    def remove(self, meld):
+        self.pop(self.index(meld))
+
+    def clear(self):
+        self._detach(self)
+        super().clear()
+        self._recompute()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._recompute()
+
+    def reverse(self):
+        super().reverse()
+        self._recompute()
+
+    def __reduce__(self):
+        return MeldList, (list(self),)
@@ -0,0 +1,122 @@
+"""
+Module: Meld Table
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Precomputed meld patterns for Burraco.
+
+This module builds, once at import time, the table of every valid run pattern. A run is described by
+its signature: the bitmask of the ranks of its regular cards (bit i for RANK_ORDER[i]) and the number of
+wildcards. Suits play no role in the shape of a run, so the same table serves the four suits.
+
+Each valid entry holds the canonical ordering of the run as a tuple of rank indexes, where WILDCARD_SLOT
+marks the position of the wildcard. The ordering follows the rules of helpers.is_consecutive_run: the ace
+is placed low unless the run reaches the king (or the queen, when a wildcard can fill the king), a
+wildcard fills the single missing rank if there is one and is appended at the end otherwise.
+"""
+
+from .card import RANK_ORDER
+from .helpers import ACE_INDEX, KING_INDEX, QUEEN_INDEX
+
+WILDCARD_SLOT = -1
+MAX_WILDCARDS = 1
+MIN_MELD_LENGTH = 3
+
+RANK_BITS = len(RANK_ORDER)
+# 2s are always wildcards, so bit 0 is never set in a run signature
+RUN_RANK_MASK = ((1 << RANK_BITS) - 1) & ~1
+
+
+def run_table_index(rank_mask, n_wildcards):
+    """
+    Position of a run signature in RUN_LAYOUTS.
+    """
+    return (n_wildcards << RANK_BITS) | rank_mask
+
+
+def _run_layout(ranks, n_wildcards):
+    """
+    Canonical ordering of a run made of the given distinct ranks (ascending) and wildcards.
+
+    Returns:
+        tuple: Rank indexes in meld order, with WILDCARD_SLOT for the wildcard, or None if not a run.
+    """
+    if (ranks[-1] == ACE_INDEX and ranks[-2] != KING_INDEX and
+            (not n_wildcards or ranks[-2] != QUEEN_INDEX)):
+        ranks = [ranks[-1]] + ranks[:-1]
+
+    gap_filled = not n_wildcards
+    layout = [ranks[0]]
+    for i in range(1, len(ranks)):
+        rank_gap = ranks[i] + 1 if ranks[i - 1] == ACE_INDEX else ranks[i] - ranks[i - 1]
+        if rank_gap == 1:
+            layout.append(ranks[i])
+        elif rank_gap == 2 and not gap_filled:
+            layout.append(WILDCARD_SLOT)
+            layout.append(ranks[i])
+            gap_filled = True
+        else:
+            return None
+
+    if not gap_filled:
+        layout.append(WILDCARD_SLOT)
+    return tuple(layout)
+
+
+def _build_run_layouts():
+    layouts = [None] * run_table_index(0, MAX_WILDCARDS + 1)
+    for rank_mask in range(0, RUN_RANK_MASK + 1, 2):
+        ranks = [rank for rank in range(RANK_BITS) if rank_mask >> rank & 1]
+        if len(ranks) < 2:
+            continue
+        for n_wildcards in range(MAX_WILDCARDS + 1):
+            if len(ranks) + n_wildcards >= MIN_MELD_LENGTH:
+                layouts[run_table_index(rank_mask, n_wildcards)] = _run_layout(ranks, n_wildcards)
+    return layouts
+
+
+# Canonical run ordering for every (rank mask, wildcard count) signature, None when it is not a run
+RUN_LAYOUTS = _build_run_layouts()
+
+
+def meld_signature(cards):
+    """
+    Compute the signature of a group of cards in a single pass.
+
+    Args:
+        cards (list): A list of Card objects.
+
+    Returns:
+        tuple: (suit index or None if the regular cards mix suits, rank bitmask of the regular cards,
+                number of regular cards, number of wildcards)
+    """
+    suit = None
+    mixed = False
+    rank_mask = 0
+    n_regular = 0
+    for card in cards:
+        if not card.wildcard:
+            if suit is None:
+                suit = card.suit_index
+            elif card.suit_index != suit:
+                mixed = True
+            rank_mask |= 1 << card.rank_index
+            n_regular += 1
+    return None if mixed else suit, rank_mask, n_regular, len(cards) - n_regular
+
+
+def lookup_meld(suit, rank_mask, n_regular, n_wildcards):
+    """
+    Classify a meld signature.
+
+    Returns:
+        tuple: (meld type, run layout). The type is 'Set', 'Run' or None if the cards are not a valid meld,
+               the layout is only given for runs.
+    """
+    if n_regular + n_wildcards < MIN_MELD_LENGTH or n_wildcards > MAX_WILDCARDS or not rank_mask:
+        return None, None
+    if not rank_mask & (rank_mask - 1):
+        return 'Set', None
+    if suit is None or n_regular != rank_mask.bit_count():
+        return None, None
+    layout = RUN_LAYOUTS[run_table_index(rank_mask, n_wildcards)]
+    return ('Run', layout) if layout is not None else (None, None)
@@ -0,0 +1,109 @@
+"""
+Module: Checkpoint Writer
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Background writer of the genetic algorithm checkpoints.
+
+CheckpointWriter writes the saved models and the status of the genetic algorithm from a background thread,
+so the evolution does not wait for the disk. Every file is written to a hidden temporary file in the same
+directory and renamed over the target with os.replace, so a crash never leaves a truncated checkpoint. The
+objects handed to save must not change afterwards (e.g. cloned tensors). An error of the writer thread is
+raised by the next save, flush or close.
+"""
+
+import os
+import pickle
+import queue
+import threading
+
+import torch
+
+TEMPORARY_PREFIX = '.'
+TEMPORARY_SUFFIX = '.tmp'
+
+_STOP = object()
+
+
+def temporary_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, TEMPORARY_PREFIX + name + TEMPORARY_SUFFIX)
+
+
+def is_temporary(name):
+    return name.startswith(TEMPORARY_PREFIX) and name.endswith(TEMPORARY_SUFFIX)
+
+
+def atomic_save(obj, path, dump=torch.save):
+    """
+    Write obj to path with dump(obj, file), through a temporary file renamed over path.
+    """
+    temporary = temporary_path(path)
+    with open(temporary, 'wb') as file:
+        dump(obj, file)
+    os.replace(temporary, path)
+
+
+class CheckpointWriter:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+
+        # Files written so far
+        self.written = 0
+
+    def save(self, obj, path, dump=torch.save):
+        """
+        Queue obj to be written to path with dump(obj, file), torch.save by default.
+        """
+        self._raise_error()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='CheckpointWriter', daemon=True)
+            self._thread.start()
+        self._queue.put((obj, path, dump))
+
+    def save_pickle(self, obj, path):
+        self.save(obj, path, dump=pickle.dump)
+
+    def flush(self):
+        """
+        Wait until every queued file is written.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """
+        Write the queued files and stop the writer thread.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                obj, path, dump = item
+                if self._error is None:
+                    atomic_save(obj, path, dump)
+                    self.written += 1
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
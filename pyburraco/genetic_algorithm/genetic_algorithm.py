@@ -13,19 +13,24 @@ import random
 import os
 import time
 import concurrent.futures
-import multiprocessing
 import pickle
 
 from pyburraco import Game
 from pyburraco.players import PlayerNN
+from pyburraco.players.player_nn import InferenceBroker, Population
+from .worker_pool import WorkerPool
+from .checkpoint_writer import CheckpointWriter, is_temporary
+from .racing import UNCERTAIN, confidence_z, pooled_sd, racing_status
+from .population_checkpoint import dump_population, read_population, stack_players
+from .round_robin import CHUNKS_PER_WORKER, balanced_chunks, mean_scores, round_robin_schedule, score_matrix
 
 SWISS_ROUNDS = 10
 
 
 def play_2p_match(pair):
-    player1, player2 = pair
+    player1, player2, seed = pair
 
-    game = Game(save_stats=False, log=False)
+    game = Game(save_stats=False, log=False, seed=seed)
     game.add_player(player1)
     game.add_player(player2)
     game.play_game()
@@ -39,17 +44,53 @@ def play_2p_match(pair):
     return out_dict
 
 
+# Population of the generation, rebuilt from the shared weights in every worker process
+_worker_population = None
+_worker_entropy = None
+
+
+def _init_match_worker(weights, biases, entropy):
+    global _worker_population, _worker_entropy
+    _worker_population = Population.from_tensors(weights, biases)
+    _worker_entropy = entropy
+
+
+def play_indexed_match(match):
+    """
+    Play a match between two individuals of the worker population.
+
+    Args:
+        match (tuple): (population index of player 1, population index of player 2, spawn key of the seed)
+
+    Returns:
+        tuple: (seat of the winner, score of player 1, score of player 2)
+    """
+    index1, index2, spawn_key = match
+    player1, player2 = _worker_population.player(index1), _worker_population.player(index2)
+    output = play_2p_match((player1, player2, np.random.SeedSequence(_worker_entropy, spawn_key=spawn_key)))
+    return int(output['winner'] != player1.name), output['score1'][-1], output['score2'][-1]
+
+
+def play_indexed_matches(matches):
+    """
+    Play a chunk of matches of play_indexed_match, in order.
+    """
+    return [play_indexed_match(match) for match in matches]
+
+
 def crossover(parent1, parent2):
     """
     Perform crossover between two parent models
     """
     child_model = PlayerNN()
+    parameters1 = dict(parent1.model.named_parameters())
+    parameters2 = dict(parent2.model.named_parameters())
 
     for param_name, param in child_model.model.named_parameters():
         if random.random() < 0.5:  # 50% chance to inherit from each parent
-            param.data.copy_(parent1.model.state_dict()[param_name])
+            param.data.copy_(parameters1[param_name].data)
         else:
-            param.data.copy_(parent2.model.state_dict()[param_name])
+            param.data.copy_(parameters2[param_name].data)
     return child_model
 
 
@@ -85,16 +126,44 @@ class GeneticAlgorithm:
         self._propagate_percentage = float(parameters.get('propagate_percentage', 0.1))
         self._mutation_probability = float(parameters.get('mutation_probability', 0.01))
         self._mutation_scale = float(parameters.get('mutation_scale', 0.1))
+        # With a batch size above 1 the round robin games run in that many threads sharing an InferenceBroker,
+        # the swiss and racing tournaments play on the worker pool and do not batch inference
+        self._inference_batch_size = int(parameters.get('inference_batch_size', 0))
+        self._inference_max_wait = float(parameters.get('inference_max_wait', 0.002))
+        if self._inference_batch_size > 1 and self._tournament_type != "round_robin":
+            raise ValueError(f"inference_batch_size only applies to the round_robin tournament, "
+                             f"not to {self._tournament_type}")
+        # Racing tournament: every individual plays at least racing_min_games and at most SWISS_ROUNDS * n_games
+        # games, individuals surely in or out of the elite at racing_confidence stop playing
+        self._racing_min_games = int(parameters.get('racing_min_games', 3))
+        self._racing_confidence = float(parameters.get('racing_confidence', 0.95))
+        self._games_saved = []
+        # Round robin: every deal is played in both seat orders, the last results are kept in a score matrix
+        self._swap_seats = bool(parameters.get('swap_seats', True))
+        self._score_matrix = None
+        # Every match gets its own child stream, so parallel workers never share or overlap randomness
+        self._seed_sequence = np.random.SeedSequence(parameters.get('seed'))
 
         if self._tournament_type == "swiss":
             self._swiss_rounds = SWISS_ROUNDS
 
         self._data_path = os.path.join(os.getcwd(), 'data')
         self._models_path = os.path.join(self._data_path, 'models')
+        self._population_path = os.path.join(self._data_path, f'population_{self._name}.pop')
         self._players = []
         self._generation_scores = []
         self._time_steps = []
 
+        # Shared population weights and the worker pool mapping them, kept across the generations of
+        # evolve_generations
+        self._population = None
+        self._pool = None
+        self._keep_pool = False
+
+        # Best players of the last generation, the parents of the children, and the writer saving them
+        self._elites = []
+        self._checkpoints = CheckpointWriter()
+
         self._setup_simulation()
 
     def run_generation(self):
@@ -104,21 +173,22 @@ class GeneticAlgorithm:
             for player in self._players:
                 swiss_points[player.name] = 0
 
-            multiprocessing.set_start_method('spawn', force=True)
+            # The workers map the shared weights of the population once and receive only the population indexes
+            # of the players and the spawn keys of the match seeds
+            pool = self._match_pool()
             for iteration in range(self._swiss_rounds):
                 print_progress_bar(iteration=iteration, total=self._swiss_rounds)
 
-                with concurrent.futures.ProcessPoolExecutor(max_workers=self._n_processors) as executor:
+                seeds = self._seed_sequence.spawn(self._n_players // 2)
+                matches = [(self._players[i].model.population_index, self._players[i + 1].model.population_index,
+                            seeds[i // 2].spawn_key) for i in range(0, self._n_players, 2)]
+                results = pool.map(play_indexed_match, matches)
 
-                    player_pairs = [(self._players[i], self._players[i + 1]) for i in range(0, self._n_players, 2)]
-                    parallel_output = list(executor.map(play_2p_match, player_pairs))
-
-                winners = [output['winner'] for output in parallel_output]
-                for i, player in enumerate(self._players):
-                    if i % 2 == 0:
-                        player.score_history.append(parallel_output[int(np.ceil((i - 1) / 2))]['score1'][-1])
-                    else:
-                        player.score_history.append(parallel_output[int(np.ceil((i - 1) / 2))]['score2'][-1])
+                winners = []
+                for i, (winner_seat, score1, score2) in zip(range(0, self._n_players, 2), results):
+                    self._players[i].score_history.append(score1)
+                    self._players[i + 1].score_history.append(score2)
+                    winners.append(self._players[i + winner_seat].name)
 
                 for winner in winners:
                     swiss_points[winner] += 1
@@ -126,47 +196,227 @@ class GeneticAlgorithm:
                 self._players = sorted(self._players, key=lambda p: (swiss_points[p.name],
                                                                      np.mean(p.score_history)), reverse=True)
 
-        elif self._tournament_type == "round_robin":
-            for i in range(self._n_players - 1):
-                for j in range(self._n_players - i - 1):
-                    game = Game(save_stats=False, log=False)
-                    game.add_player(self._players[i])
-                    game.add_player(self._players[i + j + 1])
-
-                    for _ in range(self._n_games):
-                        game.play_game()
+            if not self._keep_pool:
+                self.close_pool()
+
+        elif self._tournament_type == "racing":
+            self._games_saved.append(self._play_racing())
             self._players = sorted(self._players, key=lambda p: np.mean(p.score_history), reverse=True)
 
-        self._generation_scores.append([np.mean(player.score_history) for player in self._players])
+        elif self._tournament_type == "round_robin":
+            schedule = round_robin_schedule(len(self._players), self._n_games, self._swap_seats)
+            if self._inference_batch_size > 1:
+                results = self._play_round_robin_batched(schedule)
+            else:
+                results = self._play_round_robin(schedule)
+            scores, games, wins = score_matrix(len(self._players), schedule, results)
+            self._score_matrix = (scores, games, wins)
+
+            means = mean_scores(scores, games)
+            order = np.argsort(-means, kind='stable')
+            self._players = [self._players[k] for k in order]
+            self._generation_scores.append(means[order].tolist())
+
+        if self._tournament_type != "round_robin":
+            self._generation_scores.append([np.mean(player.score_history) for player in self._players])
 
         for player in self._players:
             player.score_history = []
 
+    def _n_elites(self):
+        return min(len(self._players), int(np.ceil(self._n_players * self._propagate_percentage)))
+
+    def _play_racing(self):
+        """
+        Racing evaluation, see racing.py. Each round pairs the undecided individuals by mean score and plays
+        their matches on the worker pool. A leftover plays a random decided individual with games left, whose
+        extra game adds to its scores but not to its games, or sits the round out if there is none.
+
+        Returns:
+            int: Matches saved against SWISS_ROUNDS * n_games matches per individual.
+        """
+        max_games = SWISS_ROUNDS * self._n_games
+        n_elites = self._n_elites()
+        z = confidence_z(self._racing_confidence)
+        rng = np.random.default_rng(self._seed_sequence.spawn(1)[0])
+        pool = self._match_pool()
+        players = self._players
+        # Games played as the partner of a leftover, outside the budget of the individual
+        extra = np.zeros(len(players), dtype=np.int64)
+
+        while True:
+            counts = np.array([len(player.score_history) for player in players])
+            means = np.array([np.mean(player.score_history) if player.score_history else 0.0 for player in players])
+            status = racing_status(means, counts, pooled_sd([player.score_history for player in players]),
+                                   n_elites, z)
+            games = counts - extra
+            active = [int(i) for i in np.argsort(-means, kind='stable')
+                      if games[i] < max_games and (games[i] < self._racing_min_games or status[i] == UNCERTAIN)]
+            if len(active) % 2:
+                # Every undecided individual with games left is already in the round
+                partners = [i for i in range(len(players)) if i not in active and games[i] < max_games]
+                if partners:
+                    partner = int(rng.choice(partners))
+                    extra[partner] += 1
+                    active.append(partner)
+                else:
+                    active.pop()
+            if not active:
+                break
+
+            seeds = self._seed_sequence.spawn(len(active) // 2)
+            pairs = [(active[k], active[k + 1]) for k in range(0, len(active), 2)]
+            matches = [(players[i].model.population_index, players[j].model.population_index, seed.spawn_key)
+                       for (i, j), seed in zip(pairs, seeds)]
+            for (i, j), (_, score1, score2) in zip(pairs, pool.map(play_indexed_match, matches)):
+                players[i].score_history.append(score1)
+                players[j].score_history.append(score2)
+
+        if not self._keep_pool:
+            self.close_pool()
+        played = sum(len(player.score_history) for player in players)
+        return (len(players) * max_games - played) // 2
+
+    @property
+    def games_saved(self):
+        return self._games_saved
+
+    def _match_pool(self):
+        """
+        Load the players into the shared population and return the worker pool playing their matches. Both are
+        created on first use and reused while the number of players does not change.
+        """
+        if self._population is not None and len(self._population) != len(self._players):
+            self.close_pool()
+        if self._population is None:
+            self._population = Population.from_players(self._players).share_memory()
+            self._pool = WorkerPool(self._n_processors, initializer=_init_match_worker,
+                                    initargs=(self._population.weights, self._population.biases,
+                                              self._seed_sequence.entropy))
+        else:
+            self._population.assign([player.model for player in self._players])
+        return self._pool.start()
+
+    def close_pool(self):
+        """
+        Shut the worker pool down and release the shared population.
+        """
+        if self._pool is not None:
+            self._pool.close()
+        self._pool = None
+        self._population = None
+
+    def _play_round_robin(self, schedule):
+        """
+        Play the games of a round robin schedule on the worker pool, in balanced chunks of games.
+
+        Returns:
+            list: (seat of the winner, score of the first seat, score of the second seat) of every game, in
+                schedule order.
+        """
+        pool = self._match_pool()
+        # Both seat orders of a deal share its seed
+        seeds = self._seed_sequence.spawn(int(schedule[:, 2].max()) + 1 if len(schedule) else 0)
+        indexes = [player.model.population_index for player in self._players]
+        matches = [(indexes[i], indexes[j], seeds[deal].spawn_key) for i, j, deal in schedule.tolist()]
+
+        positions = balanced_chunks(list(range(len(matches))), self._n_processors * CHUNKS_PER_WORKER)
+        chunks = pool.map(play_indexed_matches, [[matches[k] for k in chunk] for chunk in positions])
+        if not self._keep_pool:
+            self.close_pool()
+
+        results = [None] * len(matches)
+        for chunk, chunk_results in zip(positions, chunks):
+            for k, result in zip(chunk, chunk_results):
+                results[k] = result
+        return results
+
+    def _play_round_robin_batched(self, schedule):
+        """
+        Play the round robin in inference_batch_size threads. Every game gets clones of its players, which share
+        the models and an InferenceBroker evaluating the pending states of all the games together.
+
+        Returns:
+            list: Results of the games as in _play_round_robin.
+        """
+        seeds = self._seed_sequence.spawn(int(schedule[:, 2].max()) + 1 if len(schedule) else 0)
+
+        with InferenceBroker(batch_size=self._inference_batch_size, max_wait=self._inference_max_wait) as broker:
+            def play(game):
+                i, j, deal = game
+                player1, player2 = self._players[i].clone(), self._players[j].clone()
+                player1.broker = player2.broker = broker
+                output = play_2p_match((player1, player2, seeds[deal]))
+                return int(output['winner'] != player1.name), output['score1'][-1], output['score2'][-1]
+
+            # Results come back in schedule order, whatever the order the games finished in
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self._inference_batch_size) as executor:
+                return list(executor.map(play, schedule.tolist()))
+
+    @property
+    def score_matrix(self):
+        """
+        (scores, games, wins) matrices of the last round robin, see round_robin.score_matrix.
+        """
+        return self._score_matrix
+
+    def evaluate_against(self, opponent, n_games=None):
+        """
+        Play every player of the population against a fixed opponent, e.g. a PlayerMC.
+
+        Args:
+            opponent (Player): Opponent of every match.
+            n_games (int): Matches per player, n_games of the parameters by default.
+
+        Returns:
+            list: Mean score per turn of every player against the opponent, in population order.
+        """
+        n_games = self._n_games if n_games is None else n_games
+        results = []
+        for player in self._players:
+            history = player.score_history[:]
+            scores = [play_2p_match((player, opponent, seed))['score1'][-1]
+                      for seed in self._seed_sequence.spawn(n_games)]
+            # The matches against the opponent are not part of the tournament scores
+            player.score_history = history
+            results.append(float(np.mean(scores)))
+        opponent.score_history = []
+        return results
+
     def _setup_simulation(self):
         """
         Sets up self._n_players and self._players and load file
         """
 
-        if not os.path.exists(self._models_path):
-            os.mkdir(self._models_path)
-        file_list = [f for f in os.listdir(self._models_path) if os.path.isfile(os.path.join(self._models_path, f))]
+        os.makedirs(self._models_path, exist_ok=True)
+        file_list = self._model_files()
+        checkpoint = read_population(self._population_path) if os.path.isfile(self._population_path) else None
 
         if self._continue_training:
-            self._players = []
-            self._n_players = max(int(np.floor(len(file_list) / self._propagate_percentage)), self._n_players)
+            # The population checkpoint replaces the model files and the status pickle of older runs
+            if checkpoint is not None:
+                self._players = [checkpoint.player(i) for i in range(len(checkpoint))]
+            else:
+                self._players = []
+                for file in file_list:
+                    load_player = PlayerNN()
+                    load_player.load_model(os.path.join(self._models_path, file))
+                    self._players.append(load_player)
+            n_loaded = len(self._players)
+            self._n_players = max(int(np.floor(n_loaded / self._propagate_percentage)), self._n_players)
             if self._tournament_type == "swiss":
                 self._n_players = self._n_players if self._n_players % 2 == 0 else self._n_players + 1
-            for file in file_list:
-                load_player = PlayerNN()
-                load_player.load_model(os.path.join(self._models_path, file))
-                self._players.append(load_player)
+            self._elites = list(self._players)
 
             # Fill the rest with child
-            self.create_child_model(self._n_players - len(file_list))
-            self._load_status()
+            self.create_child_model(self._n_players - n_loaded)
+            if checkpoint is not None:
+                self._load_status(checkpoint.metadata)
+            else:
+                self._load_status()
 
         else:
-            if len(file_list) > 0:
+            if len(file_list) > 0 or checkpoint is not None:
                 user_inp = input("Are you sure you want to delete the saved models? (y/n) ")
                 if user_inp.lower() not in ['y', 'yes', 'y ', 'yes ']:
                     print("Exiting...")
@@ -175,18 +425,24 @@ class GeneticAlgorithm:
             for file_name in file_list:
                 file_path = os.path.join(self._models_path, file_name)
                 os.remove(file_path)
+            if checkpoint is not None:
+                os.remove(self._population_path)
 
             self._n_players = max(self._n_players, 4)
             self._players = [PlayerNN() for _ in range(self._n_players)]
             print(f'Simulating with {self._n_players} players.')
 
+    def _model_files(self):
+        # Saved models, without the temporary files of interrupted checkpoints
+        return [f for f in os.listdir(self._models_path)
+                if os.path.isfile(os.path.join(self._models_path, f)) and not is_temporary(f)]
+
     def create_child_model(self, n_children):
         """
-        Create a child Player based on the saved ones
+        Create a child Player based on the elites kept in memory
         """
         if n_children > 0:
-            file_list = [f for f in os.listdir(self._models_path) if os.path.isfile(os.path.join(self._models_path, f))]
-            num_existing_models = len(file_list)
+            num_existing_models = len(self._elites)
 
             for i in range(n_children):
                 if num_existing_models > 1:
@@ -197,25 +453,35 @@ class GeneticAlgorithm:
                     while parent2_idx == parent1_idx:
                         parent2_idx = random.randint(0, num_existing_models - 1)
 
-                    parent1_name = os.path.join(self._models_path, f"nn_weights_{parent1_idx}.pth")
-                    parent2_name = os.path.join(self._models_path, f"nn_weights_{parent2_idx}.pth")
-
-                    parent1 = PlayerNN()
-                    parent2 = PlayerNN()
-
-                    parent1.load_model(filename=parent1_name)
-                    parent2.load_model(filename=parent2_name)
-
-                    child = crossover(parent1, parent2)
+                    child = crossover(self._elites[parent1_idx], self._elites[parent2_idx])
                     child.model.mutate_weights(probability=self._mutation_probability, scale=self._mutation_scale)
                 else:
                     child = PlayerNN()
-                    child.load_model(filename=os.path.join(self._models_path, file_list[0]))
+                    child.model.load_state_dict(self._elites[0].model.state_dict())
                     child.model.mutate_weights(probability=self._mutation_probability, scale=self._mutation_scale)
 
                 self._players.append(child)
 
+    def save_elites(self):
+        """
+        Queue the elites, best first, and the status of the evolution for saving in the population checkpoint
+        data/population_<name>.pop, written in the background.
+        """
+        self._checkpoints.save((stack_players(self._elites), self._status()), self._population_path,
+                               dump=dump_population)
+
     def evolve_generations(self):
+        # The worker pool and the shared weights live for the whole evolution
+        self._keep_pool = True
+        try:
+            self._evolve_generations()
+        finally:
+            self._keep_pool = False
+            self.close_pool()
+            # Every checkpoint is on disk when the evolution returns
+            self._checkpoints.flush()
+
+    def _evolve_generations(self):
         # Start evolution
         generation = len(self._time_steps)
         while generation < self._generations:
@@ -227,22 +493,14 @@ class GeneticAlgorithm:
             # Print Status
             self._print_evolution(start_time=start_time, generation=generation)
 
-            # Save status of iteration
-            self._save_status()
-
-            # Save top of current generation
-            players_to_remove = []
-            players_to_add = 0
-            for i in range(len(self._players)):
-                if i < self._n_players * self._propagate_percentage:
-                    self._players[i].save_model(name=i)
-                else:
-                    players_to_remove.append(self._players[i])
-                    players_to_add += 1
+            # Keep the top of the current generation in memory, save it with the status in the background
+            n_elites = self._n_elites()
+            self._elites = self._players[:n_elites]
+            self.save_elites()
 
-            # Remove last players
-            for player in players_to_remove:
-                self._players.remove(player)
+            # Replace the other players with children of the elites
+            players_to_add = len(self._players) - n_elites
+            self._players = list(self._elites)
             self.create_child_model(players_to_add)
 
             generation += 1
@@ -259,24 +517,27 @@ class GeneticAlgorithm:
               "iterations/hour: {:>.2f}.".format(generation, max(self._generation_scores[-1]),
                                                  np.mean(self._time_steps),
                                                  formatted_time,
-                                                 60 * 60 / np.mean(self._time_steps)))
-
-    def _save_status(self):
-        file_path = os.path.join(self._data_path, f'genetic_algorithm_status_{self._name}.pkl')
-        parameters = {
-            'time_steps': self._time_steps,
-            'generation_scores': self._generation_scores
+                                                 60 * 60 / np.mean(self._time_steps)), end="")
+        if self._tournament_type == "racing" and self._games_saved:
+            print(" Matches saved by racing: {}.".format(self._games_saved[-1]), end="")
+        print()
+
+    def _status(self):
+        return {
+            'time_steps': [float(step) for step in self._time_steps],
+            'generation_scores': [[float(score) for score in scores] for scores in self._generation_scores]
         }
 
-        with open(file_path, 'wb') as file:
-            pickle.dump(parameters, file)
-
-    def _load_status(self):
+    def _load_status(self, loaded_parameters=None):
+        """
+        Restore the status saved with the population checkpoint, or the status pickle of older runs.
+        """
         file_path = os.path.join(self._data_path, f'genetic_algorithm_status_{self._name}.pkl')
 
         try:
-            with open(file_path, 'rb') as file:
-                loaded_parameters = pickle.load(file)
+            if loaded_parameters is None:
+                with open(file_path, 'rb') as file:
+                    loaded_parameters = pickle.load(file)
 
             self._time_steps = loaded_parameters['time_steps']
             self._generation_scores = loaded_parameters['generation_scores']
@@ -0,0 +1,152 @@
+"""
+Module: Population Checkpoint
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Single file checkpoint of a population of PlayerNN networks.
+
+A population checkpoint holds the parameters of every individual and the metadata of the run (e.g. the status
+of the genetic algorithm) in one file:
+
+    MAGIC (8 bytes) | header length (uint64, little endian) | JSON header | padding | tensor blob
+
+The JSON header lists the parameters by state dict name, each one stacked over the individuals, with its
+dtype, shape and byte offset in the blob, plus the metadata. Every tensor starts at a multiple of ALIGNMENT
+bytes, so read_population maps the file with mmap and hands out views of it: reading the weights of one
+individual only touches its own pages and nothing is deserialized. The views are copy-on-write, changing them
+never changes the file. Checkpoints are written through a temporary file renamed over the target.
+"""
+
+import json
+import struct
+
+import numpy as np
+import torch
+
+from pyburraco.players.player_nn import PlayerNN, Population
+from pyburraco.players.player_nn.player_nn import IN_LAYER_SIZE, OUT_LAYER_SIZE
+from pyburraco.players.player_nn.player_nn_net import PlayerNNNet
+from .checkpoint_writer import atomic_save
+
+MAGIC = b'PYBPOP01'
+PREFIX = struct.Struct('<8sQ')
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def stack_players(players):
+    """
+    Parameters of the networks of some players stacked over the players, by state dict name. The tensors are
+    copies, they can be written in the background while the networks change.
+    """
+    state_dicts = [player.model.state_dict() for player in players]
+    with torch.no_grad():
+        return {name: torch.stack([state_dict[name] for state_dict in state_dicts]).cpu()
+                for name in state_dicts[0]}
+
+
+def dump_population(checkpoint, file):
+    """
+    Write a (tensors, metadata) checkpoint to an open binary file, see the module description. Usable as the
+    dump of CheckpointWriter.save.
+
+    Args:
+        checkpoint (tuple): (tensors, metadata), tensors maps the names of the parameters to tensors stacked
+            over the individuals, metadata is a JSON serializable dict.
+        file (file): Binary file open for writing.
+    """
+    tensors, metadata = checkpoint
+    arrays = {name: np.ascontiguousarray(tensor.detach().cpu().numpy()) for name, tensor in tensors.items()}
+
+    entries, offset = [], 0
+    for name, array in arrays.items():
+        entries.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset = _aligned(offset + array.nbytes)
+    n_individuals = len(next(iter(arrays.values()))) if arrays else 0
+    header = json.dumps({'n_individuals': n_individuals, 'tensors': entries, 'metadata': metadata}).encode()
+
+    file.write(PREFIX.pack(MAGIC, len(header)))
+    file.write(header)
+    position = PREFIX.size + len(header)
+    data_start = _aligned(position)
+    for entry, array in zip(entries, arrays.values()):
+        start = data_start + entry['offset']
+        file.write(b'\0' * (start - position))
+        file.write(array.tobytes())
+        position = start + array.nbytes
+
+
+def save_population(path, players, metadata=None):
+    """
+    Write the networks of some players, in order, and the metadata to a population checkpoint at path.
+    """
+    atomic_save((stack_players(players), metadata or {}), path, dump=dump_population)
+
+
+class PopulationCheckpoint:
+    def __init__(self, path):
+        """
+        Map the population checkpoint at path, see read_population.
+        """
+        with open(path, 'rb') as file:
+            magic, header_length = PREFIX.unpack(file.read(PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a population checkpoint")
+            header = json.loads(file.read(header_length))
+
+        self.path = path
+        self.n_individuals = header['n_individuals']
+        self.metadata = header['metadata']
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='c') if header['tensors'] else None
+
+        data_start = _aligned(PREFIX.size + header_length)
+        self.tensors = {}
+        for entry in header['tensors']:
+            dtype = np.dtype(entry['dtype'])
+            start = data_start + entry['offset']
+            n_bytes = int(np.prod(entry['shape'])) * dtype.itemsize
+            array = self._buffer[start:start + n_bytes].view(dtype).reshape(entry['shape'])
+            self.tensors[entry['name']] = torch.from_numpy(array)
+
+    def __len__(self):
+        return self.n_individuals
+
+    def state_dict(self, index):
+        """
+        Parameters of an individual, views of the mapped file.
+        """
+        return {name: tensor[index] for name, tensor in self.tensors.items()}
+
+    def net(self, index):
+        """
+        New PlayerNNNet with the parameters of an individual.
+        """
+        net = PlayerNNNet(IN_LAYER_SIZE, OUT_LAYER_SIZE)
+        net.load_state_dict(self.state_dict(index))
+        return net
+
+    def player(self, index):
+        """
+        New PlayerNN playing with the network of an individual.
+        """
+        return PlayerNN(model=self.net(index))
+
+    def population(self):
+        """
+        Population viewing the mapped file, the networks of the individuals are created when first asked for.
+        """
+        weights = [tensor for name, tensor in self.tensors.items() if name.endswith('.weight')]
+        biases = [tensor for name, tensor in self.tensors.items() if name.endswith('.bias')]
+        return Population.from_tensors(weights, biases)
+
+
+def read_population(path):
+    """
+    Open a population checkpoint.
+
+    Returns:
+        PopulationCheckpoint: Metadata and copy-on-write mapped parameters of the individuals.
+    """
+    return PopulationCheckpoint(path)
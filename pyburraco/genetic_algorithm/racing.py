@@ -0,0 +1,67 @@
+"""
+Module: Racing
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Racing evaluation of the genetic algorithm population.
+
+Racing spends the games of a generation on the individuals whose side of the elite cutoff is still
+uncertain. Every individual keeps a confidence interval of its mean score, mean +- z * sd / sqrt(games),
+with the standard deviation pooled over the whole population. An individual whose lower bound is above the
+upper bound of enough others to stay in the top n_elites is surely in, one whose upper bound is below the
+lower bound of n_elites others is surely out. Decided individuals stop being scheduled, the others keep
+playing until they are decided or reach the maximum number of games.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+UNCERTAIN = 0
+SURELY_IN = 1
+SURELY_OUT = -1
+
+
+def confidence_z(confidence):
+    """
+    Two-sided normal quantile of a confidence level, e.g. 1.96 for 0.95.
+    """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def racing_status(means, counts, sd, n_elites, z):
+    """
+    Side of the elite cutoff of every individual.
+
+    Args:
+        means (numpy.ndarray): Mean score of every individual.
+        counts (numpy.ndarray): Games played by every individual.
+        sd (float): Standard deviation of a score.
+        n_elites (int): Size of the elite.
+        z (float): Half width of the intervals in standard errors.
+
+    Returns:
+        numpy.ndarray: SURELY_IN, SURELY_OUT or UNCERTAIN for every individual.
+    """
+    means = np.asarray(means, dtype=np.float64)
+    counts = np.asarray(counts)
+    half = np.full(means.shape, np.inf)
+    played = counts > 0
+    half[played] = z * sd / np.sqrt(counts[played])
+    low, high = means - half, means + half
+
+    # Individuals surely below and surely above each one
+    below = (low[:, None] > high[None, :]).sum(axis=1)
+    above = (high[:, None] < low[None, :]).sum(axis=1)
+
+    status = np.full(means.shape, UNCERTAIN)
+    status[below >= means.size - n_elites] = SURELY_IN
+    status[above >= n_elites] = SURELY_OUT
+    return status
+
+
+def pooled_sd(score_lists):
+    """
+    Standard deviation of the scores of the whole population, infinite with fewer than two scores.
+    """
+    scores = [score for scores in score_lists for score in scores]
+    return float(np.std(scores, ddof=1)) if len(scores) > 1 else np.inf
@@ -0,0 +1,80 @@
+"""
+Module: Round Robin
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Scheduling and scoring of the genetic algorithm round robin.
+
+Every pair of individuals plays n_games deals. With seat swapping every deal is played twice, once per seat
+order, so neither individual profits from the seat or the cards of a deal. The schedule is split into chunks
+of about the same number of games, one task per chunk, so the workers pay the task overhead once per chunk
+and finish together. The results are gathered in a score matrix instead of the score history of the players.
+"""
+
+import numpy as np
+
+# Chunks per worker, enough for the faster workers to take over the tail of the slower ones
+CHUNKS_PER_WORKER = 4
+
+
+def round_robin_schedule(n_players, n_games=1, swap_seats=True):
+    """
+    Games of a round robin.
+
+    Args:
+        n_players (int): Individuals of the tournament.
+        n_games (int): Deals played by every pair.
+        swap_seats (bool): Play every deal in both seat orders.
+
+    Returns:
+        numpy.ndarray: (n_games_total, 3) rows of (first seat, second seat, deal), deals numbered from 0 to
+            n_players * (n_players - 1) / 2 * n_games - 1.
+    """
+    first, second = np.triu_indices(n_players, k=1)
+    pairs = np.repeat(np.stack([first, second], axis=1), n_games, axis=0)
+    schedule = np.column_stack([pairs, np.arange(len(pairs))])
+    if swap_seats:
+        schedule = np.concatenate([schedule, schedule[:, [1, 0, 2]]])
+    return schedule
+
+
+def balanced_chunks(items, n_chunks):
+    """
+    Split items into at most n_chunks chunks whose lengths differ by one at most. Chunks take every n_chunks-th
+    item, so each one mixes the pairs and seat orders of the whole schedule.
+    """
+    n_chunks = max(1, min(n_chunks, len(items)))
+    return [items[k::n_chunks] for k in range(n_chunks)]
+
+
+def score_matrix(n_players, schedule, results):
+    """
+    Gather the results of a round robin.
+
+    Args:
+        n_players (int): Individuals of the tournament.
+        schedule (numpy.ndarray): (n_games_total, 3) schedule of round_robin_schedule.
+        results (list): (seat of the winner, score of the first seat, score of the second seat) of every game.
+
+    Returns:
+        tuple: (scores, games, wins), (n_players, n_players) arrays with the sum of the scores of the row
+            individual against the column individual, the games they played and the games the row individual won.
+    """
+    results = np.asarray(results, dtype=np.float64).reshape(-1, 3)
+    first, second = schedule[:, 0], schedule[:, 1]
+    scores = np.zeros((n_players, n_players))
+    games = np.zeros((n_players, n_players), dtype=np.int64)
+    wins = np.zeros((n_players, n_players), dtype=np.int64)
+    np.add.at(scores, (first, second), results[:, 1])
+    np.add.at(scores, (second, first), results[:, 2])
+    np.add.at(games, (first, second), 1)
+    np.add.at(games, (second, first), 1)
+    np.add.at(wins, (first, second), results[:, 0] == 0)
+    np.add.at(wins, (second, first), results[:, 0] == 1)
+    return scores, games, wins
+
+
+def mean_scores(scores, games):
+    """
+    Mean score of every individual over all its games.
+    """
+    return scores.sum(axis=1) / np.maximum(games.sum(axis=1), 1)
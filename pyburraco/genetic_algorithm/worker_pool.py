@@ -0,0 +1,94 @@
+"""
+Module: Worker Pool
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Long-lived process pool for the genetic algorithm.
+
+WorkerPool keeps a spawn ProcessPoolExecutor alive across Swiss rounds and generations, so the workers pay
+the interpreter start, the torch import and their initializer once. When a worker dies the executor is
+broken as a whole: the pool then replaces it with a fresh one and resubmits the tasks that did not finish,
+up to max_restarts times per map. Exceptions raised by the tasks themselves are not retried.
+"""
+
+import concurrent.futures
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+
+
+class WorkerPool:
+    def __init__(self, n_workers, initializer=None, initargs=(), max_restarts=3):
+        """
+        Args:
+            n_workers (int): Worker processes.
+            initializer (callable): Function run once by every worker when it starts.
+            initargs (tuple): Arguments of the initializer.
+            max_restarts (int): Pool replacements allowed in a single map before giving up.
+        """
+        self.n_workers = n_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_restarts = max_restarts
+        self._executor = None
+
+        # Pools replaced after a worker died
+        self.restarts = 0
+
+    @property
+    def running(self):
+        return self._executor is not None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.n_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=self.initializer, initargs=self.initargs)
+        return self
+
+    def close(self):
+        """
+        Cancel the pending tasks and wait for the workers to exit.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _replace(self):
+        # A broken executor cannot take new tasks, its workers are already gone
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        self.restarts += 1
+        self.start()
+
+    def map(self, function, items):
+        """
+        Run function on every item in the workers.
+
+        Returns:
+            list: Results in the order of the items.
+        """
+        self.start()
+        items = list(items)
+        results = [None] * len(items)
+        pending = list(range(len(items)))
+        restarts = 0
+        while pending:
+            futures = [(index, self._executor.submit(function, items[index])) for index in pending]
+            failed = []
+            for index, future in futures:
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool:
+                    failed.append(index)
+            if failed:
+                if restarts >= self.max_restarts:
+                    raise BrokenProcessPool(f"Workers kept dying, {len(failed)} tasks could not be run")
+                restarts += 1
+                self._replace()
+            pending = failed
+        return results
@@ -14,26 +14,29 @@ import os
 from pyburraco import Game
 from pyburraco.players import PlayerCoded, PlayerNN, PlayerHuman
 from pyburraco.genetic_algorithm import GeneticAlgorithm
+from pyburraco.genetic_algorithm.population_checkpoint import read_population
 from utils.plotter import plot_evolution
 
 
+def best_player(name='Test'):
+    # Best elite of the population checkpoint of the run, a new player if there is none
+    population_path = os.path.join(os.getcwd(), 'data', f'population_{name}.pop')
+    if os.path.isfile(population_path):
+        return read_population(population_path).player(0)
+    return PlayerNN()
+
+
 def test_model_match(ai_type="coded"):
     # Create game instance
     game = Game(save_stats=True, log=True)
 
-    models_path = os.path.join(os.getcwd(), 'data', 'models')
-    file_list = [f for f in os.listdir(models_path) if os.path.isfile(os.path.join(models_path, f))]
-
     # Create Players
-    ai_0 = PlayerNN()
-    if len(file_list) > 0:
-        ai_0.load_model(os.path.join(models_path, file_list[0]))
+    ai_0 = best_player()
 
     if ai_type == "human":
         ai_1 = PlayerHuman()
     elif ai_type == "nn":
         ai_1 = PlayerNN()
-        ai_0.load_model(os.path.join(models_path, file_list[0]))
     else:
         ai_1 = PlayerCoded()
 
@@ -52,14 +55,10 @@ def test_model_match(ai_type="coded"):
 
 
 def play_game_against_nn():
-    models_path = os.path.join(os.getcwd(), 'data', 'models')
-    file_list = [f for f in os.listdir(models_path) if os.path.isfile(os.path.join(models_path, f))]
-
     game = Game(save_stats=True, log=True)
 
     ai_0 = PlayerHuman()
-    ai_1 = PlayerNN()
-    ai_1.load_model(os.path.join(models_path, file_list[0]))
+    ai_1 = best_player()
 
     game.add_player(ai_0)
     game.add_player(ai_1)
@@ -70,7 +69,7 @@ def play_game_against_nn():
 
 
 if __name__ == "__main__":
-    # TODO - n_games is not doing nothing now
+    # n_games scales the budget of the racing tournament, SWISS_ROUNDS * n_games matches per individual at most
     parameters = {
         'n_players': 100,
         'n_games': 1,
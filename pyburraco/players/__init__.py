@@ -1,3 +1,4 @@
 from .player_coded import PlayerCoded
 from .player_human import PlayerHuman
 from .player_nn.player_nn import PlayerNN
+from .player_mc import PlayerMC
@@ -5,21 +5,36 @@ Version: 1.0
 Description: Player representation in Burraco.
 
 Defines the base Player class, with basic methods and attributes.
+
+Points and burraco state are running values kept by the hand (CardCounts) and the melds (MeldList).
+Setting CHECK_RUNNING_TOTALS cross-checks them against a full recomputation on every access.
+
+snapshot and restore copy the game state of a player (hand, melds, secondary deck, score and counters)
+as flat tuples of card ids, clone creates an independent copy sharing everything else (e.g. the model).
 """
 
 
+import copy
+
 from pyburraco.game_logic.helpers import calculate_meld_points
+from pyburraco.game_logic.card_counts import CardCounts
+from pyburraco.game_logic.meld import Meld, MeldList
 from pyburraco.game_logic.game import Game
 
 
 class Player:
+    BURRACO_LENGTH = 7
+    CHECK_RUNNING_TOTALS = False
+
     def __init__(self):
         self.name = None
         self.secondary_deck = False
-        self.hand = []
-        self.melds = []
+        self._hand = CardCounts()
+        self._melds = MeldList()
         self.turn_history = []
         self.score_history = []
+        # Game the player was added to, set by Game.add_player
+        self.game = None
 
         # Used to track progress in the game and train NN
         self.score = 0
@@ -44,20 +59,81 @@ class Player:
         # returns index of the card that it wants to discard from the hand
         pass
 
+    @property
+    def hand(self):
+        return self._hand
+
+    @hand.setter
+    def hand(self, cards):
+        # Hands are always stored as a count vector, lists are converted on assignment
+        self._hand = cards if isinstance(cards, CardCounts) else CardCounts(cards)
+
+    @property
+    def melds(self):
+        return self._melds
+
+    @melds.setter
+    def melds(self, melds):
+        self._melds = melds if isinstance(melds, MeldList) else MeldList(melds)
+
     @property
     def points(self):
-        return sum(calculate_meld_points(meld.cards) for meld in self.melds) - calculate_meld_points(self.hand)
+        points = self._melds.points - self._hand.points
+        if self.CHECK_RUNNING_TOTALS:
+            expected = (sum(calculate_meld_points(meld.cards) for meld in self.melds)
+                        - calculate_meld_points(self.hand))
+            if points != expected:
+                raise RuntimeError(f"Running points {points} differ from the recomputed {expected}")
+        return points
 
     @property
     def burraco(self):
-        return True if self.melds and max(len(meld.cards) for meld in self.melds) >= 7 \
-            else False
+        burraco = self._melds.max_length >= self.BURRACO_LENGTH
+        if self.CHECK_RUNNING_TOTALS:
+            expected = bool(self.melds) and max(len(meld.cards) for meld in self.melds) >= self.BURRACO_LENGTH
+            if burraco != expected:
+                raise RuntimeError(f"Running burraco state {burraco} differs from the recomputed {expected}")
+        return burraco
 
     @property
     def score_evaluation(self):
         # This is equal to points per turn
         return self.score / sum(self.turn_history)
 
+    def snapshot(self):
+        """
+        Compact copy of the game state of the player, to be taken between turns.
+
+        Returns:
+            tuple: (hand signature, card ids of every meld, secondary deck taken, score, turn, round)
+        """
+        return (self._hand.signature, tuple(tuple(card.id for card in meld.cards) for meld in self._melds),
+                self.secondary_deck, self.score, self.turn, self.round)
+
+    def restore(self, snapshot):
+        """
+        Restore a state returned by snapshot.
+        """
+        hand, melds, self.secondary_deck, self.score, self.turn, self.round = snapshot
+        self._hand = CardCounts.from_signature(hand)
+        self._melds = MeldList(Meld.from_ids(meld) for meld in melds)
+
+    def clone(self):
+        """
+        Copy of the player with its own game state, sharing the rest (name, model, settings).
+        """
+        player = copy.copy(self)
+        player.turn_history = self.turn_history[:]
+        player.score_history = self.score_history[:]
+        player.restore(self.snapshot())
+        return player
+
+    def __getstate__(self):
+        # The game is not part of the player, pickled players (e.g. sent to the GA workers) leave it behind
+        state = self.__dict__.copy()
+        state['game'] = None
+        return state
+
     def can_play_card(self, played_cards):
         hand_length = len(self.hand) - played_cards
         return (hand_length > 2
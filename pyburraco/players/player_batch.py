@@ -0,0 +1,176 @@
+"""
+Module: Batch Players
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Players acting on a whole BatchGame at once.
+
+This module defines the BatchPlayer interface used by pyburraco.game_logic.batch_game and BatchPlayerCoded,
+the vectorized counterpart of PlayerCoded. Every method receives the batch, the indexes of the games where
+the seat is to move and the seat itself, and takes the decision for all those games together.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from pyburraco.game_logic.card import SUIT_ORDER
+from pyburraco.game_logic.meld_table import RUN_LAYOUTS, WILDCARD_SLOT, RANK_BITS, MIN_MELD_LENGTH
+from pyburraco.game_logic.batch_game import WILDCARD_IDS, MELD_LENGTH, BURRACO_LENGTH, hand_card_ids
+
+N_SUITS = len(SUIT_ORDER)
+MAX_MELD_LENGTH = RANK_BITS + 1
+SET_RANKS = np.arange(1, RANK_BITS)  # 2s are wildcards and never form a set
+
+
+class BatchPlayer:
+    def draw_card(self, game, rows, seat):
+        # Returns a boolean array, true where picking from deck, false where taking the discard pile
+        pass
+
+    def add_melds(self, game, rows, seat):
+        # Adds cards to the existing melds through game.meld_accepts and game.add_to_melds
+        pass
+
+    def play_melds(self, game, rows, seat):
+        # Lays new melds through game.lay_melds
+        pass
+
+    def discard_card(self, game, rows, seat):
+        # Returns the card id to discard in every game
+        pass
+
+
+@lru_cache(maxsize=None)
+def _run_patterns():
+    """
+    Valid run patterns of RUN_LAYOUTS and, for every suit mask, the run find_best_meld picks among the
+    maximal runs it contains (see player_coded_helpers._suit_patterns).
+
+    Returns:
+        tuple: (pattern rank ids (K, MAX_MELD_LENGTH) padded with -1, pattern uses a wildcard (K,),
+                best pattern index (2, MAX_MELD_LENGTH + 1, 2 ** (RANK_BITS - 1)) indexed by wildcard
+                availability, maximum length and suit mask >> 1, -1 where there is no run)
+    """
+    entries = [(index, layout) for index, layout in enumerate(RUN_LAYOUTS) if layout is not None]
+    ranks = np.full((len(entries), MAX_MELD_LENGTH), -1, dtype=np.int64)
+    for k, (_, layout) in enumerate(entries):
+        regular = [rank for rank in layout if rank != WILDCARD_SLOT]
+        ranks[k, :len(regular)] = regular
+    masks = np.array([index & ((1 << RANK_BITS) - 1) for index, _ in entries], dtype=np.int64)
+    uses_wild = np.array([WILDCARD_SLOT in layout for _, layout in entries], dtype=bool)
+    lengths = np.array([len(layout) for _, layout in entries], dtype=np.int64)
+    # Position in the RUN_PATTERNS order: longest first, natural runs before the ones using a wildcard
+    order = np.empty(len(entries), dtype=np.int64)
+    order[np.lexsort((masks, uses_wild, -lengths))] = np.arange(len(entries))
+
+    # extends[p, q]: q is a longer run with the same wildcard use holding every rank of p
+    extends = ((uses_wild[:, None] == uses_wild[None, :]) & (lengths[:, None] < lengths[None, :])
+               & ((masks[:, None] & ~masks[None, :]) == 0))
+    suit_masks = np.arange(1 << (RANK_BITS - 1), dtype=np.int64) << 1
+    contained = (masks[None, :] & ~suit_masks[:, None]) == 0
+
+    best = np.full((2, MAX_MELD_LENGTH + 1, suit_masks.size), -1, dtype=np.int64)
+    for wild_available in (0, 1):
+        held = contained & (uses_wild <= wild_available)[None, :]
+        maximal = held & ~((held.astype(np.int64) @ extends.T.astype(np.int64)) > 0)
+        for max_length in range(MIN_MELD_LENGTH, MAX_MELD_LENGTH + 1):
+            candidate = np.where(maximal & (lengths <= max_length)[None, :], order[None, :], len(entries))
+            best[wild_available, max_length] = np.where(candidate.min(axis=1) < len(entries),
+                                                        candidate.argmin(axis=1), -1)
+    return ranks, uses_wild, best
+
+
+class BatchPlayerCoded(BatchPlayer):
+    def draw_card(self, game, rows, seat):
+        burraco = game.burraco(rows, seat)
+        hand_size = game.hand_size(rows, seat)
+        discard_size = game.discard_pile[rows].sum(axis=1)
+        take_discard = ((~burraco & ((hand_size == 1) | (discard_size > 3)))
+                        | (burraco & (hand_size == 2) & (discard_size > 1)))
+        return ~take_discard
+
+    def add_melds(self, game, rows, seat):
+        hand = game.hands[rows, seat].copy()
+        hand_size = hand.sum(axis=1)
+        secondary = game.secondary_deck[rows, seat]
+        burraco = game.burraco(rows, seat)
+        stopped = ~((hand_size > 2) | ((hand_size == 2) & (~secondary | burraco)))
+        removed = np.zeros(rows.size, dtype=np.int64)
+
+        # Walk the hands in card id order, every card goes to the first meld accepting it
+        for card_id in np.flatnonzero(hand[~stopped].any(axis=0)):
+            for copy in range(hand[:, card_id].max()):
+                holding = (hand[:, card_id] > copy) & ~stopped
+                if not holding.any():
+                    break
+                holding_rows = rows[holding]
+                accepts = game.meld_accepts(holding_rows, seat, np.full(holding_rows.size, card_id))
+                added = accepts.any(axis=1)
+                added_rows, slots = holding_rows[added], accepts.argmax(axis=1)[added]
+                game.add_to_melds(added_rows, seat, slots, np.full(added_rows.size, card_id))
+
+                removed[holding] += added
+                burraco[np.flatnonzero(holding)[added]] |= (game.melds[added_rows, seat, slots, MELD_LENGTH]
+                                                            >= BURRACO_LENGTH)
+                left = hand_size - removed
+                stopped |= holding & (((left == 2) & secondary & ~burraco) | (left == 1))
+
+    def play_melds(self, game, rows, seat):
+        """
+        Lay the meld find_best_meld picks for PlayerCoded: the longest maximal run or set that leaves at least
+        two cards in hand (one with a burraco), runs by suit before sets by rank.
+        """
+        pattern_ranks, pattern_wild, best_run = _run_patterns()
+        hand = game.hands[rows, seat]
+        hand_size = hand.sum(axis=1)
+        max_length = np.clip(np.where(game.burraco(rows, seat), hand_size - 1, hand_size - 2), 0, MAX_MELD_LENGTH)
+
+        wild_present = hand[:, WILDCARD_IDS] > 0
+        wild_available = wild_present.any(axis=1)
+        wild_id = WILDCARD_IDS[wild_present.argmax(axis=1)]
+
+        # Longest run of every suit
+        suited = hand[:, :N_SUITS * RANK_BITS].reshape(rows.size, N_SUITS, RANK_BITS) > 0
+        suit_masks = (suited[:, :, 1:] << np.arange(1, RANK_BITS)).sum(axis=2)
+        runs = best_run[wild_available.astype(np.int64)[:, None], max_length[:, None], suit_masks >> 1]
+        run_lengths = np.where(runs >= 0, (pattern_ranks[runs] >= 0).sum(axis=2) + pattern_wild[runs], 0)
+
+        # Set of every rank: all its copies plus a wildcard, or all its copies alone when that is too long
+        rank_counts = hand[:, :N_SUITS * RANK_BITS].reshape(rows.size, N_SUITS, RANK_BITS).sum(axis=1)[:, SET_RANKS]
+        wild_lengths = rank_counts + wild_available[:, None]
+        set_lengths = np.where(wild_lengths <= max_length[:, None], wild_lengths,
+                               np.where(rank_counts <= max_length[:, None], rank_counts, 0))
+        set_lengths = np.where((rank_counts > 0) & (set_lengths >= MIN_MELD_LENGTH), set_lengths, 0)
+
+        lengths = np.concatenate((run_lengths, set_lengths), axis=1)
+        best = lengths.argmax(axis=1)
+        playing = lengths.max(axis=1) >= MIN_MELD_LENGTH
+        if not playing.any():
+            return
+
+        card_ids = np.full((rows.size, MAX_MELD_LENGTH), -1, dtype=np.int64)
+        is_run = playing & (best < N_SUITS)
+        run_rows = np.flatnonzero(is_run)
+        pattern = runs[run_rows, best[run_rows]]
+        ranks = pattern_ranks[pattern]
+        card_ids[run_rows] = np.where(ranks >= 0, best[run_rows, None] * RANK_BITS + ranks, -1)
+        with_wild = pattern_wild[pattern]
+        card_ids[run_rows[with_wild], -1] = wild_id[run_rows[with_wild]]
+
+        set_rows = np.flatnonzero(playing & ~is_run)
+        rank = SET_RANKS[best[set_rows] - N_SUITS]
+        length = lengths[set_rows, best[set_rows]]
+        use_wild = length > rank_counts[set_rows, best[set_rows] - N_SUITS]
+        # Copies of the rank ordered by suit, the first length - wildcard ones are played
+        copies = hand[set_rows[:, None], np.arange(N_SUITS)[None, :] * RANK_BITS + rank[:, None]]
+        slot_suit = np.repeat(np.arange(N_SUITS), 2)
+        slot_present = copies[:, slot_suit] > np.tile(np.arange(2), N_SUITS)[None, :]
+        slot_taken = slot_present & (np.cumsum(slot_present, axis=1) <= (length - use_wild)[:, None])
+        card_ids[set_rows, :slot_suit.size] = np.where(slot_taken, slot_suit * RANK_BITS + rank[:, None], -1)
+        card_ids[set_rows[use_wild], -1] = wild_id[set_rows[use_wild]]
+
+        game.lay_melds(rows[playing], seat, card_ids[playing])
+
+    def discard_card(self, game, rows, seat):
+        hand = game.hands[rows, seat]
+        return hand_card_ids(hand, game.rng.integers(0, hand.sum(axis=1)))
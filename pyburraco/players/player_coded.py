@@ -10,18 +10,33 @@ This module implements the AI strategies for playing Burraco, including decision
 import random
 from pyburraco.players.player import Player
 from .player_coded_helpers import find_best_meld
+from .player_coded_planner import plan_melds
 from pyburraco.game_logic.meld import Meld
 
 
 class PlayerCoded(Player):
     _id = 0
 
-    def __init__(self):
+    def __init__(self, time_budget=None, node_budget=None):
+        """
+        Args:
+            time_budget (float): Seconds per move given to the meld planner.
+            node_budget (int): Search nodes per move given to the meld planner.
+                With neither budget, melds are played greedily one per turn.
+        """
         # Initialize AI player state
         super().__init__()
         self.name = "AI_" + str(PlayerCoded._id)
         PlayerCoded._id += 1
 
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self._planned_melds = []
+
+    @property
+    def planning(self):
+        return self.time_budget is not None or self.node_budget is not None
+
     def draw_card(self, discard_deck):
         if ((not self.burraco and (len(self.hand) == 1 or len(discard_deck) > 3)) or
                 (self.burraco and len(self.hand) == 2) and len(discard_deck) > 1):
@@ -30,6 +45,15 @@ class PlayerCoded(Player):
             return True
 
     def play_melds(self):
+        if self.planning:
+            # New melds chosen together with the additions in add_melds
+            for cards in self._planned_melds:
+                self.melds.append(Meld(cards))
+                for card in cards:
+                    self.hand.remove(card)
+            self._planned_melds = []
+            return
+
         if len(self.hand) < 3:
             pass  # Not enough cards to form a meld
 
@@ -44,17 +68,24 @@ class PlayerCoded(Player):
         # Handle the case where no valid meld is found, if necessary
 
     def add_melds(self):
+        if self.planning:
+            plan = plan_melds(self, time_budget=self.time_budget, node_budget=self.node_budget)
+            for meld_index, cards in plan.additions.items():
+                meld = self.melds[meld_index]
+                meld.cards = meld.cards + cards
+                for card in cards:
+                    self.hand.remove(card)
+            self._planned_melds = plan.new_melds
+            return
+
         cards_to_remove = []
         if ((len(self.hand) > 2) or
                 (len(self.hand) == 2 and (not self.secondary_deck or self.burraco))):
             for card in self.hand:
-                for meld in self.melds:
-                    meld.cards = meld.cards + [card]
-                    if meld.valid:
-                        cards_to_remove.append(card)
-                        break
-                    else:
-                        meld.cards.remove(card)
+                # The acceptance index gives the first meld taking the card, if any
+                meld = self.melds.first_accepting(card)
+                if meld is not None and meld.try_add(card):
+                    cards_to_remove.append(card)
                 if (((len(self.hand) - len(cards_to_remove)) == 2 and self.secondary_deck and not self.burraco) or
                         (len(self.hand) - len(cards_to_remove) == 1)):
                     break
@@ -3,50 +3,123 @@ Module: Player Helpers
 Author: Alessandro Tinucci
 Version: 1.0
 Description: Helper functions for PyBurraco Players.
+
+Melds are enumerated from the per-suit rank bitmasks and per-rank counts of the hand: every valid run
+pattern of meld_table.RUN_LAYOUTS contained in a suit (ace high or low, with or without a wildcard) and
+every set of each rank. Enumerations are memoized by hand signature in a bounded LRU cache, since hands
+change by a card or two per turn.
 """
 
-from collections import defaultdict
-from pyburraco.game_logic.helpers import card_rank_difference
+from functools import lru_cache
 
-RANK_ORDER = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+from pyburraco.game_logic.card import CARDS, SUIT_ORDER, RANK_ORDER
+from pyburraco.game_logic.card_counts import CardCounts
+from pyburraco.game_logic.meld_table import RUN_LAYOUTS, RUN_RANK_MASK, RANK_BITS, WILDCARD_SLOT, MIN_MELD_LENGTH
 
+MELD_CACHE_SIZE = 4096
 
-def find_best_meld(hand, burraco):
+
+def _run_patterns():
+    # (rank mask, uses a wildcard, layout) of every run, longest first and natural runs before the others
+    patterns = [(index & RUN_RANK_MASK, index >> RANK_BITS > 0, layout)
+                for index, layout in enumerate(RUN_LAYOUTS) if layout is not None]
+    return tuple(sorted(patterns, key=lambda pattern: (-len(pattern[2]), pattern[1], pattern[0])))
+
+
+RUN_PATTERNS = _run_patterns()
+
+
+@lru_cache(maxsize=None)
+def _suit_patterns(suit_mask, wildcard):
     """
-    Find the best possible meld in the hand.
+    Run patterns a suit holds, as (contained, maximal) tuples in RUN_PATTERNS order.
+
+    Args:
+        suit_mask (int): Rank bitmask of the suit, within RUN_RANK_MASK.
+        wildcard (bool): A wildcard is available.
+
+    Returns:
+        tuple: The patterns whose ranks are all in the suit, and those among them that no longer contained
+            pattern with the same wildcard use extends.
     """
-    all_melds = find_all_possible_melds(hand)
-    if not all_melds:
-        return None
+    contained = [pattern for pattern in RUN_PATTERNS
+                 if not pattern[0] & ~suit_mask and (wildcard or not pattern[1])]
+    maximal = [pattern for pattern in contained
+               if not any(other[1] == pattern[1] and len(other[2]) > len(pattern[2]) and not pattern[0] & ~other[0]
+                          for other in contained)]
+    return tuple(contained), tuple(maximal)
 
-    # Filter melds to those that are one card shorter than the hand
-    if burraco:
-        filtered_melds = [meld for meld in all_melds if len(meld) <= len(hand) - 1]
-    else:
-        filtered_melds = [meld for meld in all_melds if len(meld) < len(hand) - 1]
 
-    if not filtered_melds:
-        return None
+def find_best_meld(hand, burraco):
+    """
+    Find the best possible meld in the hand: the longest maximal meld that leaves at least two cards in
+    hand, one with a burraco.
+
+    Maximal melds are, for every suit, the runs that no longer run with the same wildcard use extends and,
+    for every rank, the set of all its copies with and without a wildcard. Shorter melds are not
+    considered, a maximal meld that is too long is skipped. Ties go to the first meld in the order of
+    find_all_possible_melds.
 
-    best_meld = max(filtered_melds, key=len, default=None)
+    Args:
+        hand (CardCounts): The player's hand, a list of Card objects is also accepted.
+        burraco (bool): The player has a burraco.
 
-    return best_meld
+    Returns:
+        list: Cards of the meld in meld order, None if there is no meld to play.
+    """
+    if not isinstance(hand, CardCounts):
+        hand = CardCounts(hand)
+    max_length = len(hand) - 1 if burraco else len(hand) - 2
+
+    wildcards = hand.wildcards()
+    wildcard = wildcards[0] if wildcards else None
+    best_length = MIN_MELD_LENGTH - 1
+    best_run = best_set = None
+    for suit in range(len(SUIT_ORDER)):
+        suit_mask = hand.suit_mask(suit) & RUN_RANK_MASK
+        if suit_mask.bit_count() + bool(wildcards) < MIN_MELD_LENGTH:
+            continue
+        for _, _, layout in _suit_patterns(suit_mask, wildcard is not None)[1]:
+            if best_length < len(layout) <= max_length:
+                best_length, best_run = len(layout), (suit, layout)
+
+    for rank in range(1, len(RANK_ORDER)):
+        n_cards = hand.rank_count(rank)
+        for length, uses_wildcard in ((n_cards + 1, True), (n_cards, False)):
+            if (uses_wildcard and wildcard is None) or not best_length < length <= max_length:
+                continue
+            best_length, best_set = length, (rank, n_cards, uses_wildcard)
+            break
+
+    if best_set is not None:
+        rank, n_cards, uses_wildcard = best_set
+        return hand.rank_cards(rank)[:n_cards] + ([wildcard] if uses_wildcard else [])
+    if best_run is not None:
+        suit, layout = best_run
+        return [CARDS[suit * RANK_BITS + rank] if rank != WILDCARD_SLOT else wildcard for rank in layout]
+    return None
 
 
 def find_all_possible_melds(hand):
     """
     Find all possible melds in the given hand.
-    """
-    possible_melds = []
 
-    for suit in {'Hearts', 'Diamonds', 'Clubs', 'Spades'}:
-        suited_cards = sorted([card for card in hand if card.suit == suit or card.rank == "2" or card.rank == "Joker"],
-                              key=lambda c: c.rank)
-        possible_melds.extend(find_all_runs(suited_cards))
+    Args:
+        hand (CardCounts): The player's hand, a list of Card objects is also accepted.
 
-    possible_melds.extend(find_all_sets(hand))
+    Returns:
+        list: Every run of each suit followed by every set, as lists of Card objects in meld order.
+    """
+    if not isinstance(hand, CardCounts):
+        hand = CardCounts(hand)
+    # Fresh lists, since Meld keeps and extends the list it is given
+    return [list(meld) for meld in _enumerate_melds(hand.signature)]
 
-    return possible_melds
+
+@lru_cache(maxsize=MELD_CACHE_SIZE)
+def _enumerate_melds(signature):
+    hand = CardCounts.from_signature(signature)
+    return tuple(tuple(meld) for meld in find_all_runs(hand) + find_all_sets(hand))
 
 
 def find_all_sets(hand):
@@ -54,63 +127,52 @@ def find_all_sets(hand):
     Find all sets in the given hand.
 
     Args:
-        hand (list): The player's hand, a list of Card objects.
+        hand (CardCounts): The player's hand, a list of Card objects is also accepted.
 
     Returns:
-        list: A list of all sets (three or more cards of the same rank).
+        list: For each rank, the sets of three or more cards (the first copies by suit, plus a wildcard
+              when available), longest first.
     """
-    rank_groups = defaultdict(list)
-    for card in hand:
-        if card.rank not in ['2', 'Joker']:
-            rank_groups[card.rank].append(card)
-
-    wildcards = [card for card in hand if card.rank in ['2', 'Joker']]
-    for rank in rank_groups:
-        if not any(card.rank in ['2', 'Joker'] for card in rank_groups[rank]):
-            # Add a wildcard to the group, if available
-            if wildcards:
-                rank_groups[rank].append(wildcards[0])
-
-    sets = [group for group in rank_groups.values() if len(group) >= 3]
+    if not isinstance(hand, CardCounts):
+        hand = CardCounts(hand)
+
+    wildcards = hand.wildcards()
+    sets = []
+    for rank in range(1, len(RANK_ORDER)):
+        n_cards = hand.rank_count(rank)
+        if n_cards + bool(wildcards) < MIN_MELD_LENGTH:
+            continue
+        cards = hand.rank_cards(rank)
+        for length in range(n_cards + bool(wildcards), MIN_MELD_LENGTH - 1, -1):
+            if length <= n_cards:
+                sets.append(cards[:length])
+            if wildcards and length - 1 >= 2:
+                sets.append(cards[:length - 1] + [wildcards[0]])
     return sets
 
 
-def find_all_runs(suited_cards):
+def find_all_runs(hand):
     """
-    Find all runs among cards of the same suit.
+    Find all runs in the given hand.
 
     Args:
-        suited_cards (list): Cards of the same suit, sorted by rank.
+        hand (CardCounts): The player's hand, a list of Card objects is also accepted.
 
     Returns:
-        list: A list of all runs (three or more consecutive cards of the same suit).
+        list: For each suit, every run of three or more cards (ace high or low, with at most one wildcard
+              filling a gap or extending the run), longest first.
     """
-    if not suited_cards or len(suited_cards) < 3:
-        return []
+    if not isinstance(hand, CardCounts):
+        hand = CardCounts(hand)
 
+    wildcards = hand.wildcards()
+    wildcard = wildcards[0] if wildcards else None
     runs = []
-    wildcards = [card for card in suited_cards if card.rank in ['2', 'Joker']]
-    if wildcards:
-        wildcards = [wildcards[0]]
-    regular_cards = sorted([card for card in suited_cards if card.rank not in ['2', 'Joker']],
-                           key=lambda c: RANK_ORDER.index(c.rank))
-
-    run = []
-    for i in range(len(regular_cards)):
-        if not run or card_rank_difference(run[-1], regular_cards[i]) == -1:
-            # Directly consecutive card
-            run.append(regular_cards[i])
-        elif wildcards and (not run or card_rank_difference(run[-1], regular_cards[i]) == -2):
-            # Use a wildcard to bridge a single rank gap
-            run.append(wildcards.pop())  # Use the wildcard
-            run.append(regular_cards[i])
-        else:
-            # Not consecutive, check if run is valid to add to runs list
-            if len(run) >= 3:
-                runs.append(run)
-            run = [regular_cards[i]]
-
-    if len(run) >= 3:
-        runs.append(run)
-
+    for suit in range(len(SUIT_ORDER)):
+        suit_mask = hand.suit_mask(suit) & RUN_RANK_MASK
+        if suit_mask.bit_count() + bool(wildcards) < MIN_MELD_LENGTH:
+            continue
+        first_id = suit * RANK_BITS
+        for _, _, layout in _suit_patterns(suit_mask, wildcard is not None)[0]:
+            runs.append([CARDS[first_id + rank] if rank != WILDCARD_SLOT else wildcard for rank in layout])
     return runs
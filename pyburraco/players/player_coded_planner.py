@@ -0,0 +1,198 @@
+"""
+Module: Player Planner
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Budgeted meld planner for PlayerCoded.
+
+This module chooses, in a single search, the disjoint new melds and the additions to the melds already on
+the table that move the most points out of the hand. The candidates are every meld of
+player_coded_helpers.find_all_possible_melds (with every wildcard of the hand in place of the wildcard)
+and every valid extension of each laid meld. A depth-first branch and bound over the hand count vector
+picks at most one extension per laid meld and any number of new melds, bounded by the points of the best
+cards still in hand. The search stops when its time or node budget runs out and returns the best plan
+found so far, starting from the greedy one.
+"""
+
+import time
+
+from pyburraco.game_logic.card import CARDS, N_CARD_IDS
+from pyburraco.game_logic.card_counts import CardCounts
+from pyburraco.game_logic.meld_table import RANK_BITS, MAX_WILDCARDS, MIN_MELD_LENGTH
+from .player_coded_helpers import RUN_PATTERNS, find_all_possible_melds
+
+# Nodes between two checks of the time budget
+CLOCK_INTERVAL = 256
+
+
+class MeldPlan:
+    def __init__(self, new_melds=None, additions=None, points=0, nodes=0, complete=True):
+        """
+        Args:
+            new_melds (list): Lists of cards to lay as new melds.
+            additions (dict): Index of a laid meld -> list of cards to add to it.
+            points (int): Points moved from the hand to the melds.
+            nodes (int): Search nodes visited.
+            complete (bool): False if the budget ran out before the search space was exhausted.
+        """
+        self.new_melds = new_melds if new_melds is not None else []
+        self.additions = additions if additions is not None else {}
+        self.points = points
+        self.nodes = nodes
+        self.complete = complete
+
+    @property
+    def n_cards(self):
+        return sum(len(cards) for cards in self.new_melds) + sum(len(cards) for cards in self.additions.values())
+
+    def __repr__(self):
+        return f"<MeldPlan points={self.points} new_melds={self.new_melds} additions={self.additions}>"
+
+
+class _Candidate:
+    __slots__ = ('cards', 'needs', 'points', 'meld_index')
+
+    def __init__(self, cards, meld_index):
+        self.cards = cards
+        counts = CardCounts(cards)
+        self.needs = [(card.id, counts.count(card)) for card in set(cards)]
+        self.points = counts.points
+        self.meld_index = meld_index
+
+
+def _wildcard_variants(cards, wildcard_ids):
+    # The same meld with each of the wildcards available in the hand
+    position = next((i for i, card in enumerate(cards) if card.wildcard), None)
+    if position is None:
+        return [cards]
+    return [cards[:position] + [CARDS[card_id]] + cards[position + 1:] for card_id in wildcard_ids]
+
+
+def _extensions(meld, hand, wildcard_ids):
+    """
+    Every group of hand cards that can be added to a laid meld, keeping it valid.
+    """
+    suit, rank_mask, _, n_wildcards = meld.signature
+    wildcard_options = [None] if n_wildcards >= MAX_WILDCARDS else [None] + [CARDS[i] for i in wildcard_ids]
+    extensions = []
+
+    if meld.meld_type == 'Set':
+        copies = hand.rank_cards(meld.set_rank)
+        for n_copies in range(len(copies) + 1):
+            for wildcard in wildcard_options:
+                if n_copies or wildcard is not None:
+                    extensions.append(copies[:n_copies] + ([wildcard] if wildcard is not None else []))
+        return extensions
+
+    suit_mask = hand.suit_mask(suit)
+    for pattern_mask, uses_wildcard, _ in RUN_PATTERNS:
+        extra = pattern_mask & ~rank_mask
+        if (pattern_mask & rank_mask != rank_mask or extra & ~suit_mask or uses_wildcard < n_wildcards
+                or (not extra and uses_wildcard == n_wildcards)):
+            continue
+        cards = [CARDS[suit * RANK_BITS + rank] for rank in range(RANK_BITS) if extra >> rank & 1]
+        for wildcard in (wildcard_options[1:] if uses_wildcard > n_wildcards else [None]):
+            extensions.append(cards + ([wildcard] if wildcard is not None else []))
+    return extensions
+
+
+def _max_played(player, hand_size):
+    # Largest number of cards that can leave the hand: can_play_card tells whether one more card can be
+    # played once the given number of cards has been
+    for played in range(hand_size, 0, -1):
+        if player.can_play_card(played - 1):
+            return played
+    return 0
+
+
+def plan_melds(player, time_budget=None, node_budget=None):
+    """
+    Find the new melds and the additions to the laid melds that move the most points out of the hand.
+
+    Args:
+        player (Player): Player whose hand and melds are planned, its can_play_card limits the cards played.
+        time_budget (float): Seconds the search may take, None for no limit.
+        node_budget (int): Search nodes the search may visit, None for no limit.
+
+    Returns:
+        MeldPlan: The best plan found within the budget.
+    """
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    hand = player.hand if isinstance(player.hand, CardCounts) else CardCounts(player.hand)
+    capacity = _max_played(player, len(hand))
+    if capacity < 1:
+        return MeldPlan()
+
+    wildcard_ids = sorted({card.id for card in hand.wildcards()})
+    candidates = []
+    if capacity >= MIN_MELD_LENGTH:
+        for cards in find_all_possible_melds(hand):
+            if len(cards) <= capacity:
+                candidates.extend(_Candidate(variant, -1) for variant in _wildcard_variants(cards, wildcard_ids))
+    for meld_index, meld in enumerate(player.melds):
+        candidates.extend(_Candidate(cards, meld_index) for cards in _extensions(meld, hand, wildcard_ids)
+                          if len(cards) <= capacity)
+    # Richest candidates first, so good plans are found early
+    candidates.sort(key=lambda candidate: -candidate.points)
+
+    counts = [hand.count(card) for card in CARDS]
+    card_points = sorted(((CARDS[card_id].points, card_id) for card_id in range(N_CARD_IDS)), reverse=True)
+    used_melds = set()
+    chosen = []
+    best = [0, []]
+    nodes = 0
+    complete = True
+
+    def bound(room):
+        # Points of the best room cards still in hand, no plan can do better
+        total = 0
+        for points, card_id in card_points:
+            take = min(counts[card_id], room)
+            total += take * points
+            room -= take
+            if not room:
+                break
+        return total
+
+    def search(start, room, points):
+        nonlocal nodes, complete
+        nodes += 1
+        if points > best[0]:
+            best[0], best[1] = points, chosen[:]
+        if ((node_budget is not None and nodes >= node_budget) or
+                (deadline is not None and not nodes % CLOCK_INTERVAL and time.perf_counter() > deadline)):
+            complete = False
+            return False
+
+        if not room or points + bound(room) <= best[0]:
+            return True
+        for index in range(start, len(candidates)):
+            candidate = candidates[index]
+            if len(candidate.cards) > room or candidate.meld_index in used_melds:
+                continue
+            if any(counts[card_id] < n_cards for card_id, n_cards in candidate.needs):
+                continue
+            for card_id, n_cards in candidate.needs:
+                counts[card_id] -= n_cards
+            if candidate.meld_index >= 0:
+                used_melds.add(candidate.meld_index)
+            chosen.append(candidate)
+
+            go_on = search(index + 1, room - len(candidate.cards), points + candidate.points)
+
+            chosen.pop()
+            used_melds.discard(candidate.meld_index)
+            for card_id, n_cards in candidate.needs:
+                counts[card_id] += n_cards
+            if not go_on:
+                return False
+        return True
+
+    search(0, capacity, 0)
+
+    plan = MeldPlan(points=best[0], nodes=nodes, complete=complete)
+    for candidate in best[1]:
+        if candidate.meld_index < 0:
+            plan.new_melds.append(list(candidate.cards))
+        else:
+            plan.additions[candidate.meld_index] = list(candidate.cards)
+    return plan
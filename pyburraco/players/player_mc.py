@@ -0,0 +1,222 @@
+"""
+Module: Monte-Carlo Player
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Determinized Monte-Carlo search player for Burraco.
+
+PlayerMC chooses where to draw from and which card to discard with flat Monte-Carlo search. For every
+candidate action it repeatedly copies the game, resamples the information it cannot see (Game.determinize),
+applies the action and plays on with PlayerCoded as the default policy for a limited number of turns. The
+action with the best mean outcome (own score minus the best opponent's, counting the points on the table
+when the rollout is cut) is played. Melds are laid as PlayerCoded does.
+
+Rollouts start from Game.snapshot, a flat tuple cheap to send to other processes, and run on a persistent
+thread or process pool until the time budget of the decision runs out. rollouts, search_time and
+rollouts_per_second report the search speed. The player plugs into Game like any other (Game.add_player
+gives it the game it reads), which also makes it a strong fixed opponent for the genetic algorithm.
+"""
+
+import concurrent.futures
+import multiprocessing
+import time
+
+import numpy as np
+
+from pyburraco.game_logic.card import CARDS
+from pyburraco.game_logic.game import Game
+from .player_coded import PlayerCoded
+
+DRAW_DECK = True
+DRAW_DISCARD_PILE = False
+
+
+class _RolloutPlayer(PlayerCoded):
+    """
+    Default policy of the rollouts, a PlayerCoded whose next draw can be forced and whose random discards come
+    from the generator of the rollouts.
+    """
+    def __init__(self, rng):
+        super().__init__()
+        self.rng = rng
+        self.forced_draw = None
+
+    def draw_card(self, discard_deck):
+        if self.forced_draw is None:
+            return super().draw_card(discard_deck)
+        draw, self.forced_draw = self.forced_draw, None
+        return draw
+
+    def discard_card(self):
+        return self.hand.pop(int(self.rng.integers(len(self.hand))))
+
+
+def _outcome(game, seat):
+    # Own score minus the best opponent's, the points on the table count while the round is open
+    values = [player.score + (0 if game.game_over else player.points) for player in game.players]
+    return values[seat] - max(value for i, value in enumerate(values) if i != seat)
+
+
+def _rollout(game, snapshot, seat, decision, option, rng, max_turns):
+    game.restore(snapshot)
+    game.determinize(seat, rng)
+    player = game.players[seat]
+
+    if decision == 'draw':
+        # The snapshot is taken before the draw, the forced draw starts the turn
+        player.forced_draw = option
+        game.play_round()
+    else:
+        # The snapshot is taken right before the discard, the turn ends with it
+        card = CARDS[option]
+        player.hand.remove(card)
+        game.deck.discard_pile.append(card)
+        game.finish_turn(player)
+
+    last_turn = game.turn + max_turns
+    while not game.game_over and game.turn < last_turn:
+        game.play_round()
+    return _outcome(game, seat)
+
+
+def run_rollouts(snapshot, seat, decision, options, time_budget=None, n_rollouts=None, max_turns=20, seed=None):
+    """
+    Evaluate the options of a decision with rollouts from a game snapshot. Runs in the worker pools of PlayerMC.
+
+    Args:
+        snapshot (tuple): Game.snapshot of the game, before the draw or before the discard.
+        seat (int): Index of the searching player.
+        decision (str): 'draw' (options are DRAW_DECK and DRAW_DISCARD_PILE) or 'discard' (options are card ids).
+        options (list): Actions to evaluate.
+        time_budget (float): Seconds of rollouts, ignored if n_rollouts is given.
+        n_rollouts (int): Rollouts per option.
+        max_turns (int): Turns played by a rollout before it is cut.
+        seed (int or numpy.random.SeedSequence): Seed of the determinizations and of the rollout decks.
+
+    Returns:
+        tuple: (sum of the outcomes of every option, number of rollouts of every option), at least one rollout
+            is played but with a time budget some options may have none.
+    """
+    rng = np.random.default_rng(seed)
+    game = Game(seed=rng)
+    for _ in snapshot[2]:
+        game.add_player(_RolloutPlayer(rng))
+
+    totals = [0] * len(options)
+    counts = [0] * len(options)
+    deadline = time.perf_counter() + (time_budget or 0.0)
+    index = 0
+    while True:
+        option = index % len(options)
+        totals[option] += _rollout(game, snapshot, seat, decision, options[option], rng, max_turns)
+        counts[option] += 1
+        index += 1
+        if n_rollouts is not None:
+            # Every option gets the same number of rollouts
+            if option == len(options) - 1 and counts[option] >= n_rollouts:
+                break
+        elif time.perf_counter() >= deadline:
+            # Stop on time even in the middle of a pass, the options ahead in it are a rollout behind
+            break
+    return totals, counts
+
+
+class PlayerMC(PlayerCoded):
+    _id = 0
+
+    def __init__(self, time_budget=0.1, n_workers=1, use_processes=True, max_turns=20, n_rollouts=None,
+                 seed=None):
+        """
+        Args:
+            time_budget (float): Seconds of search per decision (draw and discard).
+            n_workers (int): Rollout workers, with 1 the rollouts run in the calling thread.
+            use_processes (bool): Run the workers in a process pool instead of a thread pool.
+            max_turns (int): Turns played by a rollout before it is cut.
+            n_rollouts (int): Rollouts per option and worker, replaces the time budget (e.g. for reproducibility).
+            seed (int): Seed of the determinizations.
+        """
+        super().__init__()
+        self.name = "MC_" + str(PlayerMC._id)
+        PlayerMC._id += 1
+
+        self.search_budget = time_budget
+        self.n_workers = n_workers
+        self.use_processes = use_processes
+        self.max_turns = max_turns
+        self.n_rollouts = n_rollouts
+        self._seed_sequence = np.random.SeedSequence(seed)
+        self._executor = None
+
+        self.rollouts = 0
+        self.search_time = 0.0
+
+    @property
+    def rollouts_per_second(self):
+        return self.rollouts / self.search_time if self.search_time else 0.0
+
+    def report(self):
+        """
+        Returns:
+            dict: Rollouts played, seconds spent searching and rollouts per second.
+        """
+        return {'rollouts': self.rollouts, 'search_time': self.search_time,
+                'rollouts_per_second': self.rollouts_per_second}
+
+    def close(self):
+        """
+        Shut the worker pool down, a later search creates a new one.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_executor'] = None
+        return state
+
+    def _pool(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.n_workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.n_workers)
+        return self._executor
+
+    def _search(self, decision, options):
+        """
+        Returns:
+            The option with the best mean rollout outcome.
+        """
+        if len(options) == 1 or self.game is None:
+            return options[0]
+
+        start = time.perf_counter()
+        snapshot = self.game.snapshot()
+        seat = self.game.players.index(self)
+        seeds = self._seed_sequence.spawn(self.n_workers)
+        arguments = (snapshot, seat, decision, options, self.search_budget, self.n_rollouts, self.max_turns)
+        if self.n_workers <= 1:
+            results = [run_rollouts(*arguments, seeds[0])]
+        else:
+            pool = self._pool()
+            results = [future.result() for future in [pool.submit(run_rollouts, *arguments, seed) for seed in seeds]]
+
+        totals = np.sum([result[0] for result in results], axis=0)
+        counts = np.sum([result[1] for result in results], axis=0)
+        self.rollouts += int(counts.sum())
+        self.search_time += time.perf_counter() - start
+        # Options no worker reached before the deadline are not chosen
+        means = np.divide(totals, counts, out=np.full(len(options), -np.inf), where=counts > 0)
+        return options[int(np.argmax(means))]
+
+    def draw_card(self, discard_deck):
+        if not discard_deck:
+            return DRAW_DECK
+        return self._search('draw', [DRAW_DECK, DRAW_DISCARD_PILE])
+
+    def discard_card(self):
+        card_id = self._search('discard', sorted({card.id for card in self.hand}))
+        card = CARDS[card_id]
+        self.hand.remove(card)
+        return card
@@ -1 +1,3 @@
 from .player_nn import PlayerNN
+from .inference_broker import InferenceBroker
+from .population import Population
@@ -0,0 +1,135 @@
+"""
+Module: Inference Broker
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Batched network evaluation for PlayerNN across concurrent games.
+
+Games played in worker threads hand their PlayerNN states to an InferenceBroker instead of running their
+own forward pass. A serving thread gathers the pending requests, up to batch_size of them or until max_wait
+seconds have passed since the first one, stacks the states of every model into one batch, runs a single
+inference-mode forward pass per model and hands every caller its row of the output. The calling thread
+blocks meanwhile, so the encoder buffer of the player stays valid until the state is stacked.
+
+    with InferenceBroker(batch_size=16) as broker:
+        for player in players:
+            player.broker = broker
+        ...  # play the games in 16 threads
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+_STOP = object()
+
+
+class InferenceBroker:
+    def __init__(self, batch_size=32, max_wait=0.002):
+        """
+        Args:
+            batch_size (int): Largest number of requests evaluated together.
+            max_wait (float): Seconds a request may wait for the batch to fill.
+        """
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._thread = None
+
+        # Served requests and forward passes, requests / batches is the mean batch size
+        self.requests = 0
+        self.batches = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def mean_batch_size(self):
+        return self.requests / self.batches if self.batches else 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._serve, name='InferenceBroker', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """
+        Serve the pending requests and stop the serving thread.
+        """
+        if self._thread is not None:
+            self._requests.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def infer(self, model, state):
+        """
+        Evaluate a model on one state, batched with the requests of the other games.
+
+        Args:
+            model (torch.nn.Module): Network of the calling player.
+            state (torch.Tensor): (IN_LAYER_SIZE,) encoded state.
+
+        Returns:
+            torch.Tensor: (OUT_LAYER_SIZE,) output of the network.
+        """
+        if self._thread is None:
+            raise RuntimeError("The inference broker is not running")
+        future = Future()
+        self._requests.put((model, state, future))
+        return future.result()
+
+    def _serve(self):
+        stopping = False
+        while not stopping:
+            request = self._requests.get()
+            if request is _STOP:
+                break
+            pending = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.batch_size:
+                try:
+                    request = self._requests.get(timeout=max(deadline - time.perf_counter(), 0.0))
+                except queue.Empty:
+                    break
+                if request is _STOP:
+                    stopping = True
+                    break
+                pending.append(request)
+            self._evaluate(pending)
+
+    def _evaluate(self, pending):
+        # One forward pass per model, or per Population for the networks viewing one, in the order of the first
+        # request of each
+        by_model = {}
+        for request in pending:
+            population = getattr(request[0], 'population', None)
+            by_model.setdefault(id(request[0] if population is None else population), []).append(request)
+
+        for requests in by_model.values():
+            try:
+                states = torch.stack([state for _, state, _ in requests])
+                population = getattr(requests[0][0], 'population', None)
+                with torch.inference_mode():
+                    if population is None:
+                        outputs = requests[0][0](states)
+                    else:
+                        indices = torch.tensor([model.population_index for model, _, _ in requests])
+                        outputs = population.forward(states, indices)
+            except Exception as error:
+                for _, _, future in requests:
+                    future.set_exception(error)
+                continue
+            for (_, _, future), output in zip(requests, outputs):
+                future.set_result(output)
+            self.requests += len(requests)
+            self.batches += 1
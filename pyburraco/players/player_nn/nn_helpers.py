@@ -3,46 +3,81 @@ Module: NN Helpers
 Author: Alessandro Tinucci
 Version: 1.0
 Description: Helper functions for Neural Networks of PyBurraco.
+
+A set of cards is encoded on N_DECK_BITS bits, two per card id and four for the Joker, one bit per copy held,
+most significant bit first. A meld is encoded on MELD_BITS bits, see meld_code. StateEncoder writes the whole
+input of PlayerNN into a preallocated buffer, scattering the card counts with a single indexed write per set
+of cards.
 """
 
+import numpy as np
 import torch
 
-RANK_ORDER = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-SUIT_ORDER = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+from pyburraco.game_logic.card import N_CARD_IDS, JOKER_ID, COPIES_PER_JOKER
+from pyburraco.game_logic.card_counts import CardCounts
+
+N_DECK_BITS = 108
+MELD_BITS = 16
+
+
+def _card_slots():
+    # Bit position of every copy of every card, as written by encode_card_from_deck and
+    # expanded most significant bit first by binary_to_tensor
+    slots = np.full((N_CARD_IDS, COPIES_PER_JOKER), -1, dtype=np.int64)
+    for card_id in range(N_CARD_IDS):
+        copies = COPIES_PER_JOKER if card_id == JOKER_ID else 2
+        slots[card_id, :copies] = N_DECK_BITS - 1 - (card_id * 2 + np.arange(copies))
+    return slots
+
+
+CARD_SLOTS = _card_slots()
+MELD_BIT_SHIFTS = np.arange(MELD_BITS - 1, -1, -1)
+
+
+def card_id_counts(cards):
+    """
+    Count vector of a set of cards, indexed by card id.
+    """
+    if isinstance(cards, CardCounts):
+        return np.frombuffer(cards.signature, dtype=np.uint8)
+    return np.bincount([card.id for card in cards], minlength=N_CARD_IDS)
+
+
+def card_bit_positions(counts):
+    """
+    Positions of the bits set by a count vector, every copy of a card taking its own bit.
+    """
+    return CARD_SLOTS[(np.arange(COPIES_PER_JOKER)[None, :] < counts[:, None]) & (CARD_SLOTS >= 0)]
 
 
 def encode_card_from_deck(card, deck):
-    if card.rank == 'Joker':
-        card_bin = 1 << 104
-    else:
-        rank_pos = RANK_ORDER.index(card.rank)
-        suit_pos = SUIT_ORDER.index(card.suit)
-        position = (suit_pos * 13 + rank_pos) * 2
-        card_bin = 1 << position
+    # Two bits per card id, the Jokers take the four bits starting at 104
+    card_bin = 1 << (card.id * 2)
 
     return (deck + card_bin) | deck
 
 
-def encode_deck(device, cards, n_cards=108):
-    encoded_deck = 0b0
-    for card in cards:
-        encoded_deck = encode_card_from_deck(card, encoded_deck)
-    return binary_to_tensor(device, encoded_deck, n_cards)
+def encode_deck(device, cards, n_cards=N_DECK_BITS):
+    encoded_deck = np.zeros(n_cards, dtype=np.float32)
+    encoded_deck[card_bit_positions(card_id_counts(cards)) + n_cards - N_DECK_BITS] = 1.0
+    return torch.from_numpy(encoded_deck).to(device)
 
 
 def encode_melds(device, melds, n_melds):
-    encoded_melds = torch.tensor([], device=device)
-    for i in range(n_melds):
-        if i < len(melds):
-            encoded_meld = encode_meld(device, melds[i])
-            encoded_melds = torch.cat((encoded_melds, encoded_meld.to(device)), dim=0)
-        else:
-            encoded_melds = torch.cat((encoded_melds, torch.zeros(16, device=device)), dim=0)
+    encoded_melds = np.zeros((n_melds, MELD_BITS), dtype=np.float32)
+    write_meld_bits(encoded_melds, melds)
+    return torch.from_numpy(encoded_melds.reshape(-1)).to(device)
 
-    return encoded_melds
 
+def write_meld_bits(block, melds):
+    """
+    Write the codes of the first len(block) melds into the rows of a (n_melds, MELD_BITS) block, in one write.
+    """
+    codes = np.array([meld_code(meld) for meld in melds[:len(block)]], dtype=np.int64)
+    block[:len(codes)] = (codes[:, None] >> MELD_BIT_SHIFTS) & 1
 
-def encode_meld(device, meld):
+
+def meld_code(meld):
     # Encode type bit 1
     if meld.meld_type == 'Set':
         encoded_meld = 1
@@ -50,8 +85,8 @@ def encode_meld(device, meld):
         encoded_meld = 0
 
     # Encode first card suit (bits 2-3) and rank (bits 4-7)
-    rank_pos = RANK_ORDER.index(meld.cards[0].rank)
-    suit_pos = SUIT_ORDER.index(meld.cards[0].suit)
+    rank_pos = meld.cards[0].rank_index
+    suit_pos = meld.cards[0].suit_index
     encoded_meld += suit_pos * 2 + rank_pos * 8
 
     # Encode number of cards
@@ -65,9 +100,44 @@ def encode_meld(device, meld):
         wildcard_position = [i for i, card in enumerate(meld.cards) if card in meld.wildcards]
         encoded_meld += wildcard_position[0] * 4096
 
-    return binary_to_tensor(device, encoded_meld, 16)
+    return encoded_meld
+
+
+def encode_meld(device, meld):
+    return binary_to_tensor(device, meld_code(meld), MELD_BITS)
 
 
 def binary_to_tensor(device, binary_data, array_size):
     binary_list = [(binary_data >> i) & 1 for i in range(array_size - 1, -1, -1)]
     return torch.tensor(binary_list, dtype=torch.float32, device=device)
+
+
+class StateEncoder:
+    def __init__(self, device, n_melds):
+        """
+        Encoder of the input of PlayerNN: the phase bit, the discard pile, the hand and the first n_melds melds.
+        The input is written into the same preallocated buffer at every call.
+
+        Args:
+            device (str): Device of the returned tensor.
+            n_melds (int): Melds encoded.
+        """
+        self.device = device
+        self.size = 1 + 2 * N_DECK_BITS + n_melds * MELD_BITS
+        self._buffer = np.zeros(self.size, dtype=np.float32)
+        self._tensor = torch.from_numpy(self._buffer)
+        self._discard_pile = self._buffer[1:1 + N_DECK_BITS]
+        self._hand = self._buffer[1 + N_DECK_BITS:1 + 2 * N_DECK_BITS]
+        self._melds = self._buffer[1 + 2 * N_DECK_BITS:].reshape(n_melds, MELD_BITS)
+
+    def encode(self, phase, discard_pile, hand, melds):
+        """
+        Returns:
+            torch.Tensor: (size,) float32 encoding, overwritten by the next call when the device is the CPU.
+        """
+        self._buffer.fill(0.0)
+        self._buffer[0] = phase
+        self._discard_pile[card_bit_positions(card_id_counts(discard_pile))] = 1.0
+        self._hand[card_bit_positions(card_id_counts(hand))] = 1.0
+        write_meld_bits(self._melds, melds)
+        return self._tensor.to(self.device)
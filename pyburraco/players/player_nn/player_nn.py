@@ -7,9 +7,11 @@ Description: ML Player for the game Burraco.
 This module implements the ML interface for playing Burraco.
 """
 
+import numpy as np
 import torch
 import random
 import os
+from collections import namedtuple
 
 from pyburraco.players.player import Player
 from pyburraco.game_logic.meld import Meld
@@ -26,19 +28,66 @@ LENGTH_MELDS = 6
 OUT_LAYER_SIZE = 1 + 10 * N_CARDS_PLAY + 6 * LENGTH_MELDS * N_MELDS_PLAY + 6
 
 
+def _index_bits():
+    # Output positions of the bits of every index read by decode_output, most significant bit first, with the
+    # weight of each bit. Indexes shorter than 6 bits are padded with zero weights.
+    groups = [range(1 + i * 10, 7 + i * 10) for i in range(N_CARDS_PLAY)]
+    groups += [range(7 + i * 10, 11 + i * 10) for i in range(N_CARDS_PLAY)]
+    groups += [range(1 + 10 * N_CARDS_PLAY + k * 6, 7 + 10 * N_CARDS_PLAY + k * 6)
+               for k in range(N_MELDS_PLAY * LENGTH_MELDS)]
+    groups += [range(OUT_LAYER_SIZE - 7, OUT_LAYER_SIZE - 1)]
+    positions = np.zeros((len(groups), 6), dtype=np.int64)
+    weights = np.zeros((len(groups), 6), dtype=np.float32)
+    for row, group in enumerate(groups):
+        positions[row, :len(group)] = group
+        weights[row, :len(group)] = 1 << np.arange(len(group) - 1, -1, -1)
+    return positions, weights
+
+
+INDEX_BITS, INDEX_WEIGHTS = _index_bits()
+
+NNActions = namedtuple('NNActions', ['draw', 'add_cards', 'add_melds', 'meld_cards', 'discard'])
+
+
+def decode_output(output):
+    """
+    Decode a network output into the indexes read by PlayerNN, with one gather and one bit-weight dot product.
+
+    Args:
+        output (torch.Tensor): (OUT_LAYER_SIZE,) output of the network.
+
+    Returns:
+        NNActions: draw (0 to take the discard pile), add_cards and add_melds ((N_CARDS_PLAY,) hand and meld
+            indexes of the additions), meld_cards ((N_MELDS_PLAY, LENGTH_MELDS) 1-based hand indexes of the new
+            melds, 0 ends a meld) and discard (hand index of the discarded card), as numpy integer arrays.
+    """
+    bits = np.rint(output.cpu().numpy())
+    indexes = np.einsum('ij,ij->i', bits[INDEX_BITS], INDEX_WEIGHTS).astype(np.int64)
+    n_additions = N_CARDS_PLAY * 2
+    return NNActions(draw=int(bits[0]),
+                     add_cards=indexes[:N_CARDS_PLAY],
+                     add_melds=indexes[N_CARDS_PLAY:n_additions],
+                     meld_cards=indexes[n_additions:-1].reshape(N_MELDS_PLAY, LENGTH_MELDS),
+                     discard=int(indexes[-1]))
+
+
 class PlayerNN(Player):
     device = "cuda"
     _initialized = False
     _id = 0
 
-    def __init__(self):
+    def __init__(self, model=None):
+        """
+        Args:
+            model (PlayerNNNet): Network to play with, e.g. an individual of a Population. A new one by default.
+        """
         if not PlayerNN._initialized:
             # Run the initialization code only if not already initialized
             PlayerNN._initialize_class()
             PlayerNN._initialized = True
 
         super().__init__()
-        self.nn = PlayerNNNet(IN_LAYER_SIZE, OUT_LAYER_SIZE)
+        self.nn = PlayerNNNet(IN_LAYER_SIZE, OUT_LAYER_SIZE) if model is None else model
         self.model = self.nn.to(self.device)
 
         self.name = "NN_" + str(PlayerNN._id)
@@ -46,10 +95,13 @@ class PlayerNN(Player):
         PlayerNN._id += 1
 
         self._discard_pile = []
+        self._encoder = nH.StateEncoder(self.device, N_MELDS_ENCODED)
+        # InferenceBroker batching the forward passes of concurrent games, None to run them directly
+        self.broker = None
         self._encoded_status = torch.zeros(IN_LAYER_SIZE)
         self._phase = 0b0
         self._ran_nn_bool = False
-        self._output = []
+        self._actions = None
 
     @classmethod
     def _initialize_class(cls):
@@ -62,12 +114,19 @@ class PlayerNN(Player):
         )
         print(f"Using {cls.device} device")
 
+    def _state_dict(self):
+        # Parameters viewing the stacked tensors of a Population would save the whole population
+        state_dict = self.model.state_dict()
+        if getattr(self.model, 'population', None) is not None:
+            state_dict = {name: tensor.clone() for name, tensor in state_dict.items()}
+        return state_dict
+
     def save_model(self, name=None):
         if name is not None:
-            torch.save(self.model.state_dict(),
+            torch.save(self._state_dict(),
                        os.path.join(os.getcwd(), "data", "models", f"nn_weights_{name}.pth"))
         else:
-            torch.save(self.model.state_dict(),
+            torch.save(self._state_dict(),
                        os.path.join(os.getcwd(), "data", "models", f"nn_weights_{self._id}.pth"))
 
     def load_model(self, filename):
@@ -78,8 +137,7 @@ class PlayerNN(Player):
         self._phase = 0b0
         self._discard_pile = discard_deck
 
-        output = self.model(self.encoded_game_status).tolist()
-        draw_bool = round(output[0])
+        draw_bool = decode_output(self._forward()).draw
 
         if not draw_bool:
             self._discard_pile = []
@@ -91,17 +149,10 @@ class PlayerNN(Player):
         self.process_output()
 
         remove_idx = []
-        index_start = 1 + 10 * N_CARDS_PLAY
-        for i in range(N_MELDS_PLAY):
+        for meld_cards in self._actions.meld_cards.tolist():
             possible_meld_idx = []
 
-            for j in range(LENGTH_MELDS):
-                # TODO - Verify this index
-                idx = index_start + i * 6 * LENGTH_MELDS + j * 6
-                card_list = self._output[idx:(idx + 6)]
-                binary_card_index = ''.join(str(bit) for bit in card_list)
-                card_index = int(binary_card_index, 2)
-
+            for card_index in meld_cards:
                 # card_index == 0 used to signal no card
                 if card_index == 0:
                     break
@@ -126,40 +177,21 @@ class PlayerNN(Player):
         self.process_output()
 
         idx_to_remove = []
-        for i in range(N_CARDS_PLAY):
-            card_list = self._output[(1 + i*10):(7 + i*10)]
-            meld_list = self._output[(7 + i*10):(11 + i*10)]
-
-            binary_card_index = ''.join(str(bit) for bit in card_list)
-            binary_meld_index = ''.join(str(bit) for bit in meld_list)
-
-            card_index = int(binary_card_index, 2)
-            meld_index = int(binary_meld_index, 2)
-
+        for card_index, meld_index in zip(self._actions.add_cards.tolist(), self._actions.add_melds.tolist()):
             # meld_index == 0 used to indicate not to add anything
             if (meld_index != 0 and self.melds and card_index < len(self.hand) and meld_index < len(self.melds)
                     and self.can_play_card(len(idx_to_remove)) and card_index not in idx_to_remove):
 
-                card = self.hand[card_index]
-                self.melds[meld_index-1].cards = self.melds[meld_index-1].cards + [card]
-                if self.melds[meld_index-1].valid:
+                if self.melds[meld_index-1].try_add(self.hand[card_index]):
                     idx_to_remove.append(card_index)
 
-                else:
-                    meld = self.melds[meld_index-1]
-                    meld.cards.remove(card)
-                    self.melds[meld_index-1].cards = meld.cards
-
         cards_to_remove = [self.hand[card_idx] for card_idx in idx_to_remove]
         for card in cards_to_remove:
             self.hand.remove(card)
 
     def discard_card(self):
         self.process_output()
-        discard_pos_output = self._output[-7:-1]
-
-        binary_string = ''.join(str(bit) for bit in discard_pos_output)
-        discard_pos = int(binary_string, 2)
+        discard_pos = self._actions.discard
 
         if discard_pos >= len(self.hand):
             discard_pos = random.randint(0, len(self.hand) - 1)
@@ -171,24 +203,35 @@ class PlayerNN(Player):
 
     def _process_output(self):
         self._phase = 0b1
-        output = self.model(self.encoded_game_status).tolist()
-        self._output = [round(val) for val in output]
+        self._actions = decode_output(self._forward())
         self._ran_nn_bool = True
 
+    def _forward(self):
+        if self.broker is not None:
+            return self.broker.infer(self.model, self.encoded_game_status)
+        with torch.inference_mode():
+            return self.model(self.encoded_game_status)
+
+    def clone(self):
+        # Clones play concurrent games, each needs its own encoder buffer
+        player = super().clone()
+        player._encoder = nH.StateEncoder(self.device, N_MELDS_ENCODED)
+        return player
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['broker'] = None
+        if getattr(self.model, 'population', None) is not None:
+            # Pickled views own their weights instead of carrying the whole population
+            model = PlayerNNNet(IN_LAYER_SIZE, OUT_LAYER_SIZE).to(self.device)
+            model.load_state_dict(self._state_dict())
+            state['nn'] = state['model'] = model
+        return state
+
     @property
     def encoded_game_status(self):
-        encoded_status = nH.binary_to_tensor(PlayerNN.device, self._phase, 1)
-
-        encoded_discard_pile = nH.encode_deck(PlayerNN.device, self._discard_pile)
-        encoded_status = torch.cat((encoded_status, encoded_discard_pile), dim=0)
-
-        encoded_hand = nH.encode_deck(PlayerNN.device, self.hand)
-        encoded_status = torch.cat((encoded_status, encoded_hand), dim=0)
-
-        encoded_melds = nH.encode_melds(PlayerNN.device, self.melds, N_MELDS_ENCODED)
-        encoded_status = torch.cat((encoded_status, encoded_melds), dim=0)
-
-        self._encoded_status = encoded_status
+        # The encoder's buffer is reused, the state stays valid until the next encoding
+        self._encoded_status = self._encoder.encode(self._phase, self._discard_pile, self.hand, self.melds)
         return self._encoded_status
 
     def __repr__(self):
@@ -0,0 +1,163 @@
+"""
+Module: Batch NN Player
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Vectorized counterpart of PlayerNN for BatchGame.
+
+This module encodes the state of every game where the seat is to move with the same layout used by
+PlayerNN.encoded_game_status, evaluates the network once on the whole batch and decodes the outputs
+with the same meaning as PlayerNN.add_melds, play_melds and discard_card.
+"""
+
+import numpy as np
+import torch
+
+from pyburraco.game_logic.card import COPIES_PER_JOKER
+from pyburraco.game_logic.batch_game import (MELD_TYPE, MELD_SET, MELD_FIRST, MELD_LENGTH, CARD_RANK, CARD_SUIT,
+                                             classify_groups, hand_card_ids)
+from pyburraco.players.player_batch import BatchPlayer
+from .nn_helpers import N_DECK_BITS, MELD_BITS, CARD_SLOTS
+from .player_nn import IN_LAYER_SIZE, OUT_LAYER_SIZE, N_MELDS_ENCODED, N_CARDS_PLAY, N_MELDS_PLAY, LENGTH_MELDS
+
+CARD_INDEX_BITS = 6
+MELD_INDEX_BITS = 4
+
+DISCARD_OFFSET = 1
+HAND_OFFSET = DISCARD_OFFSET + N_DECK_BITS
+MELDS_OFFSET = HAND_OFFSET + N_DECK_BITS
+
+
+def bits_to_int(bits):
+    """
+    Read groups of rounded outputs as unsigned integers, most significant bit first.
+
+    Args:
+        bits (numpy.ndarray): (..., n_bits) array of 0/1 values.
+    """
+    weights = 1 << np.arange(bits.shape[-1] - 1, -1, -1)
+    return bits.astype(np.int64) @ weights
+
+
+def scatter_card_counts(block, counts):
+    """
+    Write the encoding of (k, N_CARD_IDS) card counts into a (k, N_DECK_BITS) block.
+    """
+    present = (np.arange(COPIES_PER_JOKER)[None, None, :] < counts[:, :, None]) & (CARD_SLOTS >= 0)
+    row, card_id, copy = np.nonzero(present)
+    block[row, CARD_SLOTS[card_id, copy]] = 1.0
+
+
+def encode_batch_states(game, rows, seat, phase):
+    """
+    Encode the state seen by the seat in the given games, see PlayerNN.encoded_game_status.
+
+    Returns:
+        numpy.ndarray: (len(rows), IN_LAYER_SIZE) float32 array.
+    """
+    states = np.zeros((rows.size, IN_LAYER_SIZE), dtype=np.float32)
+    states[:, 0] = phase
+    scatter_card_counts(states[:, DISCARD_OFFSET:HAND_OFFSET], game.discard_pile[rows])
+    scatter_card_counts(states[:, HAND_OFFSET:MELDS_OFFSET], game.hands[rows, seat])
+
+    melds = game.melds[rows, seat, :N_MELDS_ENCODED]
+    first = melds[:, :, MELD_FIRST]
+    wild_position = game.meld_wildcard_position(rows, seat)[:, :N_MELDS_ENCODED]
+    values = ((melds[:, :, MELD_TYPE] == MELD_SET) + CARD_SUIT[first] * 2 + CARD_RANK[first] * 8
+              + (melds[:, :, MELD_LENGTH] - 3) * 128
+              + np.where(wild_position >= 0, 2048 + wild_position * 4096, 0))
+    values = np.where(melds[:, :, MELD_TYPE] > 0, values, 0)
+    bits = (values[:, :, None] >> np.arange(MELD_BITS - 1, -1, -1)) & 1
+    states[:, MELDS_OFFSET:] = bits.reshape(rows.size, -1)
+    return states
+
+
+class BatchPlayerNN(BatchPlayer):
+    def __init__(self, model, device="cpu"):
+        """
+        Args:
+            model (PlayerNNNet): Network taking the decisions of the seat.
+            device (str): Torch device the network lives on.
+        """
+        self.model = model
+        self.device = device
+        self._output = None
+
+    def _forward(self, states):
+        with torch.inference_mode():
+            output = self.model(torch.from_numpy(states).to(self.device))
+        return np.rint(output.cpu().numpy()).astype(np.int64)
+
+    def _cached_output(self, rows):
+        # Output of the phase 1 evaluation, shared by add_melds, play_melds and discard_card
+        return self._output[rows]
+
+    def draw_card(self, game, rows, seat):
+        output = self._forward(encode_batch_states(game, rows, seat, phase=0))
+        return output[:, 0] == 1
+
+    def add_melds(self, game, rows, seat):
+        if self._output is None or self._output.shape[0] != game.n_games:
+            self._output = np.zeros((game.n_games, OUT_LAYER_SIZE), dtype=np.int64)
+        output = self._forward(encode_batch_states(game, rows, seat, phase=1))
+        self._output[rows] = output
+
+        hand = game.hands[rows, seat].copy()
+        hand_size = hand.sum(axis=1)
+        n_melds = game.n_melds[rows, seat]
+        removed = np.zeros((rows.size, 1 << CARD_INDEX_BITS), dtype=bool)
+        for i in range(N_CARDS_PLAY):
+            card_index = bits_to_int(output[:, 1 + i * 10:7 + i * 10])
+            meld_index = bits_to_int(output[:, 7 + i * 10:11 + i * 10])
+
+            # meld_index == 0 used to indicate not to add anything
+            trying = ((meld_index != 0) & (n_melds > 0) & (card_index < hand_size) & (meld_index < n_melds)
+                      & game.can_play_card(rows, seat, removed.sum(axis=1), hand_size)
+                      & ~removed[np.arange(rows.size), card_index])
+            trying_rows = np.flatnonzero(trying)
+            card_ids = hand_card_ids(hand[trying_rows], card_index[trying_rows])
+            slots = meld_index[trying_rows] - 1
+            accepted = game.meld_accepts(rows[trying_rows], seat, card_ids)[np.arange(trying_rows.size), slots]
+
+            added = trying_rows[accepted]
+            game.add_to_melds(rows[added], seat, slots[accepted], card_ids[accepted])
+            removed[added, card_index[added]] = True
+
+    def play_melds(self, game, rows, seat):
+        output = self._cached_output(rows)
+        hand = game.hands[rows, seat].copy()
+        hand_size = hand.sum(axis=1)
+        removed = np.zeros((rows.size, 1 << CARD_INDEX_BITS), dtype=bool)
+        index_start = 1 + 10 * N_CARDS_PLAY
+
+        for i in range(N_MELDS_PLAY):
+            chosen = np.zeros((rows.size, 1 << CARD_INDEX_BITS), dtype=bool)
+            card_ids = np.full((rows.size, LENGTH_MELDS), -1, dtype=np.int64)
+            stopped = np.zeros(rows.size, dtype=bool)
+            for j in range(LENGTH_MELDS):
+                idx = index_start + i * 6 * LENGTH_MELDS + j * 6
+                card_index = bits_to_int(output[:, idx:idx + 6])
+
+                # card_index == 0 used to signal no card
+                stopped |= card_index == 0
+                taking = (~stopped & (card_index - 1 < hand_size) & ~removed[np.arange(rows.size), card_index]
+                          & ~chosen[np.arange(rows.size), card_index])
+                taking_rows = np.flatnonzero(taking)
+                chosen[taking_rows, card_index[taking_rows]] = True
+                card_ids[taking_rows, j] = hand_card_ids(hand[taking_rows], card_index[taking_rows] - 1)
+
+            n_chosen = chosen.sum(axis=1)
+            trying = ((n_chosen > 2) & classify_groups(card_ids)['valid']
+                      & game.can_play_card(rows, seat, n_chosen + removed.sum(axis=1), hand_size))
+            trying_rows = np.flatnonzero(trying)
+            game.lay_melds(rows[trying_rows], seat, card_ids[trying_rows])
+            removed[trying_rows] |= chosen[trying_rows]
+
+    def discard_card(self, game, rows, seat):
+        output = self._cached_output(rows)
+        hand = game.hands[rows, seat]
+        hand_size = hand.sum(axis=1)
+        discard_position = bits_to_int(output[:, -7:-1])
+        out_of_hand = discard_position >= hand_size
+        discard_position[out_of_hand] = game.rng.integers(0, hand_size[out_of_hand])
+        return hand_card_ids(hand, discard_position)
+
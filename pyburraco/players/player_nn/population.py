@@ -0,0 +1,143 @@
+"""
+Module: NN Population
+Author: Alessandro Tinucci
+Version: 1.0
+Description: Stacked weights of a population of PlayerNN networks.
+
+Population keeps the weights and biases of every linear layer of its individuals in stacked tensors, one
+(n_individuals, out_features, in_features) tensor per layer. forward evaluates one state per individual
+with a batched matmul per layer, so the whole population costs about as much as one network on a batch.
+
+Every individual is still a PlayerNNNet whose parameters are views of its slice of the stacked tensors:
+players made with Population.player play like any PlayerNN, and in-place changes (mutate_weights,
+load_state_dict, the GA crossover) land in the population. An InferenceBroker evaluates the pending states
+of the views of a population together, through Population.forward. After share_memory, the stacked tensors
+can be sent to worker processes, which rebuild the population with from_tensors without copying the weights.
+"""
+
+import torch
+import torch.nn as nn
+
+from .player_nn import PlayerNN, IN_LAYER_SIZE, OUT_LAYER_SIZE
+from .player_nn_net import PlayerNNNet
+
+
+def _linear_layers(net):
+    return [module for module in net.linear_relu_stack if isinstance(module, nn.Linear)]
+
+
+class Population:
+    def __init__(self, nets):
+        """
+        Args:
+            nets (list): PlayerNNNet networks of the individuals. Their weights are copied into the stacked
+                tensors and the networks then view them.
+        """
+        layers = [_linear_layers(net) for net in nets]
+        with torch.no_grad():
+            self.weights = [torch.stack([individual[k].weight for individual in layers])
+                            for k in range(len(layers[0]))]
+            self.biases = [torch.stack([individual[k].bias for individual in layers])
+                           for k in range(len(layers[0]))]
+
+        self.nets = list(nets)
+        for index, net in enumerate(self.nets):
+            self._bind(net, index)
+
+    def _bind(self, net, index):
+        # Turn the parameters of net into views of the slice index of the stacked tensors
+        for k, layer in enumerate(_linear_layers(net)):
+            layer.weight = nn.Parameter(self.weights[k][index])
+            layer.bias = nn.Parameter(self.biases[k][index])
+        net.population = self
+        net.population_index = index
+
+    @classmethod
+    def from_tensors(cls, weights, biases):
+        """
+        Population viewing existing stacked tensors, e.g. the shared ones of another process. The networks of
+        the individuals are only created when first asked for.
+        """
+        population = cls.__new__(cls)
+        population.weights = list(weights)
+        population.biases = list(biases)
+        population.nets = [None] * len(population.weights[0])
+        return population
+
+    @classmethod
+    def random(cls, n_individuals, device='cpu'):
+        """
+        Population of freshly initialized networks.
+        """
+        return cls([PlayerNNNet(IN_LAYER_SIZE, OUT_LAYER_SIZE).to(device) for _ in range(n_individuals)])
+
+    @classmethod
+    def from_players(cls, players):
+        """
+        Population made of the networks of some PlayerNN, which keep playing with them.
+        """
+        return cls([player.model for player in players])
+
+    def __len__(self):
+        return len(self.nets)
+
+    def assign(self, nets):
+        """
+        Copy the weights of as many networks as individuals into the stacked tensors, in place, and make the
+        networks view them. Processes mapping the shared tensors see the new weights.
+        """
+        layers = [_linear_layers(net) for net in nets]
+        with torch.no_grad():
+            # Stacked first, the networks may view slots that are overwritten
+            for k, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+                weight.copy_(torch.stack([individual[k].weight for individual in layers]))
+                bias.copy_(torch.stack([individual[k].bias for individual in layers]))
+        for index, net in enumerate(nets):
+            self._bind(net, index)
+            self.nets[index] = net
+
+    def net(self, index):
+        """
+        Network of an individual, viewing the stacked tensors.
+        """
+        if self.nets[index] is None:
+            net = PlayerNNNet(IN_LAYER_SIZE, OUT_LAYER_SIZE).to(self.weights[0].device)
+            self._bind(net, index)
+            self.nets[index] = net
+        return self.nets[index]
+
+    def player(self, index):
+        """
+        PlayerNN playing with the network of an individual.
+        """
+        return PlayerNN(model=self.net(index))
+
+    def share_memory(self):
+        """
+        Move the stacked tensors to shared memory, where other processes can map them instead of receiving
+        copies. The networks keep viewing them.
+        """
+        for tensor in self.weights + self.biases:
+            tensor.share_memory_()
+        return self
+
+    def forward(self, states, indices=None):
+        """
+        Evaluate one state per individual.
+
+        Args:
+            states (torch.Tensor): (n, IN_LAYER_SIZE) states, one per individual.
+            indices (torch.Tensor): (n,) individuals evaluated, the whole population in order by default.
+
+        Returns:
+            torch.Tensor: (n, OUT_LAYER_SIZE) outputs.
+        """
+        x = states.unsqueeze(1)
+        last = len(self.weights) - 1
+        with torch.inference_mode():
+            for k, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+                if indices is not None:
+                    weight, bias = weight[indices], bias[indices]
+                x = torch.baddbmm(bias.unsqueeze(1), x, weight.transpose(1, 2))
+                x = torch.sigmoid(x) if k == last else torch.relu(x)
+        return x.squeeze(1)
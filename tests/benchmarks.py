@@ -0,0 +1,226 @@
+"""
+Benchmarks of the engine, players and genetic algorithm hot paths.
+
+Every benchmark runs with fixed seeds and reports its throughput (operations per second) together with the
+change against the baseline stored in benchmarks_baseline.json. Run from the repository root:
+
+    python -m tests.benchmarks                     # run every benchmark
+    python -m tests.benchmarks meld game_coded     # run some of them
+    python -m tests.benchmarks --update-baseline   # store the current results as the new baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from pyburraco.game_logic import Game
+from pyburraco.game_logic.card import CARDS, DECK_CARD_IDS
+from pyburraco.game_logic.card_counts import CardCounts
+from pyburraco.game_logic.meld import Meld
+from pyburraco.players import PlayerCoded, PlayerNN
+from pyburraco.players.player_coded_helpers import find_all_possible_melds, _enumerate_melds
+
+SEED = 1234
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks_baseline.json')
+MIN_TIME = 1.0
+
+
+def _seed_all(seed=SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def _random_hands(n_hands, hand_size):
+    rng = np.random.default_rng(SEED)
+    deck = np.array(DECK_CARD_IDS)
+    return [CardCounts(CARDS[card_id] for card_id in rng.permutation(deck)[:hand_size]) for _ in range(n_hands)]
+
+
+def _random_groups(n_groups):
+    # Mix of valid and invalid groups, with the run-like groups the players actually try
+    rng = np.random.default_rng(SEED)
+    groups = []
+    for _ in range(n_groups):
+        suit = int(rng.integers(4))
+        start = int(rng.integers(0, 9))
+        length = int(rng.integers(3, 8))
+        group = [CARDS[suit * 13 + (start + i) % 13] for i in range(length)]
+        if rng.random() < 0.3:
+            group[int(rng.integers(length))] = CARDS[int(rng.choice(DECK_CARD_IDS))]
+        groups.append(group)
+    return groups
+
+
+def bench_meld():
+    groups = _random_groups(1000)
+
+    def run():
+        for group in groups:
+            Meld(list(group))
+        return len(groups)
+    return run
+
+
+def bench_find_melds():
+    hands = _random_hands(200, 14)
+
+    def run():
+        # Every repetition enumerates the hands again instead of reading the memo
+        _enumerate_melds.cache_clear()
+        for hand in hands:
+            find_all_possible_melds(hand)
+        return len(hands)
+    return run
+
+
+def bench_find_melds_cached():
+    hands = _random_hands(200, 14)
+
+    def run():
+        for hand in hands:
+            find_all_possible_melds(hand)
+        return len(hands)
+    return run
+
+
+def _nn_player():
+    _seed_all()
+    player = PlayerNN()
+    player.hand = _random_hands(1, 14)[0]
+    player._discard_pile = _random_hands(1, 8)[0]
+    player.melds = [Meld([CARDS[13 * suit + rank] for rank in range(2, 6)]) for suit in range(4)]
+    return player
+
+
+def bench_nn_encode():
+    player = _nn_player()
+
+    def run():
+        for _ in range(100):
+            player.encoded_game_status
+        return 100
+    return run
+
+
+def bench_nn_forward():
+    player = _nn_player()
+    state = player.encoded_game_status
+
+    def run():
+        with torch.no_grad():
+            for _ in range(100):
+                player.model(state)
+        return 100
+    return run
+
+
+def _bench_game(player_types):
+    def run():
+        _seed_all()
+        game = Game(seed=SEED)
+        for player_type in player_types:
+            game.add_player(player_type())
+        game.play_game()
+        return 1
+    return run
+
+
+def bench_game_coded():
+    return _bench_game((PlayerCoded, PlayerCoded))
+
+
+def bench_game_nn():
+    return _bench_game((PlayerNN, PlayerCoded))
+
+
+def bench_ga_generation():
+    from pyburraco.genetic_algorithm.genetic_algorithm import GeneticAlgorithm
+
+    def run():
+        _seed_all()
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            # The GA keeps its models under the working directory
+            os.chdir(directory)
+            try:
+                ga = GeneticAlgorithm(parameters={'n_players': 4, 'n_games': 1, 'generations': 1,
+                                                  'tournament_type': 'round_robin', 'continue_training': False,
+                                                  'seed': SEED})
+                ga.run_generation()
+            finally:
+                os.chdir(cwd)
+        return 1
+    return run
+
+
+BENCHMARKS = {
+    'meld': bench_meld,
+    'find_melds': bench_find_melds,
+    'find_melds_cached': bench_find_melds_cached,
+    'nn_encode': bench_nn_encode,
+    'nn_forward': bench_nn_forward,
+    'game_coded': bench_game_coded,
+    'game_nn': bench_game_nn,
+    'ga_generation': bench_ga_generation,
+}
+
+
+def measure(benchmark, min_time=MIN_TIME):
+    """
+    Run a benchmark until min_time seconds have passed.
+
+    Returns:
+        float: Operations per second.
+    """
+    run = benchmark()
+    run()  # Warm up
+    operations = 0
+    start = time.perf_counter()
+    while True:
+        operations += run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return operations / elapsed
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyBurraco benchmarks")
+    parser.add_argument('names', nargs='*', help=f"Benchmarks to run among {', '.join(BENCHMARKS)} (all if none)")
+    parser.add_argument('--min-time', type=float, default=MIN_TIME, help="Seconds spent in each benchmark")
+    parser.add_argument('--update-baseline', action='store_true', help="Store the results as the new baseline")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    baseline = load_baseline()
+    results = {}
+    print(f"{'benchmark':<16}{'ops/s':>12}{'baseline':>12}{'change':>10}")
+    for name in args.names or BENCHMARKS:
+        results[name] = measure(BENCHMARKS[name], args.min_time)
+        reference = baseline.get(name)
+        change = f"{100 * (results[name] / reference - 1):+.1f}%" if reference else '-'
+        print(f"{name:<16}{results[name]:>12.2f}{reference or 0:>12.2f}{change:>10}")
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w') as file:
+            json.dump(baseline, file, indent=4, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
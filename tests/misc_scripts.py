@@ -4,10 +4,10 @@ import os, sys, time
 from torchviz import make_dot
 import torch
 
+from pyburraco.genetic_algorithm.population_checkpoint import read_population
 from pyburraco.players.player_nn import PlayerNN
 
-MODELS_PATH = os.path.join(os.getcwd(), 'data', 'models')
-FILES_LIST = [f for f in os.listdir(MODELS_PATH) if os.path.isfile(os.path.join(MODELS_PATH, f))]
+POPULATION_PATH = os.path.join(os.getcwd(), 'data', 'population_Test.pop')
 
 N_MELDS_ENCODED = 10
 IN_LAYER_SIZE = 216 + N_MELDS_ENCODED * 16 + 1
@@ -16,10 +16,9 @@ IN_LAYER_SIZE = 216 + N_MELDS_ENCODED * 16 + 1
 def plot_saved_models():
     players = []
     plt1, ax1 = plt.subplots()
-    for file in FILES_LIST:
-        new_player = PlayerNN()
-        new_player.load_model(os.path.join(MODELS_PATH, file))
-        players.append(new_player)
+    checkpoint = read_population(POPULATION_PATH)
+    for i in range(len(checkpoint)):
+        players.append(checkpoint.player(i))
 
     for player in players:
         player.model.weights_histogram(bins=100, alpha=0.25)
@@ -44,8 +43,7 @@ def plot_random_models():
 
 
 def plot_model_nn():
-    player = PlayerNN()
-    player.load_model(os.path.join(MODELS_PATH, FILES_LIST[0]))
+    player = read_population(POPULATION_PATH).player(0)
 
     dummy_text = torch.randn(1, IN_LAYER_SIZE).to("cuda")  # Adjust the size based on your input size
     dataloader_train = torch.utils.data.DataLoader(torch.utils.data.TensorDataset(dummy_text))
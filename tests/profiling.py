@@ -6,7 +6,7 @@ from pyburraco.genetic_algorithm.genetic_algorithm import GeneticAlgorithm
 
 
 def profile_main():
-    ga = GeneticAlgorithm(n_players=10, n_games=2, generations=1, continue_training=True)
+    ga = GeneticAlgorithm(parameters={'n_players': 10, 'n_games': 2, 'generations': 1, 'continue_training': True})
     ga.evolve_generations()
 
 
@@ -1,9 +1,30 @@
+import os
+import copy
+import pickle
 import numpy as np
+import pytest
 import torch
 
-from pyburraco.game_logic.meld import Meld
+from pyburraco.game_logic.meld import Meld, MeldList
+from pyburraco.game_logic.meld_table import RUN_LAYOUTS, WILDCARD_SLOT, run_table_index
 from pyburraco.players.player_coded import PlayerCoded
-from pyburraco.game_logic.card import Card
+from pyburraco.players.player_coded_helpers import find_all_possible_melds, find_best_meld
+from pyburraco.players.player_coded_planner import plan_melds
+from pyburraco.players.player_mc import PlayerMC, run_rollouts
+from pyburraco.genetic_algorithm.worker_pool import WorkerPool
+from pyburraco.genetic_algorithm.checkpoint_writer import CheckpointWriter
+from pyburraco.genetic_algorithm.racing import SURELY_IN, SURELY_OUT, UNCERTAIN, confidence_z, racing_status
+from pyburraco.genetic_algorithm.population_checkpoint import ALIGNMENT, read_population, save_population
+from pyburraco.players.player_nn import PlayerNN, InferenceBroker, Population
+from pyburraco.genetic_algorithm.round_robin import balanced_chunks, mean_scores, round_robin_schedule, score_matrix
+from pyburraco.players.player_nn.player_nn import decode_output, IN_LAYER_SIZE, OUT_LAYER_SIZE
+from pyburraco.game_logic.card import Card, CARDS, N_CARD_IDS, DECK_CARD_IDS
+from pyburraco.game_logic.card_counts import CardCounts
+from pyburraco.game_logic.deck import Deck, DECK_SIZE
+from pyburraco.game_logic import Game, PhaseProfiler
+from pyburraco.game_logic.game_record import GameRecorder, GameRecordWriter, GameReplay, read_records
+from pyburraco.game_logic.batch_game import BatchGame, MELD_LENGTH
+from pyburraco.players.player_batch import BatchPlayerCoded
 import pyburraco.players.player_nn.nn_helpers as nH
 
 SUIT_MAPPING = {'C': 'Clubs', 'S': 'Spades', 'D': 'Diamonds', 'H': 'Hearts', 'Joker': 'Joker'}
@@ -29,6 +50,38 @@ def test_meld_sorting_1():
     assert meld.cards[0].rank != 'Joker'
 
 
+def test_meld_table_1():
+    # Ace low with the wildcard in place of the 2, ace high with the wildcard in place of the king
+    assert RUN_LAYOUTS[run_table_index((1 << 12) | (1 << 1) | (1 << 2), 1)] == (12, WILDCARD_SLOT, 1, 2)
+    assert RUN_LAYOUTS[run_table_index((1 << 12) | (1 << 10), 1)] == (10, WILDCARD_SLOT, 12)
+    assert RUN_LAYOUTS[run_table_index((1 << 3) | (1 << 6), 1)] is None
+
+
+def test_meld_sorting_2():
+    meld = Meld([Card("Clubs", "9"), Card("Joker", "Joker"), Card("Clubs", "7"), Card("Clubs", "10")])
+    assert meld.meld_type == 'Run'
+    assert meld.cards == [Card("Clubs", "7"), Card("Joker", "Joker"), Card("Clubs", "9"), Card("Clubs", "10")]
+
+
+def test_meld_try_add_1():
+    meld = Meld([Card("Hearts", "5"), Card("Hearts", "2"), Card("Hearts", "7")])
+    assert meld.wildcard_index == 1
+    assert meld.can_add(Card("Hearts", "9")) is None
+    assert meld.try_add(Card("Hearts", "6"))
+    assert meld.cards == [Card("Hearts", "5"), Card("Hearts", "6"), Card("Hearts", "7"), Card("Hearts", "2")]
+    assert meld.run_ends == (3, WILDCARD_SLOT)
+    assert not meld.try_add(Card("Spades", "8")) and len(meld.cards) == 4
+
+
+def test_meld_try_add_2():
+    meld = Meld([Card("Clubs", "Q"), Card("Spades", "Q"), Card("Hearts", "Q")])
+    assert meld.set_rank == 10
+    assert meld.can_add(Card("Joker", "Joker")) == 3
+    assert meld.try_add(Card("Joker", "Joker")) and meld.try_add(Card("Clubs", "Q"))
+    assert not meld.try_add(Card("Hearts", "2"))
+    assert meld.cards[-1] == Card("Joker", "Joker") and meld.wildcard_index == 4
+
+
 def test_add_melds_1():
     ai_player = PlayerCoded()
     ai_player.melds = [Meld([Card("Hearts", "3"), Card("Hearts", "4"), Card("Hearts", "5"),
@@ -100,6 +153,42 @@ def test_add_melds_5():
     assert ai_player.melds[0].cards[0].rank != 'Joker'
 
 
+def test_card_interning_1():
+    card = Card("Spades", "A")
+    assert card is Card("Spades", "A")
+    assert card is CARDS[card.id]
+    assert (card.id, card.rank_index, card.suit_index, card.points, card.wildcard) == (51, 12, 3, 15, False)
+
+
+def test_card_interning_2():
+    joker = Card("Joker", "Joker")
+    assert joker.is_joker() and joker.wildcard and joker.points == 30
+    assert pickle.loads(pickle.dumps(joker)) is joker
+    assert len(CARDS) == N_CARD_IDS
+
+
+def test_card_counts_1():
+    hand = CardCounts([Card("Hearts", "K"), Card("Joker", "Joker"), Card("Hearts", "3"), Card("Hearts", "K")])
+    assert len(hand) == 4 and hand.count(Card("Hearts", "K")) == 2
+    assert list(hand) == [Card("Hearts", "3"), Card("Hearts", "K"), Card("Hearts", "K"), Card("Joker", "Joker")]
+    assert hand.suit_mask(0) == (1 << 1) | (1 << 11)
+    assert hand.rank_count(11) == 2
+
+    hand.remove(Card("Hearts", "K"))
+    assert Card("Hearts", "K") in hand and hand.suit_mask(0) == (1 << 1) | (1 << 11)
+    hand.remove(Card("Hearts", "K"))
+    assert Card("Hearts", "K") not in hand and hand.suit_mask(0) == 1 << 1
+    assert hand.pop(0) == Card("Hearts", "3") and hand == [Card("Joker", "Joker")]
+
+
+def test_card_counts_2():
+    hand = CardCounts([Card("Spades", "2"), Card("Clubs", "9"), Card("Clubs", "9")])
+    copied = pickle.loads(pickle.dumps(hand))
+    assert copied == hand and copied.signature == hand.signature
+    copied.remove(Card("Clubs", "9"))
+    assert copied != hand and hand.count(Card("Clubs", "9")) == 2
+
+
 def test_encoding_1():
     encoded_deck = nH.encode_card_from_deck(Card(suit='Spades', rank='A'), 0b0)
     assert np.log2(float(encoded_deck)) == 102
@@ -161,3 +250,519 @@ def test_encoding_melds_1():
     result = torch.tensor([0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 1., 0., 0., 0., 0., 0.,
                            0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 1., 1., 1., 0.])
     assert all([a == b for a, b in zip(encoded_meld[:32], result[:32])])
+
+
+def test_batch_game_1():
+    game = BatchGame(8, [BatchPlayerCoded(), BatchPlayerCoded()], seed=0)
+    results = game.play(4)
+    assert len(results['winner']) >= 4
+    # Every card is either in the decks, the hands, the discard pile or the melds
+    in_play = (game.hands.sum(axis=(1, 2)) + game.discard_pile.sum(axis=1) + game.deck_secondary.sum(axis=(1, 2))
+               + game.melds[:, :, :, MELD_LENGTH].sum(axis=(1, 2)) + game.deck.shape[1] - game.deck_position)
+    assert (in_play == game.deck.shape[1]).all()
+
+    # As in Game, the picked secondary decks are only cleared at the end of a match
+    game.secondary_deck[:2] = True
+    game.scores[:2] = 0
+    game.round[:2] = 0
+    game.scores[1, game.current_player_index[1]] = 2000
+    game._end_round(np.arange(2))
+    assert game.secondary_deck[0].all() and not game.secondary_deck[1].any()
+
+
+def test_batch_play_melds_1():
+    # The batch player lays the meld PlayerCoded would lay, on random hands with and without a burraco
+    rng = np.random.default_rng(0)
+    n = 500
+    game = BatchGame(n, [BatchPlayerCoded(), BatchPlayerCoded()], seed=0)
+    game.hands[:] = 0
+    game.melds[:] = 0
+    game.n_melds[:] = 0
+    burraco = rng.random(n) < 0.3
+    hands = [rng.permutation(np.array(DECK_CARD_IDS))[:rng.integers(2, 15)] for _ in range(n)]
+    # Three natural copies make the set, the wildcard stays in hand
+    hands[0] = [Card(suit, "3").id for suit in ["Hearts", "Diamonds", "Clubs"]]
+    hands[0] += [Card("Clubs", "7").id, Card("Spades", "2").id]
+    burraco[0] = False
+    game.melds[burraco, 0, 0, MELD_LENGTH] = 7
+    game.n_melds[burraco, 0] = 1
+    for row, card_ids in enumerate(hands):
+        np.add.at(game.hands[row, 0], card_ids, 1)
+
+    before = game.hands[:, 0].copy()
+    BatchPlayerCoded().play_melds(game, np.arange(n), 0)
+    played = before - game.hands[:, 0]
+    for row, card_ids in enumerate(hands):
+        meld = find_best_meld(CardCounts(CARDS[card_id] for card_id in card_ids), bool(burraco[row]))
+        expected = np.zeros(N_CARD_IDS, dtype=np.int64)
+        np.add.at(expected, [card.id for card in meld or []], 1)
+        assert (played[row] == expected).all()
+
+
+def test_deck_seed_1():
+    deck_a, deck_b = Deck(seed=7), Deck(seed=7)
+    cards_a = [deck_a.draw_card() for _ in range(DECK_SIZE)]
+    assert cards_a == [deck_b.draw_card() for _ in range(DECK_SIZE)]
+    assert deck_a.draw_card() is None
+    # Reset refills the same buffer, spawned decks follow independent streams
+    deck_a.reset()
+    assert len(deck_a.draw_pile) == DECK_SIZE
+    spawned = deck_a.spawn(2)
+    assert [spawned[0].draw_card() for _ in range(10)] != [spawned[1].draw_card() for _ in range(10)]
+
+
+def test_running_totals_1():
+    player = PlayerCoded()
+    player.hand = [Card("Hearts", "K"), Card("Joker", "Joker")]
+    player.melds.append(Meld([Card("Hearts", "3"), Card("Hearts", "4"), Card("Hearts", "5")]))
+    assert player.points == 15 - 40
+    for rank in ["6", "7", "8"]:
+        assert player.melds[0].try_add(Card("Hearts", rank))
+    assert not player.burraco
+    player.melds[0].try_add(Card("Hearts", "2"))
+    assert player.burraco and player.points == 15 + 20 + 20 - 40
+    player.melds.pop()
+    assert not player.burraco and player.points == -40
+
+
+def test_running_totals_copy_1():
+    player = PlayerCoded()
+    player.melds.append(Meld([Card("Hearts", "3"), Card("Hearts", "4"), Card("Hearts", "5")]))
+    player.melds.append(Meld([Card("Clubs", "9"), Card("Spades", "9"), Card("Hearts", "9")]))
+
+    # Copies rebuild their melds and attach them to the copied list
+    for copied in [pickle.loads(pickle.dumps(player)), copy.deepcopy(player)]:
+        assert copied.points == player.points and copied.melds.max_length == 3
+        assert all(meld._owner is copied.melds for meld in copied.melds)
+        copied.melds[0].try_add(Card("Hearts", "6"))
+        assert copied.melds.points == player.melds.points + 5 and copied.melds.max_length == 4
+
+    # A removed meld no longer reports to the list
+    meld = player.melds.pop(0)
+    assert meld._owner is None
+    meld.try_add(Card("Hearts", "6"))
+    assert player.melds.points == 30
+
+
+def test_phase_profiler_1():
+    profiler = PhaseProfiler()
+    game = Game(seed=3, hooks=profiler)
+    game.add_player(PlayerCoded())
+    game.add_player(PlayerCoded())
+    game.play_game()
+    report = profiler.report()
+    assert report['draw']['calls'] == report['add_melds']['calls'] == report['play_melds']['calls']
+    assert report['draw']['calls'] == report['discard']['calls']
+    assert sum(report['scoring']['outcomes'].values()) == len(game.players[0].turn_history)
+    assert set(report['draw']['outcomes']) <= {'deck', 'discard_pile'}
+
+
+def test_game_record_1(tmp_path):
+    with GameRecordWriter(str(tmp_path), records_per_chunk=1) as writer:
+        game = Game(seed=11, hooks=GameRecorder(writer))
+        game.add_player(PlayerCoded())
+        game.add_player(PlayerCoded())
+        game.play_game()
+        winner = game.players.index(game.winner)
+        game.play_game()
+        paths = writer.chunk_paths
+    records = [record for path in paths for record in read_records(path)]
+    assert len(paths) == 2 and len(records) == 2
+
+    replay = GameReplay(records[0])
+    final = replay.state_at(replay.n_turns)
+    assert replay.seed == 11
+    assert replay.winner == winner
+    assert final.scores[winner] >= 1000 or final.round >= Game.GAME_LIMIT
+    # Every round starts from the dealt hands
+    assert all(len(hand) >= 11 for hand in replay.state_at(0).hands)
+
+
+def test_find_all_melds_1():
+    hand = [Card("Hearts", "A"), Card("Hearts", "3"), Card("Hearts", "Q"), Card("Hearts", "K"),
+            Card("Spades", "2"), Card("Clubs", "Q"), Card("Diamonds", "Q")]
+    melds = find_all_possible_melds(hand)
+    # Ace low with the wildcard as the 2, ace high with and without the wildcard, and the set of queens
+    assert [Card("Hearts", "A"), Card("Spades", "2"), Card("Hearts", "3")] in melds
+    assert [Card("Hearts", "Q"), Card("Hearts", "K"), Card("Hearts", "A")] in melds
+    assert [Card("Hearts", "Q"), Card("Hearts", "K"), Card("Hearts", "A"), Card("Spades", "2")] in melds
+    assert [Card("Hearts", "Q"), Card("Diamonds", "Q"), Card("Clubs", "Q"), Card("Spades", "2")] in melds
+    assert all(Meld(list(meld)).valid for meld in melds)
+    # Results come from the cache, but callers get lists of their own
+    melds[0].append(Card("Joker", "Joker"))
+    assert find_all_possible_melds(CardCounts(hand)) != melds
+
+
+def test_meld_planner_1():
+    player = PlayerCoded(node_budget=10000)
+    player.hand = [Card("Hearts", "3"), Card("Hearts", "4"), Card("Hearts", "5"), Card("Clubs", "K"),
+                   Card("Spades", "K"), Card("Diamonds", "K"), Card("Hearts", "9"), Card("Clubs", "7")]
+    player.melds.append(Meld([Card("Spades", "6"), Card("Spades", "7"), Card("Spades", "8")]))
+    player.hand.append(Card("Spades", "9"))
+
+    plan = plan_melds(player, node_budget=10000)
+    assert plan.complete
+    assert sorted(len(cards) for cards in plan.new_melds) == [3, 3]
+    assert plan.additions == {0: [Card("Spades", "9")]}
+
+    # With the secondary deck taken and no burraco, at least two cards stay in hand
+    player.secondary_deck = True
+    assert plan_melds(player, node_budget=10000).n_cards <= len(player.hand) - 2
+
+
+def test_meld_acceptance_index_1():
+    melds = MeldList([Meld([Card("Hearts", "4"), Card("Hearts", "5"), Card("Hearts", "6")]),
+                      Meld([Card("Clubs", "9"), Card("Spades", "9"), Card("Hearts", "9")])])
+    assert melds.accepting(Card("Hearts", "7")) == [melds[0]]
+    assert melds.first_accepting(Card("Diamonds", "9")) is melds[1]
+    assert melds.accepting(Card("Joker", "Joker")) == [melds[0], melds[1]]
+
+    # The index follows the melds as they grow
+    melds[0].try_add(Card("Hearts", "2"))
+    assert melds.accepting(Card("Joker", "Joker")) == [melds[1]]
+    assert melds.first_accepting(Card("Hearts", "8")) is melds[0]
+
+    # And as they move around the list
+    melds.reverse()
+    assert melds.first_accepting(Card("Diamonds", "9")) is melds[0]
+    melds.sort(key=lambda meld: len(meld.cards), reverse=True)
+    assert melds.first_accepting(Card("Diamonds", "9")) is melds[1]
+
+    copied = pickle.loads(pickle.dumps(melds))
+    assert copied.points == melds.points and copied[0]._owner is copied
+    assert copied.first_accepting(Card("Hearts", "8")) is copied[0]
+
+
+def test_game_snapshot_1():
+    game = Game(seed=3)
+    game.add_player(PlayerCoded())
+    game.add_player(PlayerCoded())
+    game.setup_match()
+    game.setup_game()
+    for _ in range(30):
+        game.play_round()
+    snapshot = game.snapshot()
+
+    # Clones are independent of the original game
+    clone = game.clone(seed=1)
+    assert clone.snapshot() == snapshot
+    for _ in range(10):
+        clone.play_round()
+    assert game.snapshot() == snapshot
+
+    for _ in range(10):
+        game.play_round()
+    game.restore(snapshot)
+    assert game.snapshot() == snapshot
+
+    # Determinizing keeps the point of view of the player and the size of every hidden place
+    determinized = game.clone().determinize(0)
+    assert determinized.players[0].hand == game.players[0].hand
+    assert len(determinized.players[1].hand) == len(game.players[1].hand)
+    assert len(determinized.deck.draw_pile) == len(game.deck.draw_pile)
+
+    def hidden_ids(state):
+        cards = list(state.players[1].hand) + state.deck.draw_pile
+        return sorted(card.id for card in cards + [card for deck in state.deck_secondary for card in deck])
+    assert hidden_ids(determinized) == hidden_ids(game)
+
+
+def test_player_mc_1():
+    game = Game(seed=3)
+    player = PlayerMC(n_rollouts=2, max_turns=3, seed=0)
+    game.add_player(player)
+    game.add_player(PlayerCoded())
+    game.setup_match()
+    assert player.game is game
+
+    # The searching player plays legal turns like any other
+    for _ in range(20):
+        game.play_round()
+    assert player.rollouts > 0 and player.rollouts_per_second > 0
+    assert sum(len(p.hand) for p in game.players) + len(game.deck.discard_pile) + len(game.deck.draw_pile) \
+        + sum(len(meld.cards) for p in game.players for meld in p.melds) \
+        + sum(len(deck) for deck in game.deck_secondary) == DECK_SIZE
+
+    # Rollouts are reproducible for a given seed and leave the game untouched
+    snapshot = game.snapshot()
+    options = sorted({card.id for card in game.players[game.current_player_index].hand})
+    first = run_rollouts(snapshot, game.current_player_index, 'discard', options, n_rollouts=2, seed=5)
+    assert first == run_rollouts(snapshot, game.current_player_index, 'discard', options, n_rollouts=2, seed=5)
+    assert first[1] == [2] * len(options)
+    assert game.snapshot() == snapshot
+
+    # With a time budget the search stops after the rollout that runs past the deadline
+    timed = run_rollouts(snapshot, game.current_player_index, 'discard', options, time_budget=0.0, seed=5)
+    assert sum(timed[1]) == 1
+
+    # Pickled players leave the game behind
+    assert pickle.loads(pickle.dumps(player)).game is None
+
+
+def test_state_encoder_1():
+    # Every copy of a card takes its own bit, most significant bit first
+    cards = [Card("Joker", "Joker")] * 4 + [Card("Spades", "A")] * 2 + [Card("Hearts", "3")]
+    encoded = nH.encode_deck('cpu', cards)
+    assert encoded[:4].tolist() == [1.0] * 4
+    assert encoded.sum().item() == len(cards)
+    assert torch.equal(encoded, nH.encode_deck('cpu', CardCounts(cards)))
+
+    melds = [Meld([Card("Hearts", "3"), Card("Hearts", "4"), Card("Hearts", "5")]),
+             Meld([Card("Spades", "7"), Card("Hearts", "7"), Card("Joker", "Joker")])]
+    encoder = nH.StateEncoder('cpu', 10)
+    state = encoder.encode(1, cards[4:], CardCounts(cards), melds)
+    assert state.shape == (encoder.size,)
+    expected = torch.cat((torch.ones(1), nH.encode_deck('cpu', cards[4:]), encoded,
+                          nH.encode_meld('cpu', melds[0]), nH.encode_meld('cpu', melds[1]), torch.zeros(8 * 16)))
+    assert torch.equal(state, expected)
+    assert torch.equal(nH.encode_melds('cpu', melds, 10), expected[217:])
+
+
+def test_inference_broker_1():
+    import concurrent.futures
+    torch.manual_seed(0)
+    player = PlayerNN()
+    states = [torch.rand(nH.StateEncoder('cpu', 10).size) for _ in range(12)]
+
+    # Batched outputs match the direct evaluation, whatever thread asked for them
+    with InferenceBroker(batch_size=4, max_wait=0.5) as broker:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            outputs = list(executor.map(lambda state: broker.infer(player.model, state), states))
+        assert broker.requests == len(states) and broker.batches < len(states)
+    with torch.no_grad():
+        for state, output in zip(states, outputs):
+            assert torch.allclose(output, player.model(state), atol=1e-6)
+
+    # Clones share the model and the broker but not the game state
+    clone = player.clone()
+    clone.broker = broker
+    assert clone.model is player.model and clone._encoder is not player._encoder
+    assert pickle.loads(pickle.dumps(clone)).broker is None
+
+
+def test_decode_output_1():
+    torch.manual_seed(0)
+    output = torch.rand(OUT_LAYER_SIZE)
+    bits = [round(value) for value in output.tolist()]
+
+    def read(start, stop):
+        return int(''.join(str(bit) for bit in bits[start:stop]), 2)
+
+    actions = decode_output(output)
+    assert actions.draw == bits[0]
+    assert actions.add_cards.tolist() == [read(1 + i * 10, 7 + i * 10) for i in range(5)]
+    assert actions.add_melds.tolist() == [read(7 + i * 10, 11 + i * 10) for i in range(5)]
+    assert actions.meld_cards.shape == (5, 6)
+    assert actions.meld_cards.reshape(-1).tolist() == [read(51 + k * 6, 57 + k * 6) for k in range(30)]
+    assert actions.discard == read(-7, -1)
+
+
+def test_population_1():
+    torch.manual_seed(0)
+    population = Population.random(4)
+    states = torch.rand(4, IN_LAYER_SIZE)
+    with torch.inference_mode():
+        expected = torch.stack([net(state) for net, state in zip(population.nets, states)])
+    assert torch.allclose(population.forward(states), expected, atol=1e-6)
+    assert torch.allclose(population.forward(states[[2, 0]], torch.tensor([2, 0])), expected[[2, 0]], atol=1e-6)
+
+    # Individuals view the stacked weights, in-place changes land in the population
+    assert all(param.requires_grad for param in population.nets[0].parameters())
+    player = population.player(1)
+    player.model.mutate_weights(probability=1.0)
+    with torch.inference_mode():
+        assert torch.allclose(population.forward(states)[1], player.model(states[1]), atol=1e-6)
+
+    # Views batched by the broker run through the population, pickled views own their weights
+    with InferenceBroker(batch_size=4, max_wait=0.01) as broker:
+        assert torch.allclose(broker.infer(player.model, states[1]), population.forward(states)[1], atol=1e-6)
+    copy = pickle.loads(pickle.dumps(player))
+    assert getattr(copy.model, 'population', None) is None
+    assert all(torch.equal(a, b) for a, b in zip(copy.model.parameters(), player.model.parameters()))
+
+
+def test_shared_population_1():
+    from pyburraco.genetic_algorithm import genetic_algorithm as ga_module
+    torch.manual_seed(0)
+    population = Population.random(3).share_memory()
+    assert all(tensor.is_shared() for tensor in population.weights + population.biases)
+
+    # Workers view the same weights, the networks are only built when needed
+    view = Population.from_tensors(population.weights, population.biases)
+    assert view.nets == [None] * 3
+    states = torch.rand(3, IN_LAYER_SIZE)
+    assert torch.equal(view.forward(states), population.forward(states))
+    weight = population.nets[2].linear_relu_stack[0].weight
+    assert view.net(2).linear_relu_stack[0].weight.data_ptr() == weight.data_ptr()
+
+    # Matches are described by indexes and seed spawn keys, and reported as (winner seat, score 1, score 2)
+    seed_sequence = np.random.SeedSequence(7)
+    ga_module._init_match_worker(population.weights, population.biases, seed_sequence.entropy)
+    result = ga_module.play_indexed_match((0, 2, seed_sequence.spawn(1)[0].spawn_key))
+    assert result[0] in (0, 1) and len(result) == 3
+    assert len(pickle.dumps((0, 2, (0,)))) + len(pickle.dumps(result)) < 100
+
+
+def _exit_once(marker):
+    # Kill the worker the first time, succeed once the pool was replaced
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return os.getpid()
+
+
+def test_worker_pool_1(tmp_path):
+    marker = str(tmp_path / 'died')
+    with WorkerPool(1) as pool:
+        pids = pool.map(_exit_once, [marker, marker])
+        assert pool.restarts == 1
+        assert pids[0] == pids[1] and pids[0] != os.getpid()
+        # The same workers serve the next calls
+        assert pool.map(_exit_once, [marker]) == pids[:1]
+    assert not pool.running
+
+    # Loading new players into a shared population keeps the tensors, views see the new weights
+    torch.manual_seed(0)
+    population = Population.random(2).share_memory()
+    view = Population.from_tensors(population.weights, population.biases)
+    storage = population.weights[0].data_ptr()
+    players = [PlayerNN(), population.player(0)]
+    expected = [player.model.linear_relu_stack[0].weight.clone() for player in players]
+    population.assign([player.model for player in players])
+    assert population.weights[0].data_ptr() == storage
+    assert torch.equal(view.net(0).linear_relu_stack[0].weight, expected[0])
+    assert torch.equal(view.net(1).linear_relu_stack[0].weight, expected[1])
+
+
+def test_elites_checkpoints_1(tmp_path, monkeypatch):
+    from pyburraco.genetic_algorithm import GeneticAlgorithm
+    monkeypatch.chdir(tmp_path)
+    torch.manual_seed(0)
+    ga = GeneticAlgorithm({'n_players': 4, 'continue_training': False, 'tournament_type': 'round_robin',
+                           'mutation_probability': 0.0})
+
+    # Children come from the elites in memory, nothing is read from disk
+    models_path = tmp_path / 'data' / 'models'
+    ga._elites = ga.players[:2]
+    ga._players = list(ga._elites)
+    ga.create_child_model(2)
+    assert len(ga.players) == 4 and not os.listdir(models_path)
+    for child in ga.players[2:]:
+        for name, param in child.model.named_parameters():
+            parents = [dict(elite.model.named_parameters())[name] for elite in ga._elites]
+            assert any(torch.equal(param, parent) for parent in parents)
+
+    # Elites are written in the background to the population checkpoint, through a renamed temporary file
+    ga.save_elites()
+    ga._checkpoints.flush()
+    assert sorted(os.listdir(tmp_path / 'data')) == ['models', 'population_Test.pop']
+    loaded = read_population(str(tmp_path / 'data' / 'population_Test.pop')).player(1)
+    assert all(torch.equal(a, b) for a, b in zip(loaded.model.parameters(), ga._elites[1].model.parameters()))
+
+    with CheckpointWriter() as writer:
+        writer.save_pickle({'a': 1}, str(tmp_path / 'status.pkl'))
+    assert writer.written == 1
+    with open(tmp_path / 'status.pkl', 'rb') as file:
+        assert pickle.load(file) == {'a': 1}
+
+
+def test_racing_1(tmp_path, monkeypatch):
+    z = confidence_z(0.95)
+    assert abs(z - 1.96) < 1e-2
+
+    # The best individual is surely in the top two and the two worst surely out, the close middle pair is not
+    means = np.array([1000.0, 600.0, 550.0, 0.0, -100.0])
+    status = racing_status(means, np.full(5, 10), 100.0, 2, z)
+    assert status.tolist() == [SURELY_IN, UNCERTAIN, UNCERTAIN, SURELY_OUT, SURELY_OUT]
+
+    # An individual without games is never decided
+    status = racing_status(means, np.array([10, 10, 10, 0, 10]), 100.0, 2, z)
+    assert status.tolist() == [SURELY_IN, UNCERTAIN, UNCERTAIN, UNCERTAIN, SURELY_OUT]
+
+    from pyburraco.genetic_algorithm import GeneticAlgorithm
+    from pyburraco.genetic_algorithm.genetic_algorithm import SWISS_ROUNDS
+    monkeypatch.chdir(tmp_path)
+    ga = GeneticAlgorithm({'n_players': 4, 'n_games': 1, 'continue_training': False, 'tournament_type': 'racing',
+                           'n_processors': 1, 'racing_min_games': 1, 'propagate_percentage': 0.5, 'seed': 0})
+    ga.run_generation()
+    # At most SWISS_ROUNDS matches per individual, two individuals per match
+    assert len(ga.games_saved) == 1 and 0 <= ga.games_saved[0] <= 2 * SWISS_ROUNDS
+    assert ga._pool is None
+
+    # Batched inference is a round robin option, the racing tournament plays on the worker pool
+    with pytest.raises(ValueError):
+        GeneticAlgorithm({'n_players': 4, 'continue_training': False, 'tournament_type': 'racing',
+                          'inference_batch_size': 4})
+
+
+def test_round_robin_1(tmp_path, monkeypatch):
+    # Every pair plays every deal in both seat orders
+    schedule = round_robin_schedule(4, n_games=2)
+    assert len(schedule) == 6 * 2 * 2
+    assert sorted(map(tuple, schedule[:, :2].tolist())) == sorted((i, j) for i in range(4) for j in range(4)
+                                                                  if i != j for _ in range(2))
+    deals = {}
+    for i, j, deal in schedule.tolist():
+        deals.setdefault(deal, set()).add((i, j))
+    assert all(len(seats) == 2 and {(j, i) for i, j in seats} == seats for seats in deals.values())
+    assert len(round_robin_schedule(4, n_games=2, swap_seats=False)) == 12
+
+    chunks = balanced_chunks(list(range(24)), 5)
+    assert sorted(sum(chunks, [])) == list(range(24)) and {len(chunk) for chunk in chunks} == {4, 5}
+    assert balanced_chunks([1, 2], 8) == [[1], [2]]
+
+    schedule = np.array([[0, 1, 0], [1, 0, 0], [0, 2, 1], [2, 0, 1]])
+    scores, games, wins = score_matrix(3, schedule, [(0, 10, 2), (1, 4, 6), (1, 1, 9), (0, 7, 3)])
+    assert scores.tolist() == [[0, 16, 4], [6, 0, 0], [16, 0, 0]]
+    assert games.tolist() == [[0, 2, 2], [2, 0, 0], [2, 0, 0]]
+    assert wins[0, 1] == 2 and wins[2, 0] == 2 and wins.sum() == 4
+    assert mean_scores(scores, games).tolist() == [5.0, 3.0, 8.0]
+
+    from pyburraco.genetic_algorithm import GeneticAlgorithm
+    monkeypatch.chdir(tmp_path)
+    ga = GeneticAlgorithm({'n_players': 4, 'n_games': 1, 'continue_training': False,
+                           'tournament_type': 'round_robin', 'n_processors': 1, 'seed': 0})
+    ga.run_generation()
+    scores, games, wins = ga.score_matrix
+    assert (games == 2 * (1 - np.eye(4, dtype=int))).all() and wins.sum() == 12
+    assert ga._generation_scores[-1] == sorted(ga._generation_scores[-1], reverse=True)
+    assert all(player.score_history == [] for player in ga.players) and ga._pool is None
+
+
+def test_population_checkpoint_1(tmp_path, monkeypatch):
+    torch.manual_seed(0)
+    players = [PlayerNN() for _ in range(3)]
+    path = str(tmp_path / 'population.pop')
+    save_population(path, players, {'generation': 7})
+    assert os.listdir(tmp_path) == ['population.pop']
+
+    # Every individual is read from the mapped file, the parameters are aligned views of it
+    checkpoint = read_population(path)
+    assert len(checkpoint) == 3 and checkpoint.metadata == {'generation': 7}
+    for tensor in checkpoint.tensors.values():
+        assert tensor.shape[0] == 3 and tensor.data_ptr() % ALIGNMENT == 0
+    for i, player in enumerate(players):
+        state_dict = checkpoint.state_dict(i)
+        assert all(torch.equal(state_dict[name], tensor) for name, tensor in player.model.state_dict().items())
+
+    # Copy-on-write: changing a view never changes the file
+    checkpoint.state_dict(0)['linear_relu_stack.0.bias'].fill_(5.0)
+    assert torch.equal(read_population(path).state_dict(0)['linear_relu_stack.0.bias'],
+                       players[0].model.state_dict()['linear_relu_stack.0.bias'])
+
+    # The stacked tensors evaluate the population like the networks
+    states = torch.rand(3, IN_LAYER_SIZE)
+    population = read_population(path).population()
+    expected = torch.stack([player.model(state) for player, state in zip(players, states)])
+    assert torch.allclose(population.forward(states), expected, atol=1e-5)
+
+    # A new run continues from the checkpoint and its status
+    from pyburraco.genetic_algorithm import GeneticAlgorithm
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    save_population(str(tmp_path / 'data' / 'population_Test.pop'), players,
+                    {'time_steps': [1.0], 'generation_scores': [[3.0, 2.0, 1.0]]})
+    ga = GeneticAlgorithm({'n_players': 2, 'continue_training': True, 'tournament_type': 'round_robin',
+                           'propagate_percentage': 0.5})
+    assert len(ga.players) == 6 and ga.time_steps == [1.0] and ga.generation_scores == [[3.0, 2.0, 1.0]]
+    assert all(torch.equal(a, b) for a, b in zip(ga.players[2].model.parameters(), players[2].model.parameters()))